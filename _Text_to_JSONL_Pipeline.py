@@ -3,15 +3,16 @@ import tempfile
 import validators
 import os
 import requests
-import json
-import hashlib
 import pandas as pd
 import io
 from contextlib import redirect_stdout
 from meta_utils import scrape_url
-from parsepdf import process_all_pdfs, parse_pdf_markdown
-from docling.document_converter import DocumentConverter
-from utils import load_all_urls, load_scraped_text, fetch_rendered_text, semantic_similarity, get_status
+from parsepdf import process_all_pdfs
+from storage import BACKENDS, open_store
+from db_catalog import catalog_entries, catalog_entry
+from db_history import record_version
+from db_align import align_sections, changed_sections, describe, latest_sections
+from utils import fetch_rendered_text, similarity_batch, embedding_cache, POOLING
 
 st.set_page_config(page_title="Text to JSONL Pipeline", layout="centered")
 st.title("📄 Text-to-JSONL Pipeline")
@@ -24,19 +25,19 @@ and convert it into structured `.jsonl` format while showing semantic similarity
 # Choose Output JSONL File
 st.subheader("📁 Choose or Create Database")
 database_name = st.text_input("Database file name (no extension):", value="output")
+backend = st.selectbox("Storage backend:", list(BACKENDS), help="SQLite suits large databases with frequent lookups; JSONL stays a plain text file.")
 database_folder = "database"
-jsonl_path = os.path.join(database_folder, f"{database_name}.jsonl")
+jsonl_path = os.path.join(database_folder, f"{database_name}{BACKENDS[backend]}")
 
 # Display full path as markdown, database name as copyable code block
 st.markdown(f"📂 Output will be saved to: `{jsonl_path}`")
 
-# List existing databases without .jsonl extension
-if os.path.exists(database_folder):
-    existing_files = [os.path.splitext(f)[0] for f in os.listdir(database_folder) if f.endswith(".jsonl")]
-    if existing_files:
-        st.markdown("### 📚 Existing databases")
-        for file in existing_files:
-            st.markdown(f"- `{file}`")  # Each file as code block with copy button
+# List existing databases without extension
+existing_databases = catalog_entries(database_folder)
+if existing_databases:
+    st.markdown("### 📚 Existing databases")
+    for entry in existing_databases:
+        st.markdown(f"- `{entry['name']}` ({entry['backend']}, {entry['entries']} entries, {entry['urls']} URLs)")  # Each file as code block with copy button
 
 # URL Input
 user_input = st.text_area(
@@ -44,44 +45,45 @@ user_input = st.text_area(
     placeholder="https://example.com/file.pdf\nhttps://example.se/page",
     height=150
 )
+track_changes = st.checkbox("🔁 Re-scrape already-scraped URLs and record what changed",
+                            help="Changed sections are added to the database and each scrape is kept as a version in its history.")
 
 # Helper Function for Web Scraping with Semantic Analysis
-def scrape_urls_and_save(urls, output_path, log_area, log_buffer):
+def scrape_urls_and_save(urls, output_path, log_area, log_buffer, track_changes=False):
     """
-    Scrapes URLs and saves to JSONL with real-time logging.
-    Returns list of similarity results for each URL.
+    Scrapes URLs and saves to the database (JSONL or SQLite) with real-time logging.
+    With track_changes, known URLs are scraped again and every scrape is recorded in the version history.
+    Returns list of similarity results for each URL; similarity pairs are scored in batches.
     """
     similarity_results = []
+    cache_before = embedding_cache.counts()
+
+    def scored(result, similarity):
+        result["score"] = similarity
+        print(f"📊 Semantic similarity score for {result['url']}: {similarity:.3f}")
+
+    def unscored(result, error):
+        result["status"] = "not_scored"
+        print(f"⚠️ Could not score {result['url']}: {error}")
+
     with redirect_stdout(log_buffer):
         print(f"1/6 📁 Setting up output directory: {os.path.dirname(output_path)}")
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         print(f"2/6 🔍 Checking existing file: {output_path}")
-        existing_hashes = set()
-        existing_links = set()
-        
         if os.path.isfile(output_path):
             print(f"3/6 🔍 Loading existing data from {output_path}")
-            with open(output_path, "r", encoding="utf-8") as f_check:
-                for line in f_check:
-                    try:
-                        data = json.loads(line)
-                        h = hashlib.md5((data["content"] + data["origin_link"]).encode()).hexdigest()
-                        existing_hashes.add(h)
-                        existing_links.add(data["origin_link"])
-                    except:
-                        continue
         else:
             print("3/6 🧹 No existing file found, creating new database")
-
-        with open(output_path, "a", encoding="utf-8") as f:
+        with open_store(output_path).writer() as writer, similarity_batch(scored, unscored) as batch:
+            existing_links = writer.links
             for url in urls:
                 print(f"\n{'=' * 50}")
                 print(f"🚀 Starting scraping process for: {url}")
                 print(f"4/6 🧾 Extracting content from {url}")
                 log_area.code(log_buffer.getvalue())  # Update UI
                 
-                if url in existing_links:
+                if url in existing_links and not track_changes:
                     print(f"⏩ Skipping already-scraped URL: {url}")
                     log_area.code(log_buffer.getvalue())
                     similarity_results.append({
@@ -100,13 +102,12 @@ def scrape_urls_and_save(urls, output_path, log_area, log_buffer):
                 scraped_for_similarity = " ".join(sec["content"] for sec in sections if sec.get("content"))
                 
                 if live_content and scraped_for_similarity:
-                    similarity = semantic_similarity(live_content, scraped_for_similarity)
                     similarity_results.append({
                         "url": url,
-                        "score": similarity,
+                        "score": None,  # set by scored() when the batch is flushed
                         "status": "scraped"
                     })
-                    print(f"📊 Semantic similarity score: {similarity:.3f}")
+                    batch.add(live_content, scraped_for_similarity, similarity_results[-1])
                 else:
                     similarity_results.append({
                         "url": url,
@@ -120,13 +121,16 @@ def scrape_urls_and_save(urls, output_path, log_area, log_buffer):
                     print("\n📊 Scraping results:")
                     print(df.head())
 
-                    for section in sections:
-                        h = hashlib.md5((section["content"] + section["origin_link"]).encode()).hexdigest()
-                        if h in existing_hashes:
-                            continue
-                        existing_hashes.add(h)
-                        existing_links.add(url)
-                        f.write(json.dumps(section, ensure_ascii=False) + "\n")
+                    # A refresh is aligned against the latest stored version, read before this scrape is recorded
+                    previous = latest_sections(output_path, url) if url in existing_links else None
+                    if track_changes:  # before the append, so a URL's first version is seeded from what was stored
+                        version = record_version(output_path, url, sections)
+                        print(f"🕓 {'Recorded version ' + str(version) if version else 'Unchanged since the last version'} of {url}")
+                    if previous is not None:  # store only the sections that changed or are new
+                        alignment = align_sections(previous, sections, embedding_cache, POOLING)
+                        print(describe(alignment))
+                        sections = changed_sections(alignment, sections)
+                    writer.append(sections)
 
                     print(f"6/6 💾 {'Appended' if os.path.isfile(output_path) else 'Saved'} data to {output_path}")
                     log_area.code(log_buffer.getvalue())
@@ -135,6 +139,9 @@ def scrape_urls_and_save(urls, output_path, log_area, log_buffer):
                 
                 log_area.code(log_buffer.getvalue())  # Update UI
 
+        print(embedding_cache.summary(cache_before))
+        log_area.code(log_buffer.getvalue())
+
     return similarity_results
 
 # Run Button
@@ -162,7 +169,7 @@ if st.button("🚀 Run Pipeline"):
             log_buffer = io.StringIO()
             
             st.info(f"🌐 Scraping {len(web_urls)} web pages...")
-            web_similarity_results = scrape_urls_and_save(web_urls, jsonl_path, log_area, log_buffer)
+            web_similarity_results = scrape_urls_and_save(web_urls, jsonl_path, log_area, log_buffer, track_changes)
             all_similarity_results.extend(web_similarity_results)
             
             st.success(f"✅ Scraped and saved data from {len(web_urls)} web page(s).")
@@ -217,6 +224,8 @@ if st.button("🚀 Run Pipeline"):
                         st.warning("🟠 No existing content for comparison")
                     elif result['status'] == "error":
                         st.error("🔴 Error processing")
+                    elif result['score'] is None:  # not_scored, or a batch that never got scored
+                        st.warning("🟠 N/A / not scored")
                     elif result['score'] > 0.95:
                         st.success("✅ Excellent match")
                     elif result['score'] > 0.85:
@@ -228,6 +237,4 @@ if st.button("🚀 Run Pipeline"):
 
         # Show database summary
         if os.path.exists(jsonl_path):
-            with open(jsonl_path, "r", encoding="utf-8") as f:
-                line_count = sum(1 for _ in f)
-            st.info(f"📄 Total entries in database: {line_count}")
\ No newline at end of file
+            st.info(f"📄 Total entries in database: {catalog_entry(jsonl_path)['entries']}")
\ No newline at end of file
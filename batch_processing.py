@@ -1,13 +1,13 @@
 import os
 import json
+from db_catalog import catalog_entries
 
 CACHE_DIR = "cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 def get_database_files(data_dir="database"):
-    """Get database files without extensions"""
-    files = [f for f in os.listdir(data_dir) if f.endswith(".jsonl")]
-    return [os.path.splitext(f)[0] for f in files]
+    """Get database file names (e.g. docs.jsonl, docs.sqlite); open them with storage.open_store"""
+    return [entry["filename"] for entry in catalog_entries(data_dir)]
 
 def load_cached_results(db_name):
     cache_file = os.path.join(CACHE_DIR, db_name + "_results.json")
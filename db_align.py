@@ -0,0 +1,242 @@
+import sys
+import time
+import random
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional; a greedy pass over the sorted matrix is used without it
+    linear_sum_assignment = None
+
+from db_embeddings import EmbeddingCache, text_key
+from db_history import version
+from db_utils import DATA_DIR
+
+MATCH_MIN = 0.5                   # below this an aligned pair is a removal plus an addition, not a change
+STATUSES = ("matched", "changed", "added", "removed")
+
+
+def section_text(section: Dict) -> str:
+    """What a section is compared by: its heading and its content (or text, for PDF sections)."""
+    body = section.get("content") or section.get("text") or ""
+    heading = section.get("heading") or ""
+    return f"{heading}\n\n{body}" if heading else str(body)
+
+
+def latest_sections(db_path: str, url: str) -> List[Dict]:
+    """The sections of a URL as last stored, the side a refresh is aligned against.
+
+    A database keeps every version it was given (appends are never rewritten), so its rows for a URL
+    mix old and new copies. The latest version recorded in the history is used when there is one;
+    otherwise the newest row of each section number, in the order the numbers first appeared.
+    """
+    from storage import open_store
+
+    recorded = version(db_path, url)
+    if recorded is not None:
+        return recorded
+    latest: Dict = {}
+    for i, section in enumerate(open_store(db_path).sections_for_url(url)):
+        number = section.get("section")
+        latest[("section", number) if number is not None else ("row", i)] = section
+    return list(latest.values())
+
+
+def similarity_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row of a with every row of b, as one (len(a), len(b)) product."""
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+
+def _greedy(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair rows with columns best score first, each at most once; close to optimal when matches are clear."""
+    rows, cols, used_rows, used_cols = [], [], set(), set()
+    for flat in np.argsort(-matrix, axis=None, kind="stable"):
+        row, col = divmod(int(flat), matrix.shape[1])
+        if row in used_rows or col in used_cols:
+            continue
+        rows.append(row)
+        cols.append(col)
+        used_rows.add(row)
+        used_cols.add(col)
+        if len(rows) == min(matrix.shape):
+            break
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+def assign(matrix: np.ndarray, optimal: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Row and column indexes of a one-to-one pairing maximizing the total similarity."""
+    if matrix.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    if optimal and linear_sum_assignment is not None:
+        return linear_sum_assignment(matrix, maximize=True)
+    return _greedy(matrix)
+
+
+def align_sections(old: Sequence[Dict], new: Sequence[Dict], cache: Optional[EmbeddingCache],
+                   pooling: str = "mean", match_min: float = MATCH_MIN, optimal: bool = True) -> List[Dict]:
+    """Align two versions of a page section by section.
+
+    Sections with identical (normalized) text are paired first and never embedded. The rest of both
+    sides are embedded in one batched call (chunked and pooled, so long sections count whole), scored
+    as a full similarity matrix and paired by an assignment over it; pairs scoring below match_min
+    count as a removal plus an addition. Without a cache only the exact pass runs.
+
+    Returns one dict per section: `status` (matched, changed, added or removed), `old` and `new`
+    indexes (None on the side a section is missing from), `score`, and `heading`. Rows follow the new
+    order, with removed sections last.
+    """
+    waiting: Dict[bytes, List[int]] = {}
+    for i, section in enumerate(old):
+        waiting.setdefault(text_key(section_text(section)), []).append(i)
+    rows: List[Dict] = []
+    new_left: List[int] = []
+    for j, section in enumerate(new):
+        same = waiting.get(text_key(section_text(section)))
+        if same:
+            rows.append({"status": "matched", "old": same.pop(0), "new": j, "score": 1.0})
+        else:
+            new_left.append(j)
+    old_left = sorted(i for indexes in waiting.values() for i in indexes)
+
+    if old_left and new_left and cache is not None:
+        vectors = cache.encode_pooled([section_text(old[i]) for i in old_left] +
+                                      [section_text(new[j]) for j in new_left], pooling)
+        matrix = similarity_matrix(vectors[:len(old_left)], vectors[len(old_left):])
+        paired_old, paired_new = set(), set()
+        for r, c in zip(*assign(matrix, optimal)):
+            if matrix[r, c] >= match_min:
+                rows.append({"status": "changed", "old": old_left[r], "new": new_left[c], "score": float(matrix[r, c])})
+                paired_old.add(old_left[r])
+                paired_new.add(new_left[c])
+        old_left = [i for i in old_left if i not in paired_old]
+        new_left = [j for j in new_left if j not in paired_new]
+
+    rows.extend({"status": "added", "old": None, "new": j, "score": None} for j in new_left)
+    rows.sort(key=lambda row: row["new"])
+    rows.extend({"status": "removed", "old": i, "new": None, "score": None} for i in old_left)
+    for row in rows:
+        row["heading"] = (new[row["new"]] if row["new"] is not None else old[row["old"]]).get("heading") or ""
+    return rows
+
+
+def summary(alignment: Sequence[Dict]) -> Dict[str, int]:
+    counts = dict.fromkeys(STATUSES, 0)
+    for row in alignment:
+        counts[row["status"]] += 1
+    return counts
+
+
+def describe(alignment: Sequence[Dict]) -> str:
+    counts = summary(alignment)
+    return f"🧩 {counts['matched']} matched, {counts['changed']} changed, {counts['added']} added, {counts['removed']} removed"
+
+
+def changed_sections(alignment: Sequence[Dict], new: Sequence[Dict]) -> List[Dict]:
+    """The new sections a refresh has to store: changed and added ones, in page order."""
+    return [new[row["new"]] for row in alignment if row["status"] in ("changed", "added")]
+
+
+def _edit(sections: List[Dict], rng: random.Random) -> Tuple[List[Dict], Dict[int, Optional[int]]]:
+    """A plausible next version: some sections reworded, some dropped, some added, neighbours swapped.
+
+    Returns it with the truth: for each new index, the old index it came from (None if added).
+    """
+    pool = [(i, dict(s)) for i, s in enumerate(sections)]
+    for _, section in pool:
+        if rng.random() < 0.2:
+            words = str(section.get("content", "")).split()
+            for _ in range(max(1, len(words) // 10)):
+                if words:
+                    words[rng.randrange(len(words))] = rng.choice(["updated", "new", "revised", "current"])
+            section["content"] = " ".join(words)
+    pool = [item for item in pool if rng.random() >= 0.1]
+    for _ in range(max(1, len(sections) // 10)):
+        words = str(rng.choice(sections).get("content", "")).split() or ["new"]
+        added = {"heading": "New section", "content": " ".join(rng.sample(words, k=min(30, len(words))))}
+        pool.insert(rng.randrange(len(pool) + 1), (None, added))
+    for k in range(0, len(pool) - 1, 7):
+        pool[k], pool[k + 1] = pool[k + 1], pool[k]
+    return [section for _, section in pool], {j: i for j, (i, _) in enumerate(pool)}
+
+
+def benchmark(database: str, model_name: str, urls: int = 20, data_dir: str = DATA_DIR, seed: int = 0) -> None:
+    """Align stored pages with edited copies: the assignment and greedy pairings against the truth,
+    and a pairwise similarity loop against the one-matrix product."""
+    import tempfile
+    from sentence_transformers import SentenceTransformer
+    from db_embeddings import BATCH_SIZE, similarities
+    from storage import is_database_file, open_database, open_store
+
+    store = open_store(database) if is_database_file(database) else open_database(database, data_dir)
+    by_url: Dict[str, List[Dict]] = {}
+    for section in store.iter_sections():
+        if isinstance(section.get("content"), str) and section.get("origin_link"):
+            by_url.setdefault(section["origin_link"], []).append(section)
+    pages = [sections for sections in by_url.values() if len(sections) >= 5][:urls]
+    rng = random.Random(seed)
+    edited = [_edit(sections, rng) for sections in pages]
+    model = SentenceTransformer(model_name)
+    sizes = [len(sections) for sections in pages]
+    print(f"📦 {store.path}: {len(pages)} pages of {min(sizes)}-{max(sizes)} sections, model {model_name}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = EmbeddingCache(model_name, lambda batch: model.encode(batch, batch_size=BATCH_SIZE), tmpdir)
+        start = time.perf_counter()
+        for old, (new, _) in zip(pages, edited):
+            cache.encode_pooled([section_text(s) for s in old] + [section_text(s) for s in new])
+        print(f"    embedded both sides in {time.perf_counter() - start:.2f}s (cached for the runs below)")
+
+        def pairwise():
+            for old, (new, _) in zip(pages, edited):
+                for a in old:
+                    similarities(cache, [(section_text(a), section_text(b)) for b in new], "mean")
+
+        def full_matrix():
+            for old, (new, _) in zip(pages, edited):
+                vectors = cache.encode_pooled([section_text(s) for s in old] + [section_text(s) for s in new])
+                similarity_matrix(vectors[:len(old)], vectors[len(old):])
+
+        print(f"{'scores':<34}{'s':>8}")
+        for label, fn in (("pairwise, one row at a time", pairwise), ("full matrix", full_matrix)):
+            start = time.perf_counter()
+            fn()
+            print(f"{label:<34}{time.perf_counter() - start:>8.3f}")
+
+        print(f"{'alignment':<34}{'s':>8}{'correct':>9}   {'counts (all pages)'}")
+        for label, optimal in (("assignment" if linear_sum_assignment else "assignment (scipy missing)", True),
+                               ("greedy", False)):
+            start = time.perf_counter()
+            results = [align_sections(old, new, cache, optimal=optimal) for old, (new, _) in zip(pages, edited)]
+            seconds = time.perf_counter() - start
+            right = total = 0
+            for alignment, (_, truth) in zip(results, edited):
+                for row in alignment:
+                    if row["new"] is not None:
+                        total += 1
+                        right += row["old"] == truth[row["new"]]
+            print(f"{label:<34}{seconds:>8.3f}{right / max(total, 1):>9.1%}   "
+                  f"{describe([row for alignment in results for row in alignment])}")
+        stored = sum(len(changed_sections(a, new)) for a, (new, _) in zip(results, edited))
+        print(f"    a refresh stores {stored} of {sum(len(new) for new, _ in edited)} sections")
+        cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Align the sections of two versions of a page.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="align stored pages with edited copies")
+    bench.add_argument("database")
+    bench.add_argument("--model", default="all-MiniLM-L6-v2")
+    bench.add_argument("--urls", type=int, default=20)
+    bench.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+    benchmark(args.database, args.model, args.urls, args.data_dir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
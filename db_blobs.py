@@ -0,0 +1,405 @@
+import os
+import sys
+import time
+import zlib
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db_utils import DATA_DIR, database_lock
+from db_frames import open_write, replace_file
+from db_records import decode, dumps, project
+
+BLOBS_FILE = "blobs.db"          # not a database suffix, so it never shows up as one
+REF_FIELD = "content_ref"        # replaces "content" in a stored reference line
+SHARDS_SUFFIX = ".shards"
+SQLITE_SUFFIX = ".sqlite"
+RESOLVE_BATCH = 500              # references looked up per query when streaming
+COMPRESS_LEVEL = 6               # zlib level of stored bodies
+GC_GRACE_SECONDS = 3600          # blobs younger than this are kept: their lines may still be on the way
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    key BLOB PRIMARY KEY,        -- blob_key of the body, as 16 bytes
+    body BLOB NOT NULL,          -- zlib-compressed UTF-8
+    added REAL NOT NULL          -- unix time of the last write that stored or reused the body
+);
+"""
+
+
+def blob_key(text: str) -> str:
+    """Content address of a section body: 128-bit BLAKE2b of its UTF-8 bytes, as hex."""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _pack(body: str) -> bytes:
+    return zlib.compress(body.encode("utf-8", "surrogatepass"), COMPRESS_LEVEL)
+
+
+def _unpack(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+
+def data_dir_of(db_path: str) -> str:
+    """The data directory a database (or one shard of a sharded database) belongs to."""
+    folder = os.path.dirname(os.path.abspath(db_path))
+    if os.path.dirname(folder).endswith(SHARDS_SUFFIX):
+        return os.path.dirname(os.path.dirname(folder))
+    return folder
+
+
+def blobs_path(data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, BLOBS_FILE)
+
+
+def enabled(db_path: str) -> bool:
+    """Whether writers store the bodies of this database's sections in the shared blob store."""
+    return os.path.exists(blobs_path(data_dir_of(db_path)))
+
+
+class BlobStore:
+    """Section bodies stored once per data directory, keyed by their content hash.
+
+    Databases in a directory with a `blobs.db` keep reference lines: the section without its
+    `content`, plus `content_ref`, the body's key. Writing a body that is already stored (the
+    same page scraped into another database, or again) costs nothing but the reference. Bodies
+    are compressed one by one, so any of them can be read back on its own.
+    """
+
+    def __init__(self, path: str, create: bool = False):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if create:  # WAL mode is stored in the file, so only a new store needs setting up
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def references(self, sections: List[Dict]) -> List[Dict]:
+        """Store the bodies of sections and return them as reference records, in the same order.
+
+        The bodies are committed before this returns, so the references can be written right after.
+        Bodies already stored get their `added` time renewed in the same write transaction, so gc's
+        grace period covers every body a new line is about to point at, not only new ones.
+        Records without a string `content` are returned unchanged.
+        """
+        refs, rows = [], {}
+        for section in sections:
+            if not isinstance(section.get("content"), str):
+                refs.append(section)
+                continue
+            key = blob_key(section["content"])
+            rows[key] = section["content"]
+            refs.append({(REF_FIELD if k == "content" else k): (key if k == "content" else v) for k, v in section.items()})
+        if not rows:
+            return refs
+        stored = {key for key, in self._select("key", rows)}
+        packed = {key: _pack(body) for key, body in rows.items() if key not in stored}  # compressed outside the lock
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")  # serializes with gc's delete: a body is renewed or re-added, never lost
+            now = time.time()
+            present = {key for key, in self._select("key", rows)}
+            self.conn.executemany("UPDATE blobs SET added = ? WHERE key = ?",
+                                  [(now, bytes.fromhex(key)) for key in present])
+            self.conn.executemany("INSERT INTO blobs (key, body, added) VALUES (?, ?, ?)",
+                                  [(bytes.fromhex(key), packed.get(key) or _pack(rows[key]), now)
+                                   for key in rows if key not in present])
+        return refs
+
+    def _select(self, columns: str, keys: Iterable[str]) -> Iterator[Tuple]:
+        """Rows of the given hex keys that are stored, key first (as hex)."""
+        keys = [bytes.fromhex(key) for key in set(keys)]
+        for i in range(0, len(keys), RESOLVE_BATCH):
+            chunk = keys[i:i + RESOLVE_BATCH]
+            for row in self.conn.execute(f"SELECT {columns} FROM blobs WHERE key IN ({', '.join('?' * len(chunk))})",
+                                         chunk):
+                yield (row[0].hex(),) + row[1:]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        return {key: _unpack(body) for key, body in self._select("key, body", keys)}
+
+    def fill(self, entries: List[Optional[Dict]]) -> List[Optional[Dict]]:
+        """Put the bodies back into reference records (in place); a missing blob leaves the reference."""
+        keys = [e[REF_FIELD] for e in entries if isinstance(e, dict) and isinstance(e.get(REF_FIELD), str)]
+        if not keys:
+            return entries
+        bodies = self.get_many(keys)
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get(REF_FIELD) in bodies:
+                _inline(entry, bodies[entry[REF_FIELD]])
+        return entries
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _inline(entry: Dict, body: str) -> None:
+    """Turn a reference record back into the section it was written from, keeping the key order."""
+    items = [("content", body) if k == REF_FIELD else (k, v) for k, v in entry.items()]
+    entry.clear()
+    entry.update(items)
+
+
+def open_blobs(db_path: str, create: bool = False) -> Optional[BlobStore]:
+    """The blob store of a database's data directory, or None if that directory does not use one."""
+    path = blobs_path(data_dir_of(db_path))
+    if not create and not os.path.exists(path):
+        return None
+    return BlobStore(path, create)
+
+
+def resolve(entries: Iterable[Optional[Dict]], db_path: str) -> Iterator[Optional[Dict]]:
+    """Yield entries with the bodies of reference records filled in, looked up in batches.
+
+    The blob store is only opened once a reference shows up, so databases without any cost nothing.
+    """
+    blobs, batch = None, []
+    try:
+        for entry in entries:
+            batch.append(entry)
+            if blobs is None and isinstance(entry, dict) and REF_FIELD in entry:
+                blobs = open_blobs(db_path)
+            if len(batch) >= RESOLVE_BATCH:
+                yield from blobs.fill(batch) if blobs else batch
+                batch = []
+        yield from blobs.fill(batch) if blobs else batch
+    finally:
+        if blobs:
+            blobs.close()
+
+
+def resolve_one(entry: Optional[Dict], db_path: str) -> Optional[Dict]:
+    if isinstance(entry, dict) and REF_FIELD in entry:
+        return next(resolve([entry], db_path))
+    return entry
+
+
+def _sources(path: str) -> List[str]:
+    from storage import open_store
+
+    return open_store(path).shard_paths() if os.path.isdir(path) else [path]
+
+
+def _convert(lines: Iterable[str], blobs: BlobStore, inline: bool) -> Iterator[Tuple[str, str]]:
+    """Yield (line, reference line) pairs - or (line, whole section line) with `inline` - batch by batch.
+
+    Lines that are not sections, or already in the wanted form, come back unchanged.
+    """
+    def flush(batch):
+        entries = [decode(line) for line in batch]
+        if inline:
+            todo = [e for e in entries if isinstance(e, dict) and isinstance(e.get(REF_FIELD), str)]
+            blobs.fill(todo)
+            done = [e for e in todo if REF_FIELD not in e]
+        else:
+            done = [e for e in entries if isinstance(e, dict) and isinstance(e.get("content"), str)]
+            for entry, ref in zip(done, blobs.references(done)):
+                entry.clear()
+                entry.update(ref)
+        converted = {id(e) for e in done}
+        for line, entry in zip(batch, entries):
+            yield line, dumps(entry) if id(entry) in converted else line
+
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= RESOLVE_BATCH:
+            yield from flush(batch)
+            batch = []
+    yield from flush(batch)
+
+
+def rewrite(database: str, inline: bool = False) -> int:
+    """Rewrite a database so its sections are reference lines (or, with `inline`, whole sections again).
+
+    JSONL files are rewritten through a temp file and swapped in under the database lock, with
+    their sidecars refreshed; SQLite rows are updated in place. Returns the lines converted.
+    """
+    from storage import JsonlStore, SqliteStore
+    from db_hashlog import open_dedup_log
+    from db_index import update_index
+    from db_catalog import forget
+
+    blobs = open_blobs(database, create=not inline)
+    if blobs is None:
+        raise FileNotFoundError(f"No {BLOBS_FILE} next to {database}")
+    converted = 0
+    try:
+        for path in _sources(database):
+            with database_lock(path):
+                if path.endswith(SQLITE_SUFFIX):
+                    conn = SqliteStore(path).connect(write=True)
+                    try:
+                        rows = conn.execute("SELECT id, line FROM sections ORDER BY id").fetchall()
+                        updates = [(new, row_id) for (row_id, _), (old, new) in
+                                   zip(rows, _convert((line for _, line in rows), blobs, inline)) if new != old]
+                        with conn:
+                            conn.executemany("UPDATE sections SET line = ? WHERE id = ?", updates)
+                    finally:
+                        conn.close()
+                    converted += len(updates)
+                    forget(path)  # row ids stay the same, so the catalog would not notice
+                    continue
+                store = JsonlStore(path)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp" + store.suffix)
+                os.close(fd)
+                with open_write(tmp_path) as out:
+                    for old, new in _convert(store.iter_lines(locked=True), blobs, inline):
+                        converted += old != new
+                        out.write(new + "\n")
+                replace_file(tmp_path, path)
+                open_dedup_log(path).close()
+                update_index(path)
+    finally:
+        blobs.close()
+    return converted
+
+
+def gc(data_dir: str = DATA_DIR, grace: float = GC_GRACE_SECONDS) -> Dict:
+    """Delete blobs no database in the directory refers to any more (after deletes, replaces, compaction).
+
+    Blobs stored or reused in the last `grace` seconds are kept, because a writer stores a body
+    before the line referring to it. The age is checked again by the delete itself, so a body a
+    writer reused after the databases were read survives. Returns the blobs kept and removed and the
+    (compressed) bytes removed.
+    """
+    from storage import list_stores
+
+    if not os.path.exists(blobs_path(data_dir)):
+        return {"kept": 0, "removed": 0, "bytes": 0}
+    referenced = set()
+    for store in list_stores(data_dir):
+        for line in store.iter_lines():
+            entry = project(line, (REF_FIELD,))
+            if entry and REF_FIELD in entry:
+                referenced.add(entry[REF_FIELD])
+    blobs = BlobStore(blobs_path(data_dir))
+    try:
+        cutoff = time.time() - grace
+        stale = [(key, size) for key, size in
+                 blobs.conn.execute("SELECT key, length(body) FROM blobs WHERE added < ?", (cutoff,))
+                 if key.hex() not in referenced]
+        removed = []
+        with blobs.conn:
+            for key, size in stale:
+                if blobs.conn.execute("DELETE FROM blobs WHERE key = ? AND added < ?", (key, cutoff)).rowcount:
+                    removed.append(size)
+        kept = blobs.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    finally:
+        blobs.close()
+    return {"kept": kept, "removed": len(removed), "bytes": sum(removed)}
+
+
+def stats(data_dir: str = DATA_DIR) -> Dict:
+    """Blob count, compressed and text bytes, and how many references in the databases point at them."""
+    from storage import list_stores
+
+    references = 0
+    for store in list_stores(data_dir):
+        for line in store.iter_lines():
+            entry = project(line, (REF_FIELD,))
+            references += bool(entry and REF_FIELD in entry)
+    conn = sqlite3.connect(blobs_path(data_dir))
+    try:
+        count, body_bytes, text_bytes = 0, 0, 0
+        for body, in conn.execute("SELECT body FROM blobs"):
+            count += 1
+            body_bytes += len(body)
+            text_bytes += len(zlib.decompress(body))
+    finally:
+        conn.close()
+    return {"blobs": count, "body_bytes": body_bytes, "text_bytes": text_bytes, "references": references,
+            "file_bytes": os.path.getsize(blobs_path(data_dir))}
+
+
+def _du(folder: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(folder) for f in files)
+
+
+def benchmark(database: str, databases: int = 3, overlap: float = 0.5) -> None:
+    """Ingest overlapping slices of a database into several databases, with and without the blob store.
+
+    Each database gets a window of the URLs; consecutive windows share `overlap` of their URLs,
+    as when the same site is scraped into several topic databases.
+    """
+    from storage import JsonlStore
+
+    groups = {}
+    for section in JsonlStore(database).iter_sections():
+        if isinstance(section.get("content"), str) and "origin_link" in section:
+            groups.setdefault(section["origin_link"], []).append(section)
+    links = list(groups)
+    window = int(len(links) / (1 + (databases - 1) * (1 - overlap)))
+    step = int(window * (1 - overlap))
+    print(f"📦 {database}: {len(links)} URLs into {databases} databases of {window} URLs, {overlap:.0%} shared "
+          f"with the next")
+    print(f"{'layout':<22}{'ingest s':>10}{'written MB':>12}{'on disk MB':>12}{'read all s':>12}{'URL ms':>9}")
+    for label, shared in (("inline sections", False), ("shared blob store", True)):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            if shared:
+                BlobStore(blobs_path(tmpdir), create=True).close()
+            start = time.perf_counter()
+            for i in range(databases):
+                with JsonlStore(os.path.join(tmpdir, f"db{i}.jsonl")).writer() as writer:
+                    for link in links[i * step:i * step + window]:
+                        writer.append(groups[link])
+            ingest = time.perf_counter() - start
+            written = sum(os.path.getsize(os.path.join(tmpdir, f)) for f in os.listdir(tmpdir)
+                          if f.endswith(".jsonl") or f.startswith(BLOBS_FILE))
+            stores = [JsonlStore(os.path.join(tmpdir, f"db{i}.jsonl")) for i in range(databases)]
+            start = time.perf_counter()
+            count = sum(1 for store in stores for _ in store.iter_sections())
+            read = time.perf_counter() - start
+            sample = links[step:step + 200]
+            start = time.perf_counter()
+            for link in sample:
+                stores[1].sections_for_url(link)
+            lookup = (time.perf_counter() - start) * 1000 / len(sample)
+            print(f"{label:<22}{ingest:>10.1f}{written / 1e6:>12.1f}{_du(tmpdir) / 1e6:>12.1f}{read:>12.2f}{lookup:>9.2f}"
+                  f"   ({count} sections)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store section bodies once per data directory, keyed by content hash.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="create database/blobs.db; writers then store references")
+    conv = sub.add_parser("migrate", help="rewrite databases to reference lines (creates the blob store if needed)")
+    conv.add_argument("databases", nargs="+")
+    back = sub.add_parser("inline", help="rewrite databases with whole sections again, e.g. before copying them elsewhere")
+    back.add_argument("databases", nargs="+")
+    sub.add_parser("gc", help="delete blobs no database refers to")
+    sub.add_parser("stats", help="blob count and size against the references to them")
+    bench = sub.add_parser("bench", help="compare ingest volume and disk use with and without the blob store")
+    bench.add_argument("database")
+    bench.add_argument("--databases", type=int, default=3)
+    bench.add_argument("--overlap", type=float, default=0.5)
+    for name in ("init", "gc", "stats"):
+        sub.choices[name].add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        os.makedirs(args.data_dir, exist_ok=True)
+        BlobStore(blobs_path(args.data_dir), create=True).close()
+        print(f"✅ Created {blobs_path(args.data_dir)}; new sections in {args.data_dir}/ are stored as references")
+        return 0
+    if args.command in ("migrate", "inline"):
+        for path in args.databases:
+            start = time.perf_counter()
+            count = rewrite(path, inline=args.command == "inline")
+            print(f"✅ {path}: {count} lines rewritten ({time.perf_counter() - start:.1f}s)")
+        return 0
+    if args.command == "gc":
+        result = gc(args.data_dir)
+        print(f"🗑️ Removed {result['removed']} unreferenced blobs ({result['bytes'] / 1e6:.1f} MB), kept {result['kept']}")
+        return 0
+    if args.command == "stats":
+        result = stats(args.data_dir)
+        print(f"📦 {result['blobs']} blobs ({result['text_bytes'] / 1e6:.1f} MB of text compressed to "
+              f"{result['body_bytes'] / 1e6:.1f} MB, {result['file_bytes'] / 1e6:.1f} MB file) for {result['references']} references")
+        return 0
+    benchmark(args.database, args.databases, args.overlap)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from db_utils import DATA_DIR, database_lock
+from db_frames import open_read, logical_size
+from db_records import project
+
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+SQLITE_SUFFIX = ".sqlite"
+SCHEMAS = {b'"content":': "section", b'"content_ref":': "section", b'"text":': "document"}  # key that marks each record variant
+
+
+def catalog_path(data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, CATALOG_FILE)
+
+
+def _host(url: str) -> str:
+    try:
+        return urlparse(url).netloc.lower() or "unknown"
+    except ValueError:
+        return "unknown"
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _merge_schema(current: Optional[str], seen: Optional[str]) -> Optional[str]:
+    if seen is None or current == seen:
+        return current
+    return seen if current is None else "mixed"
+
+
+def _shard_files(path: str) -> List[str]:
+    from storage import ShardedStore
+
+    return ShardedStore(path).shard_paths()
+
+
+def fingerprint(path: str, conn: Optional[sqlite3.Connection] = None) -> Optional[List[int]]:
+    """Return what must stay equal for a catalog entry to still describe a database, or None if it is gone.
+
+    JSONL: inode, size and mtime. SQLite: inode and the highest row id, because reads alone move the
+    file's mtime (WAL checkpoints); rewrites that keep the row ids forget the entry instead.
+    Sharded: the directory's inode, then the number, total size and latest mtime of the shards.
+    """
+    try:
+        st = os.stat(path)
+        if os.path.isdir(path):
+            shards = [os.stat(shard) for shard in _shard_files(path)]
+            return [st.st_ino, len(shards), sum(s.st_size for s in shards), max((s.st_mtime_ns for s in shards), default=0)]
+    except OSError:
+        return None
+    if not path.endswith(SQLITE_SUFFIX):
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+    own = conn is None
+    conn = conn or sqlite3.connect(path, timeout=30)
+    try:
+        last_id = conn.execute("SELECT MAX(id) FROM sections").fetchone()[0]
+    except sqlite3.OperationalError:
+        last_id = None  # no table yet
+    finally:
+        if own:
+            conn.close()
+    return [st.st_ino, last_id or 0]
+
+
+def _bytes(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(shard) for shard in _shard_files(path))
+    return os.path.getsize(path)
+
+
+def _load(data_dir: str) -> Dict:
+    try:
+        with open(catalog_path(data_dir), "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("version") == CATALOG_VERSION:
+            return catalog
+    except (OSError, ValueError):
+        pass
+    return {"version": CATALOG_VERSION, "databases": {}}
+
+
+def _save(data_dir: str, catalog: Dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=data_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=1)
+    os.replace(tmp_path, catalog_path(data_dir))
+
+
+def _update(path: str, change) -> None:
+    """Apply `change(databases)` to the catalog of the database's directory under the catalog lock."""
+    data_dir = os.path.dirname(path) or "."
+    with database_lock(catalog_path(data_dir)):
+        catalog = _load(data_dir)
+        change(catalog["databases"])
+        _save(data_dir, catalog)
+
+
+class _Tally:
+    """Running counts of a scan: entries, distinct URLs and the record variant."""
+
+    def __init__(self):
+        self.entries = 0
+        self.urls = set()
+        self.schema = None
+
+    def add_line(self, line: bytes) -> None:
+        if not line.strip():
+            return
+        self.entries += 1
+        entry = project(line, ("origin_link",))
+        if entry and isinstance(entry.get("origin_link"), str):
+            self.urls.add(entry["origin_link"])
+        for key, schema in SCHEMAS.items():
+            if key in line:
+                self.schema = _merge_schema(self.schema, schema)
+                break
+
+    def scan(self, path: str, start: int, end: int) -> None:
+        """Count the lines in uncompressed bytes [start, end) of a JSONL database.
+
+        `end` is measured under the database lock, so a line ending at it is whole even without its
+        newline (a writer adds the newline before its next batch).
+        """
+        with open_read(path) as f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if pos >= end or pos + len(line.rstrip(b"\r\n")) > end:
+                    break
+                self.add_line(line)
+                pos += len(line)
+
+    def hosts(self) -> Dict[str, int]:
+        hosts = {}
+        for url in self.urls:
+            host = _host(url)
+            hosts[host] = hosts.get(host, 0) + 1
+        return hosts
+
+
+def _jsonl_entry(tally: _Tally, mtime: float) -> Dict:
+    return {"entries": tally.entries, "urls": len(tally.urls), "hosts": tally.hosts(), "schema": tally.schema,
+            "last_ingest": datetime.fromtimestamp(mtime).isoformat(timespec="seconds")}
+
+
+def _sqlite_entry(path: str) -> Dict:
+    """Count a SQLite database from its indexed columns; rows with a content hash are section records."""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        entries, sections = conn.execute("SELECT COUNT(*), COUNT(content_hash) FROM sections").fetchone()
+        hosts = {}
+        for link, in conn.execute("SELECT DISTINCT origin_link FROM sections WHERE origin_link IS NOT NULL"):
+            host = _host(link)
+            hosts[host] = hosts.get(host, 0) + 1
+        fp = fingerprint(path, conn)
+    except sqlite3.OperationalError:
+        entries = sections = 0
+        hosts = {}
+        fp = fingerprint(path, conn)
+    finally:
+        conn.close()
+    schema = None if not entries else "section" if sections == entries else "document" if not sections else "mixed"
+    return {"entries": entries, "urls": sum(hosts.values()), "hosts": hosts, "schema": schema, "fingerprint": fp,
+            "last_ingest": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")}
+
+
+def scan(path: str) -> Dict:
+    """Count a database from scratch and store the result as its catalog entry.
+
+    A JSONL file is read up to its size at the start without holding the database lock; lines
+    appended meanwhile are counted under the lock, so writers are only held up for the tail.
+    Shards of a sharded database are read the same way and counted again under the lock only if
+    a batch was written meanwhile.
+    """
+    from storage import open_store
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    store = open_store(path)
+    filename = store.filename
+    if path.endswith(SQLITE_SUFFIX):
+        with database_lock(path):
+            entry = _sqlite_entry(path)
+            entry.update(name=store.name, filename=filename, backend=store.backend, bytes=os.path.getsize(path))
+            _update(path, lambda databases: databases.__setitem__(filename, entry))
+        return entry
+    if os.path.isdir(path):
+        return _scan_shards(path, store)
+
+    tally = _Tally()
+    with database_lock(path):
+        start = fingerprint(path)
+        mark = logical_size(path)
+    tally.scan(path, 0, mark)
+    with database_lock(path):
+        current = fingerprint(path)
+        if current is None:
+            raise FileNotFoundError(path)
+        if current[0] != start[0] or logical_size(path) < mark:
+            tally = _Tally()  # rewritten meanwhile (compaction, repair): count the new file whole
+            mark = 0
+        tally.scan(path, mark, logical_size(path))
+        entry = _jsonl_entry(tally, os.path.getmtime(path))
+        entry.update(name=store.name, filename=filename, backend=store.backend, bytes=current[1], fingerprint=current)
+        _update(path, lambda databases: databases.__setitem__(filename, entry))
+    return entry
+
+
+def _scan_shards(path: str, store) -> Dict:
+    def count() -> _Tally:
+        tally = _Tally()
+        for shard in _shard_files(path):
+            tally.scan(shard, 0, logical_size(shard))
+        return tally
+
+    start = fingerprint(path)
+    tally = count()
+    with database_lock(path):
+        current = fingerprint(path)
+        if current is None:
+            raise FileNotFoundError(path)
+        if current != start:
+            tally = count()
+        entry = _jsonl_entry(tally, current[3] / 1e9 if current[3] else os.path.getmtime(path))
+        entry.update(name=store.name, filename=store.filename, backend=store.backend, bytes=current[2],
+                     fingerprint=current)
+        _update(path, lambda databases: databases.__setitem__(store.filename, entry))
+    return entry
+
+
+def record_append(path: str, before: Optional[List[int]], sections: Iterable[Dict], new_links: Iterable[str],
+                  conn: Optional[sqlite3.Connection] = None) -> None:
+    """Add sections a writer just stored to the database's catalog entry.
+
+    Called under the database lock with the fingerprint taken before the write. If the entry did not
+    describe the database as it was before (missing, or written by something that bypassed the
+    catalog), it is left stale and rebuilt by the next reader.
+    """
+    sections = list(sections)
+    after = fingerprint(path, conn)
+
+    def change(databases):
+        entry = databases.get(os.path.basename(path))
+        if entry is None or entry.get("fingerprint") != before:
+            return
+        entry["entries"] += len(sections)
+        for link in new_links:
+            host = _host(link)
+            entry["hosts"][host] = entry["hosts"].get(host, 0) + 1
+            entry["urls"] += 1
+        for section in sections:
+            entry["schema"] = _merge_schema(entry["schema"], "section" if "content" in section else
+                                            "document" if "text" in section else None)
+        entry["bytes"] = _bytes(path)
+        entry["last_ingest"] = _now()
+        entry["fingerprint"] = after
+
+    _update(path, change)
+
+
+def forget(path: str) -> None:
+    """Drop a database's catalog entry (after deleting it, or rewriting it in a way its fingerprint misses)."""
+    if os.path.exists(catalog_path(os.path.dirname(path) or ".")):
+        _update(path, lambda databases: databases.pop(os.path.basename(path), None))
+
+
+def catalog_entry(path: str) -> Dict:
+    """Return the catalog entry of one database, rescanning it only if it changed behind the catalog's back.
+
+    Keys: name, filename, path, backend, `entries` (non-blank stored lines), `urls`
+    (distinct origin links), `bytes` on disk, `hosts` (URLs per host), `last_ingest` and `schema`
+    ("section", "document", "mixed" or None when empty).
+    """
+    entry = _load(os.path.dirname(path) or ".")["databases"].get(os.path.basename(path))
+    if entry is None or entry.get("fingerprint") != fingerprint(path):
+        entry = scan(path)
+    return dict(entry, path=path)
+
+
+def catalog_entries(data_dir: str = DATA_DIR) -> List[Dict]:
+    """Return the catalog entry of every database in a directory, in name order.
+
+    Costs one stat per database (SQLite: one indexed query) plus a rescan of databases that were
+    changed by something other than the writers; the listing itself never opens the data.
+    """
+    from storage import is_database_file
+
+    if not os.path.exists(data_dir):
+        return []
+    databases = _load(data_dir)["databases"]
+    entries = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not is_database_file(filename):
+            continue
+        path = os.path.join(data_dir, filename)
+        entry = databases.get(filename)
+        if entry is None or entry.get("fingerprint") != fingerprint(path):
+            entry = scan(path)
+        entries.append(dict(entry, path=path))
+    gone = set(databases) - {entry["filename"] for entry in entries}
+    if gone:  # deleted or renamed without going through the stores
+        def drop(databases):
+            for filename in gone:
+                databases.pop(filename, None)
+        _update(catalog_path(data_dir), drop)
+    return entries
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(data_dir: str = DATA_DIR) -> None:
+    """Compare listing databases with counts through the catalog and by scanning every file."""
+    from storage import list_stores
+
+    def rescan():
+        for store in list_stores(data_dir):
+            store.count()
+            store.urls()
+
+    scan_ms = _timed(rescan)
+    for entry in catalog_entries(data_dir):
+        forget(entry["path"])
+    build_ms = _timed(lambda: catalog_entries(data_dir))
+    read_ms = min(_timed(lambda: catalog_entries(data_dir)) for _ in range(5))
+    print(f"📦 {data_dir}: {len(catalog_entries(data_dir))} databases")
+    print(f"{'operation':<30}{'ms':>10}")
+    for label, ms in (("count by scanning files", scan_ms), ("catalog rebuild", build_ms), ("catalog listing", read_ms)):
+        print(f"{label:<30}{ms:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or rebuild the database catalog (counts, URLs, hosts per database).")
+    parser.add_argument("command", choices=["list", "rebuild", "bench"])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.data_dir)
+        return 0
+    if args.command == "rebuild":
+        for entry in catalog_entries(args.data_dir):
+            forget(entry["path"])
+    entries = catalog_entries(args.data_dir)
+    if not entries:
+        print(f"📭 No databases in {args.data_dir}")
+        return 0
+    print(f"{'database':<32}{'entries':>10}{'URLs':>8}{'hosts':>7}{'MB':>9}  {'schema':<9}last ingest")
+    for entry in entries:
+        print(f"{entry['filename']:<32}{entry['entries']:>10}{entry['urls']:>8}{len(entry['hosts']):>7}"
+              f"{entry['bytes'] / 1e6:>9.1f}  {entry['schema'] or '-':<9}{entry['last_ingest']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+import os
+import sys
+import heapq
+import hashlib
+import argparse
+import tempfile
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional
+
+from db_utils import DATA_DIR, database_lock
+from db_hashlog import open_dedup_log
+from db_index import update_index
+from db_frames import open_write, replace_file
+from db_records import loads
+from db_blobs import REF_FIELD, blob_key
+from db_validate import repaired_path
+from storage import SHARDS_SUFFIX, SQLITE_SUFFIX, JsonlStore, SqliteStore, list_stores, open_store
+
+RECORD_BYTES = 80        # rough in-memory cost of one sort record, used to size runs from --memory-mb
+MEMORY_MB = 256
+
+EXACT = b"E"        # same section hash (content + origin_link), or same raw line for non-section lines
+SUPERSEDED = b"S"   # same origin_link and section number; the last occurrence is the current version
+INVALID = b"I"
+BLANK = b"B"
+REASONS = {EXACT: "exact", SUPERSEDED: "superseded", INVALID: "invalid", BLANK: "blank"}
+SEQ_BYTES = 8
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.md5(text.encode("utf-8", errors="replace")).digest()
+
+
+def _keys(line: str, exact_only: bool) -> Optional[List[bytes]]:
+    """Return the dedup keys of a stored line, or None if the line is not valid JSON."""
+    try:
+        entry = loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict) or "origin_link" not in entry:
+        return [EXACT + _digest(line)]
+    # Bodies are keyed by their blob key, so a reference line and the section it stands for match
+    body = entry.get(REF_FIELD)
+    if not isinstance(body, str):
+        body = blob_key(entry["content"]) if isinstance(entry.get("content"), str) else None
+    if body is None:
+        return [EXACT + _digest(line)]
+    keys = [EXACT + _digest(f"{body}\0{entry['origin_link']}")]
+    # The raw link, as the writers' dedup uses: normalize_url drops the query, and ?page=1 and ?page=2
+    # are different pages whose sections must not supersede each other
+    if not exact_only and "section" in entry:
+        keys.append(SUPERSEDED + _digest(f"{entry['origin_link']}\0{entry['section']}"))
+    return keys
+
+
+class _ExternalSorter:
+    """Sorts fixed-size byte records in bounded memory by spilling sorted runs to disk."""
+
+    def __init__(self, record_size: int, max_records: int, tmpdir: str):
+        self.record_size = record_size
+        self.max_records = max_records
+        self.tmpdir = tmpdir
+        self.buffer = []
+        self.runs = []
+
+    def add(self, record: bytes) -> None:
+        self.buffer.append(record)
+        if len(self.buffer) >= self.max_records:
+            self._spill()
+
+    def _spill(self) -> None:
+        self.buffer.sort()
+        fd, path = tempfile.mkstemp(dir=self.tmpdir, suffix=".run")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(self.buffer))
+        self.runs.append(path)
+        self.buffer = []
+
+    def _read_run(self, path: str) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(self.record_size * 4096)
+                if not chunk:
+                    break
+                for i in range(0, len(chunk), self.record_size):
+                    yield chunk[i:i + self.record_size]
+
+    def sorted(self) -> Iterator[bytes]:
+        """Yield all records in order; the in-memory buffer is used directly when nothing spilled."""
+        if not self.runs:
+            self.buffer.sort()
+            yield from self.buffer
+            return
+        if self.buffer:
+            self._spill()
+        yield from heapq.merge(*(self._read_run(path) for path in self.runs))
+
+
+def _iter_inputs(paths: List[str]) -> Iterator[str]:
+    """Yield stored lines of every input in order: files first to last, lines in file order."""
+    for path in paths:
+        yield from open_store(path).iter_lines()
+
+
+def _drop_set(paths: List[str], exact_only: bool, drop_invalid: bool, max_records: int, tmpdir: str,
+              stats: Dict) -> Iterator[int]:
+    """Pass 1: return the sorted, distinct sequence numbers of lines to drop.
+
+    Every line contributes (key, seq) records; after an external sort each key group keeps its
+    highest sequence number (the latest copy) and every other member becomes a (seq, reason) drop.
+    """
+    keys_sorter = _ExternalSorter(1 + 16 + SEQ_BYTES, max_records, tmpdir)
+    drops = _ExternalSorter(SEQ_BYTES + 1, max_records, tmpdir)
+    for seq, line in enumerate(_iter_inputs(paths)):
+        stats["lines_in"] += 1
+        if not line.strip():
+            drops.add(seq.to_bytes(SEQ_BYTES, "big") + BLANK)
+            continue
+        keys = _keys(line, exact_only)
+        if keys is None:
+            if drop_invalid:
+                drops.add(seq.to_bytes(SEQ_BYTES, "big") + INVALID)
+            else:
+                stats["invalid_kept"] += 1
+            continue
+        for key in keys:
+            keys_sorter.add(key + seq.to_bytes(SEQ_BYTES, "big"))
+
+    group, members = None, []
+    for record in keys_sorter.sorted():
+        key, seq = record[:-SEQ_BYTES], record[-SEQ_BYTES:]
+        if key != group:
+            # Records sort by seq within a key, so the last member is the newest copy
+            for member in members[:-1]:
+                drops.add(member + group[:1])
+            group, members = key, []
+        members.append(seq)
+    for member in members[:-1]:
+        drops.add(member + group[:1])
+
+    # A line can lose under both keys; count it once, as an exact duplicate ("E" sorts first)
+    previous = None
+    for record in drops.sorted():
+        seq = int.from_bytes(record[:SEQ_BYTES], "big")
+        if seq != previous:
+            stats[REASONS[record[SEQ_BYTES:]]] += 1
+            previous = seq
+            yield seq
+
+
+def _survivors(paths: List[str], drops: Iterator[int], stats: Dict) -> Iterator[str]:
+    """Pass 2: stream the inputs again, skipping the sequence numbers in the sorted drop stream."""
+    next_drop = next(drops, None)
+    for seq, line in enumerate(_iter_inputs(paths)):
+        if seq == next_drop:
+            next_drop = next(drops, None)
+            continue
+        stats["lines_out"] += 1
+        yield line
+
+
+def _size(path: str) -> int:
+    total = 0
+    for suffix in ("", "-wal"):
+        if os.path.exists(path + suffix):
+            total += os.path.getsize(path + suffix)
+    return total
+
+
+def compact(inputs: List[str], output: str, exact_only: bool = False, drop_invalid: bool = False,
+            memory_mb: int = MEMORY_MB, dry_run: bool = False) -> Dict:
+    """Deduplicate one or more databases into `output`, replacing it atomically.
+
+    Exact duplicates and superseded versions of a section (same origin_link and section number) keep only
+    their latest copy; later inputs count as newer than earlier ones. Memory stays bounded by
+    `memory_mb`: keys are sorted externally in temp runs and the inputs are streamed twice.
+    Run it while nothing is ingesting into the inputs; if one grows meanwhile the output is discarded.
+
+    Returns:
+        Dict: line counts per reason and the bytes before and after.
+    """
+    if output.endswith(SHARDS_SUFFIX):
+        raise ValueError(f"{output}: cannot write a sharded database; compact its shards in place instead")
+    stats = {"lines_in": 0, "lines_out": 0, "exact": 0, "superseded": 0, "invalid": 0, "blank": 0, "invalid_kept": 0,
+             "bytes_before": sum(_size(p) for p in set(inputs)), "bytes_after": 0}
+    sizes = {path: _size(path) for path in inputs}
+    max_records = max(1000, memory_mb * 1024 * 1024 // RECORD_BYTES // 2)  # two sorters share the budget
+    out_dir = os.path.dirname(output) or "."
+    os.makedirs(out_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmpdir:
+        drops = _drop_set(inputs, exact_only, drop_invalid, max_records, tmpdir, stats)
+        if dry_run:
+            dropped = sum(1 for _ in drops)
+            stats["lines_out"] = stats["lines_in"] - dropped
+            return stats
+
+        tmp_path = os.path.join(tmpdir, "compacted" + (SQLITE_SUFFIX if output.endswith(SQLITE_SUFFIX) else JsonlStore(output).suffix))
+        lines = _survivors(inputs, drops, stats)
+        if output.endswith(SQLITE_SUFFIX):
+            SqliteStore(tmp_path).import_lines(lines)
+        else:
+            with open_write(tmp_path) as out:
+                for line in lines:
+                    out.write(line + "\n")
+
+        # Writers hold these locks while appending, so nothing lands between the check and the swap
+        with ExitStack() as locks:
+            for path in sorted(set(inputs) | {output}):
+                locks.enter_context(database_lock(path))
+            changed = [path for path, size in sizes.items() if _size(path) != size]
+            if changed:
+                raise RuntimeError(f"{', '.join(changed)} changed during compaction; output discarded")
+            if output.endswith(SQLITE_SUFFIX):
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(output + suffix):
+                        os.remove(output + suffix)
+            replace_file(tmp_path, output)
+
+            if not output.endswith(SQLITE_SUFFIX):
+                # Sidecars notice the rewrite on their own; refresh them now rather than on first use
+                open_dedup_log(output).close()
+                update_index(output)
+    stats["bytes_after"] = _size(output)
+    return stats
+
+
+def _report(label: str, stats: Dict) -> None:
+    reclaimed = stats["bytes_before"] - stats["bytes_after"] if stats["bytes_after"] else 0
+    print(f"✅ {label}: {stats['lines_in']} → {stats['lines_out']} lines "
+          f"({stats['exact']} exact duplicates, {stats['superseded']} superseded, "
+          f"{stats['invalid']} invalid, {stats['blank']} blank removed)")
+    if stats["invalid_kept"]:
+        print(f"   ⚠️ Kept {stats['invalid_kept']} invalid lines; use --drop-invalid to remove them")
+    if stats["bytes_after"]:
+        print(f"   {stats['bytes_before'] / 1e6:.1f} MB → {stats['bytes_after'] / 1e6:.1f} MB, "
+              f"{'reclaimed' if reclaimed >= 0 else 'grew by'} {abs(reclaimed) / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Remove duplicate and superseded sections from databases, or merge several into one.",
+        epilog="Examples:\n"
+               "  python db_compact.py compact database/handbooks.jsonl\n"
+               "  python db_compact.py compact --all --remove-repaired\n"
+               "  python db_compact.py merge database/a.jsonl database/b.jsonl --out database/merged.jsonl",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    comp = sub.add_parser("compact", help="compact each database in place")
+    comp.add_argument("databases", nargs="*", help="paths to .jsonl or .sqlite files or .shards directories")
+    comp.add_argument("--all", action="store_true", help=f"compact every database in {DATA_DIR}/")
+    comp.add_argument("--remove-repaired", action="store_true",
+                      help="delete the <name>_repaired copy the Manage page wrote of each database after compacting it")
+    merge = sub.add_parser("merge", help="merge databases into one; later inputs win over earlier ones")
+    merge.add_argument("databases", nargs="+", help="paths to .jsonl or .sqlite files, oldest first")
+    merge.add_argument("--out", required=True, help="output .jsonl or .sqlite path (may be one of the inputs; not .shards)")
+    merge.add_argument("--delete-inputs", action="store_true", help="delete the inputs after a successful merge")
+    for p in (comp, merge):
+        p.add_argument("--exact-only", action="store_true", help="only remove exact duplicates")
+        p.add_argument("--drop-invalid", action="store_true", help="also drop lines that are not valid JSON")
+        p.add_argument("--memory-mb", type=int, default=MEMORY_MB, help="sort memory budget (default: %(default)s)")
+        p.add_argument("--dry-run", action="store_true", help="report what would be removed without writing")
+    args = parser.parse_args()
+    options = dict(exact_only=args.exact_only, drop_invalid=args.drop_invalid,
+                   memory_mb=args.memory_mb, dry_run=args.dry_run)
+
+    if args.command == "merge":
+        if args.out.endswith(SHARDS_SUFFIX):
+            parser.error("--out cannot be a sharded database; merge into a .jsonl or .sqlite file")
+        stats = compact(args.databases, args.out, **options)
+        _report(f"merged {len(args.databases)} databases into {args.out}", stats)
+        if args.delete_inputs and not args.dry_run:
+            for path in args.databases:
+                if os.path.abspath(path) != os.path.abspath(args.out):
+                    open_store(path).delete()
+                    print(f"🗑️ Deleted {path}")
+        return 0
+
+    databases = args.databases or ([store.path for store in list_stores(DATA_DIR)] if args.all else [])
+    if not databases:
+        parser.error("give database paths or --all")
+    for database in databases:
+        if not os.path.exists(database):  # a repaired copy removed after compacting its original
+            continue
+        # Shards are compacted one by one; duplicates across a host's months are left to the writers' dedup
+        for path in open_store(database).shard_paths() if os.path.isdir(database) else [database]:
+            stats = compact([path], path, **options)
+            _report(path, stats)
+        copy = repaired_path(database)
+        if args.remove_repaired and not args.dry_run and os.path.exists(copy):
+            open_store(copy).delete()
+            print(f"🗑️ Removed {copy}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
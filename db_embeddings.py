@@ -0,0 +1,478 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db_utils import DATA_DIR, database_lock
+
+CACHE_DIR = "embeddings"          # under the data directory; not a database suffix, so never listed as one
+MAX_MB = 512                      # vector file size per model; the least recently used vectors go beyond it
+EVICT_FRACTION = 0.05             # share of the slots freed at once when the cache is full
+TOUCH_SECONDS = 3600              # a hit refreshes an entry's last use at most this often
+BATCH_SIZE = 8                    # texts per model forward pass; larger batches ran slower on CPU (see bench)
+FLUSH_PAIRS = 64                  # pairs a PairBatch collects before scoring them together
+CHUNK_WORDS = 160                 # words per chunk; ~1.3 word pieces a word keeps it inside a 256-token model window
+POOLINGS = ("mean", "max")        # how chunk vectors combine into one vector per text
+
+SENTENCE_END = re.compile(r"(?<=[.!?:;])\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key BLOB PRIMARY KEY,         -- SHA-256 of the normalized text
+    slot INTEGER NOT NULL,        -- row of the vector in the .f32 file
+    used REAL NOT NULL            -- unix time of the last use (see TOUCH_SECONDS)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_used ON entries(used);
+CREATE TABLE IF NOT EXISTS free (slot INTEGER PRIMARY KEY);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """The form texts are embedded and keyed in: NFC, with runs of whitespace collapsed to one space."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def chunk_text(text: str, max_words: int = CHUNK_WORDS) -> List[str]:
+    """Split text into windows of at most max_words words, breaking at paragraph and sentence ends.
+
+    Sentences (and paragraphs, so headings end a sentence too) are packed greedily; only a single
+    sentence longer than a window is cut mid-sentence. Words are counted instead of model tokens so
+    a huge page is never tokenized whole. A text that fits one window comes back as one chunk,
+    keyed like the unchunked text.
+    """
+    chunks, window = [], []
+    for paragraph in re.split(r"\n\s*\n", text):
+        for sentence in SENTENCE_END.split(paragraph):
+            words = sentence.split()
+            while words:
+                if window and len(window) + len(words) > max_words:
+                    chunks.append(" ".join(window))
+                    window = []
+                room = max_words - len(window)
+                window.extend(words[:room])
+                words = words[room:]
+    if window:
+        chunks.append(" ".join(window))
+    return chunks or [""]
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(normalize_text(text).encode("utf-8", "surrogatepass")).digest()
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_name.strip("/")) or "model"
+
+
+class EmbeddingCache:
+    """Persistent embeddings of one model, keyed by the SHA-256 of the normalized text.
+
+    Vectors live in `<data_dir>/embeddings/<model>.f32`, a float32 matrix read through a memory
+    map, so looking one up costs an index query and a row copy; `<model>.keys` (SQLite) maps keys
+    to rows. The file is bounded by `max_mb`: when it is full the least recently used vectors are
+    dropped and their rows reused. Writes (and reads, so a row is never reused under a reader)
+    take the cache's lock, which also separates processes sharing the data directory.
+
+    `encode(texts)` computes the vectors of the texts that are missing, all in one call; hits
+    and misses are counted so callers can report the hit rate of a run (see counts()).
+    """
+
+    def __init__(self, model_name: str, encode: Callable[[List[str]], np.ndarray], data_dir: str = DATA_DIR,
+                 max_mb: float = MAX_MB):
+        self.model_name = model_name
+        self.encode_fn = encode
+        folder = os.path.join(data_dir, CACHE_DIR)
+        os.makedirs(folder, exist_ok=True)
+        self.vectors_path = os.path.join(folder, _slug(model_name) + ".f32")
+        self.keys_path = os.path.join(folder, _slug(model_name) + ".keys")
+        self.max_mb = max_mb
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._map = None
+        self.conn = sqlite3.connect(self.keys_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.dim = self._meta("dim")
+
+    def _meta(self, name: str) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return int(row[0]) if row else None
+
+    def _set_meta(self, name: str, value: int) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, str(value)))
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.max_mb * 1024 * 1024) // (self.dim * 4)) if self.dim else 0
+
+    def _rows(self, slots: Sequence[int]) -> np.ndarray:
+        """Copies of some rows of the vector file, remapping it if it grew since it was mapped."""
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        if self._map is None or self._map.shape[0] < rows:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return np.array(self._map[np.asarray(slots, dtype=np.int64)])
+
+    def _select(self, columns: str, keys: Sequence[bytes]) -> List[Tuple]:
+        rows = []
+        for i in range(0, len(keys), 500):
+            chunk = list(keys[i:i + 500])
+            rows.extend(self.conn.execute(f"SELECT {columns} FROM entries WHERE key IN ({', '.join('?' * len(chunk))})",
+                                          chunk))
+        return rows
+
+    def get_many(self, texts: Sequence[str]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors of some texts by key; texts that are not cached are left out."""
+        keys = list({text_key(text) for text in texts})
+        if not keys or self.dim is None:
+            return {}
+        with self._lock, database_lock(self.keys_path):
+            found = self._select("key, slot, used", keys)
+            if not found:
+                return {}
+            vectors = self._rows([slot for _, slot, _ in found])
+            now = time.time()
+            stale = [(now, key) for key, _, used in found if used < now - TOUCH_SECONDS]
+            if stale:
+                with self.conn:
+                    self.conn.executemany("UPDATE entries SET used = ? WHERE key = ?", stale)
+        return {key: vector for (key, _, _), vector in zip(found, vectors)}
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Store vectors of new keys, evicting the least recently used ones if the file is full."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, database_lock(self.keys_path):
+            if self.dim is None:
+                self.dim = self._meta("dim") or vectors.shape[1]
+                with self.conn:
+                    self._set_meta("dim", self.dim)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"{self.model_name} vectors have {vectors.shape[1]} dimensions, the cache {self.dim}")
+            stored = {key for key, in self._select("key", keys)}
+            new = [(key, vector) for key, vector in dict(zip(keys, vectors)).items() if key not in stored]
+            new = new[:self.capacity]
+            if not new:
+                return
+            # Rows are only ever written while listed in `free`: the eviction that frees them commits
+            # first, and the index points at them in a later transaction, so a crash in between leaves
+            # free rows with stray bytes rather than an entry serving another text's vector.
+            with self.conn:
+                slots = self._allocate(len(new))
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "w+b") as f:
+                for slot, (_, vector) in sorted(zip(slots, new)):
+                    f.seek(slot * self.dim * 4)
+                    f.write(vector.tobytes())
+            now = time.time()
+            with self.conn:
+                self.conn.executemany("DELETE FROM free WHERE slot = ?", [(slot,) for slot in slots])
+                self.conn.executemany("INSERT OR REPLACE INTO entries (key, slot, used) VALUES (?, ?, ?)",
+                                      [(key, slot, now) for slot, (key, _) in zip(slots, new)])
+
+    def _allocate(self, count: int) -> List[int]:
+        """Make sure `count` rows are free - new rows first, then rows of evicted entries - and return them.
+
+        Grown and evicted rows go into `free`; they leave it when the entries pointing at them are inserted.
+        """
+        available = self.conn.execute("SELECT COUNT(*) FROM free").fetchone()[0]
+        rows = self._meta("rows") or 0
+        grow = min(count - available, self.capacity - rows)
+        if grow > 0:
+            self.conn.executemany("INSERT INTO free (slot) VALUES (?)", [(slot,) for slot in range(rows, rows + grow)])
+            self._set_meta("rows", rows + grow)
+            available += grow
+        short = count - available
+        if short > 0:
+            evict = max(short, int(self.capacity * EVICT_FRACTION))
+            victims = self.conn.execute("SELECT key, slot FROM entries ORDER BY used LIMIT ?", (evict,)).fetchall()
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            self.conn.executemany("INSERT OR IGNORE INTO free (slot) VALUES (?)", [(slot,) for _, slot in victims])
+        return [slot for slot, in self.conn.execute("SELECT slot FROM free ORDER BY slot LIMIT ?", (count,))]
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Vectors of texts, in order: cached ones read back, the rest encoded in one call and stored."""
+        keys = [text_key(text) for text in texts]
+        found = self.get_many(texts)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = normalize_text(text)
+        if missing:
+            vectors = np.asarray(self.encode_fn(list(missing.values())), dtype=np.float32)
+            found.update(zip(missing, vectors))
+            self.put_many(list(missing), vectors)
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return np.stack([found[key] for key in keys]) if keys else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def encode_pooled(self, texts: Sequence[str], pooling: str = "mean", max_words: int = CHUNK_WORDS) -> np.ndarray:
+        """One vector per text from all of it: the text's chunks (see chunk_text) are encoded and cached
+        like any other text, in one encode() call for all texts, then pooled.
+
+        "mean" weights each chunk by its words, so a short trailing chunk counts for little;
+        "max" takes each dimension's largest value over the chunks.
+        """
+        if pooling not in POOLINGS:
+            raise ValueError(f"Unknown pooling {pooling!r}; expected one of {', '.join(POOLINGS)}")
+        chunked = [chunk_text(text, max_words) for text in texts]
+        vectors = self.encode([chunk for chunks in chunked for chunk in chunks])
+        pooled, start = [], 0
+        for chunks in chunked:
+            rows = vectors[start:start + len(chunks)]
+            start += len(chunks)
+            if pooling == "max":
+                pooled.append(rows.max(axis=0))
+            else:
+                weights = np.array([max(len(chunk.split()), 1) for chunk in chunks], dtype=np.float32)
+                pooled.append(weights @ rows / weights.sum())
+        return np.stack(pooled) if pooled else vectors
+
+    def counts(self) -> Tuple[int, int]:
+        """(hits, misses) so far; subtract an earlier snapshot to get one run's."""
+        return self.hits, self.misses
+
+    def summary(self, since: Tuple[int, int] = (0, 0)) -> str:
+        hits, misses = self.hits - since[0], self.misses - since[1]
+        rate = hits / (hits + misses) if hits + misses else 0.0
+        return f"🧠 Embedding cache: {hits} hits, {misses} misses ({rate:.0%} hit rate)"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"model": self.model_name, "entries": entries, "dim": self.dim, "capacity": self.capacity,
+                "bytes": os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0}
+
+    def close(self) -> None:
+        self._map = None
+        self.conn.close()
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> float:
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / denominator if denominator else 0.0
+
+
+def cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise cosine of two (n, dim) arrays in one vectorised pass; 0 where either row is all zeros."""
+    denominator = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    dots = np.einsum("ij,ij->i", a, b)
+    return np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+
+
+def similarities(cache: EmbeddingCache, pairs: Sequence[Tuple[str, str]], pooling: Optional[str] = None) -> List[float]:
+    """Cosine similarity of each (a, b) pair; every distinct text is looked up or encoded once.
+
+    With a pooling ("mean" or "max") texts are compared by their pooled chunk vectors, so all of a
+    long page counts; without one each text is encoded whole and the model truncates it.
+    """
+    if not pairs:
+        return []
+    unique = list(dict.fromkeys(text for pair in pairs for text in pair))
+    vectors = cache.encode_pooled(unique, pooling) if pooling else cache.encode(unique)
+    row = {text: i for i, text in enumerate(unique)}
+    left = vectors[[row[a] for a, _ in pairs]]
+    right = vectors[[row[b] for _, b in pairs]]
+    return cosines(left, right).tolist()
+
+
+class PairBatch:
+    """Collects text pairs and scores them FLUSH_PAIRS at a time, handing each score to done(tag, score).
+
+    Use as a context manager so the last partial batch is scored on exit; call flush() to score early.
+    With `failed(tag, error)`, a batch that fails is scored pair by pair and only the pairs that still
+    fail are handed to it, so one bad text costs its own score and no one else's.
+    """
+
+    def __init__(self, score: Callable[[Sequence[Tuple[str, str]]], List[float]],
+                 done: Callable[[object, float], None], size: int = FLUSH_PAIRS,
+                 failed: Optional[Callable[[object, Exception], None]] = None):
+        self.score, self.done, self.size, self.failed = score, done, size, failed
+        self.pending: List[Tuple[str, str, object]] = []
+
+    def add(self, a: str, b: str, tag: object = None) -> None:
+        self.pending.append((a, b, tag))
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Score the pending pairs; if scoring fails without `failed`, they stay pending for a later flush."""
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        try:
+            scores = self.score([(a, b) for a, b, _ in pending])
+        except Exception:
+            if self.failed is None:
+                self.pending = pending + self.pending
+                raise
+            for a, b, tag in pending:
+                try:
+                    score = self.score([(a, b)])[0]
+                except Exception as error:
+                    self.failed(tag, error)
+                else:
+                    self.done(tag, score)
+            return
+        for (_, _, tag), score in zip(pending, scores):
+            self.done(tag, score)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+def _models(data_dir: str) -> List[str]:
+    folder = os.path.join(data_dir, CACHE_DIR)
+    return sorted(f[:-len(".keys")] for f in os.listdir(folder) if f.endswith(".keys")) if os.path.isdir(folder) else []
+
+
+def benchmark(database: str, model_name: str, pairs: int = 200, data_dir: str = DATA_DIR) -> None:
+    """Time similarity scores of section pairs uncached, per pair and batched on a cold cache, and on a warm one."""
+    import tempfile
+    from sentence_transformers import SentenceTransformer
+    from storage import is_database_file, open_database, open_store
+
+    store = open_store(database) if is_database_file(database) else open_database(database, data_dir)
+    texts = []
+    for section in store.iter_sections():
+        if isinstance(section.get("content"), str) and section["content"].strip():
+            texts.append(section["content"])
+            if len(texts) >= pairs * 2:
+                break
+    model = SentenceTransformer(model_name)
+    model.encode(texts[:BATCH_SIZE], batch_size=BATCH_SIZE)  # warm up, so the first run is not charged for it
+    pairs_list = list(zip(texts[::2], texts[1::2]))
+
+    def uncached():
+        for a, b in pairs_list:
+            cosine(model.encode(a), model.encode(b))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        per_pair_cache = EmbeddingCache(model_name, lambda batch: model.encode(batch, batch_size=BATCH_SIZE),
+                                        os.path.join(tmpdir, "per_pair"))
+        cache = EmbeddingCache(model_name, lambda batch: model.encode(batch, batch_size=BATCH_SIZE),
+                               os.path.join(tmpdir, "batched"))
+
+        def per_pair():
+            for a, b in pairs_list:
+                va, vb = per_pair_cache.encode([a, b])
+                cosine(va, vb)
+
+        def batched():
+            with PairBatch(lambda batch: similarities(cache, batch), lambda tag, score: None) as batch:
+                for a, b in pairs_list:
+                    batch.add(a, b)
+
+        print(f"📦 {store.path}: {len(pairs_list)} section pairs, model {model_name}, "
+              f"{FLUSH_PAIRS} pairs per flush, {BATCH_SIZE} texts per forward pass")
+        print(f"{'run':<28}{'s':>8}{'pairs/s':>10}   cache")
+        for label, fn, used in (("no cache, per pair", uncached, None), ("cold cache, per pair", per_pair, per_pair_cache),
+                                ("cold cache, batched", batched, cache), ("warm cache, batched", batched, cache)):
+            before = used.counts() if used else None
+            start = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - start
+            report = used.summary(before) if used else ""
+            print(f"{label:<28}{seconds:>8.2f}{len(pairs_list) / seconds:>10.0f}   {report}")
+        print(f"    {cache.stats()['bytes'] / 1e6:.2f} MB on disk")
+        per_pair_cache.close()
+        cache.close()
+
+
+def page_benchmark(database: str, model_name: str, pages: int = 50, data_dir: str = DATA_DIR) -> None:
+    """Compare whole pages (all sections of a URL) encoded whole, where the model truncates them, and
+    chunked with each pooling; then rescore after editing one sentence per page."""
+    import tempfile
+    from sentence_transformers import SentenceTransformer
+    from storage import is_database_file, open_database, open_store
+
+    store = open_store(database) if is_database_file(database) else open_database(database, data_dir)
+    by_url: Dict[str, List[str]] = {}
+    for section in store.iter_sections():
+        if isinstance(section.get("content"), str) and section.get("origin_link"):
+            by_url.setdefault(section["origin_link"], []).append(section["content"])
+    texts = ["\n\n".join(parts) for parts in list(by_url.values())[:pages * 2]]
+    pairs_list = list(zip(texts[::2], texts[1::2]))
+    edited = [(a, b.replace(".", ". Updated.", 1)) for a, b in pairs_list]
+    model = SentenceTransformer(model_name)
+    window = model.max_seq_length
+    model.encode(texts[:BATCH_SIZE], batch_size=BATCH_SIZE)  # warm up
+    tokens = [len(model.tokenizer(text, add_special_tokens=False)["input_ids"]) for text in texts]
+    seen = sum(min(count, window - 2) for count in tokens) / max(sum(tokens), 1)
+    words = [len(text.split()) for text in texts]
+
+    print(f"📦 {store.path}: {len(pairs_list)} page pairs, {sum(words) / len(words):.0f} words a page on average "
+          f"(longest {max(words)}), model window {window} tokens, {CHUNK_WORDS} words per chunk")
+    print(f"{'run':<36}{'s':>8}{'pairs/s':>10}{'text seen':>11}   cache")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for pooling in (None, "mean", "max"):
+            cache = EmbeddingCache(model_name, lambda batch: model.encode(batch, batch_size=BATCH_SIZE),
+                                   os.path.join(tmpdir, pooling or "whole"))
+            for label, batch in (("cold", pairs_list), ("one sentence edited", edited)):
+                before = cache.counts()
+                start = time.perf_counter()
+                similarities(cache, batch, pooling)
+                seconds = time.perf_counter() - start
+                name = f"{'chunked, ' + pooling if pooling else 'whole (truncated)'}, {label}"
+                print(f"{name:<36}{seconds:>8.2f}{len(batch) / seconds:>10.1f}{1.0 if pooling else seen:>11.0%}   "
+                      f"{cache.summary(before)}")
+            cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent embedding cache keyed by model and text hash.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="entries and size per model")
+    clear = sub.add_parser("clear", help="delete the cache of a model")
+    clear.add_argument("model")
+    bench = sub.add_parser("bench", help="time similarity of section pairs with and without the cache")
+    bench.add_argument("database")
+    bench.add_argument("--model", default="all-MiniLM-L6-v2")
+    bench.add_argument("--pairs", type=int, default=200)
+    bench_pages = sub.add_parser("bench-pages", help="time whole-page similarity truncated and chunked")
+    bench_pages.add_argument("database")
+    bench_pages.add_argument("--model", default="all-MiniLM-L6-v2")
+    bench_pages.add_argument("--pages", type=int, default=50)
+    for p in (sub.choices["stats"], clear, bench, bench_pages):
+        p.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        for slug in _models(args.data_dir):
+            cache = EmbeddingCache(slug, None, args.data_dir)
+            stats = cache.stats()
+            cache.close()
+            print(f"🧠 {slug}: {stats['entries']} vectors of {stats['dim']} dimensions, {stats['bytes'] / 1e6:.1f} MB "
+                  f"(room for {stats['capacity']})")
+        return 0
+    if args.command == "clear":
+        folder = os.path.join(args.data_dir, CACHE_DIR)
+        slug = _slug(args.model)
+        for suffix in (".f32", ".keys", ".keys-wal", ".keys-shm", ".keys.lock"):
+            if os.path.exists(os.path.join(folder, slug + suffix)):
+                os.remove(os.path.join(folder, slug + suffix))
+        print(f"🗑️ Cleared the {args.model} embedding cache")
+        return 0
+    if args.command == "bench-pages":
+        page_benchmark(args.database, args.model, args.pages, args.data_dir)
+        return 0
+    benchmark(args.database, args.model, args.pairs, args.data_dir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
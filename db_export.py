@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import uuid
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from db_utils import DATA_DIR
+from db_records import decode, dumps, content_of, heading_of, external_links_of
+from db_blobs import resolve
+from storage import is_database_file, list_stores, open_database, open_store
+
+EXPORT_DIR = "exports"
+STATE_FILE = "_export_state.json"
+STATE_VERSION = 2
+BATCH_ROWS = 50_000
+PARTITIONS = {"host": "host", "date": "ingest_date"}
+
+# Stable column set for every export; fields outside it are kept as JSON in `extra`
+SCHEMA = pa.schema([
+    ("section", pa.int64()),
+    ("heading", pa.string()),
+    ("content", pa.string()),
+    ("origin_link", pa.string()),
+    ("external_links", pa.list_(pa.string())),
+    ("last_updated", pa.string()),
+    ("tags", pa.list_(pa.string())),
+    ("extra", pa.string()),
+])
+SCHEMA_FIELDS = set(SCHEMA.names) - {"extra"}
+SCHEMA_ALIASES = {"document": "heading", "text": "content", "external_link": "external_links"}  # document-style records
+
+
+def _open(database: str, data_dir: str = DATA_DIR):
+    """The store of a database given as a file path or as a name (see open_database)."""
+    return open_store(database) if is_database_file(database) else open_database(database, data_dir)
+
+
+def export_path(filename: str, export_dir: str = EXPORT_DIR) -> str:
+    """Return the Parquet dataset directory of a database, keyed by its file name.
+
+    The file name, not the bare name, so foo.jsonl and foo.sqlite never share (and rebuild) one dataset.
+    """
+    return os.path.join(export_dir, filename)
+
+
+def _host(url) -> str:
+    try:
+        host = urlparse(url).netloc.lower() if isinstance(url, str) else ""
+    except ValueError:
+        host = ""
+    return host.replace(":", "_") or "unknown"
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _str_list(value) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def _str(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _row(entry: Dict) -> Dict:
+    """Coerce one stored section (or document-style record) to the export schema."""
+    mapped = SCHEMA_FIELDS | {alias for alias, field in SCHEMA_ALIASES.items() if entry.get(field) is None}
+    extra = {k: v for k, v in entry.items() if k not in mapped}
+    return {
+        "section": _int(entry.get("section")),
+        "heading": _str(heading_of(entry)),
+        "content": _str(content_of(entry)),
+        "origin_link": _str(entry.get("origin_link")),
+        "external_links": external_links_of(entry),
+        "last_updated": _str(entry.get("last_updated")),
+        "tags": _str_list(entry.get("tags")),
+        "extra": dumps(extra) if extra else None,
+    }
+
+
+def _line_check(line: str) -> str:
+    return hashlib.md5(line.encode("utf-8", errors="replace")).hexdigest()
+
+
+def _load_state(dataset: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(dataset, STATE_FILE), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if state.get("version") == STATE_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(dataset: str, state: Dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=dataset, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, os.path.join(dataset, STATE_FILE))
+
+
+def _parts(store) -> List[Tuple[str, object]]:
+    """The files an export tracks its progress in: each shard of a sharded database, else the database.
+
+    Shards are tracked one by one because appends to any host's shard shift the lines of the shards
+    after it, so one global line count would look like a rewrite after almost every ingest.
+    """
+    if hasattr(store, "shard_paths"):
+        return [(os.path.relpath(path, store.path).replace(os.sep, "/"), open_store(path))
+                for path in store.shard_paths()]
+    return [(store.filename, store)]
+
+
+def _unchanged(part, progress: Dict) -> bool:
+    """Whether the lines of a part exported so far are still stored as they were."""
+    lines = progress["lines"]
+    if lines > part.line_count():
+        return False
+    last = part.read_page(lines - 1, 1) if lines else []
+    return not lines or bool(last and _line_check(last[0]) == progress["last_line_check"])
+
+
+def _iter_batches(store, start: int, batch_rows: int) -> Iterator[List[str]]:
+    while True:
+        lines = store.read_page(start, batch_rows)
+        if not lines:
+            return
+        yield lines
+        start += len(lines)
+
+
+def export_database(database: str, partition_by: str = "host", data_dir: str = DATA_DIR,
+                    export_dir: str = EXPORT_DIR, batch_rows: int = BATCH_ROWS) -> Dict:
+    """Append rows stored since the last export of a database to its partitioned Parquet dataset.
+
+    `database` is a database file path, or a name resolved like open_database (which prefers plain
+    JSONL). The dataset lives in exports/<file name>/ with hive-style partitions (host=<netloc>/ or
+    ingest_date=<YYYY-MM-DD>/, the date of the export run that first wrote the row). The export
+    state records, per file (each shard of a sharded database), how many stored lines were exported
+    and a hash of the last one; if a file shrank, was rewritten (e.g. compacted) or disappeared, the
+    dataset is rebuilt from scratch.
+
+    Returns:
+        Dict: rows appended, lines skipped as invalid, files written and whether it was a full rebuild.
+    """
+    if partition_by not in PARTITIONS:
+        raise ValueError(f"partition_by must be one of {', '.join(PARTITIONS)}")
+    store = _open(database, data_dir)
+    dataset = export_path(store.filename, export_dir)
+    state = _load_state(dataset)
+    parts = _parts(store)
+
+    progress = {key: {"lines": 0, "last_line_check": None} for key, _ in parts}
+    rebuild = not (state and state["source"] == store.filename and state["partition_by"] == partition_by
+                   and set(state["parts"]) <= set(progress)
+                   and all(_unchanged(part, state["parts"][key]) for key, part in parts if key in state["parts"]))
+    if not rebuild:
+        progress.update(state["parts"])
+    if rebuild and os.path.exists(dataset):
+        shutil.rmtree(dataset)
+    os.makedirs(dataset, exist_ok=True)
+
+    def save():
+        _save_state(dataset, {"version": STATE_VERSION, "source": store.filename,
+                              "partition_by": partition_by, "parts": progress})
+
+    column = PARTITIONS[partition_by]
+    run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"  # unique even for runs in the same second
+    today = date.today().isoformat()
+    stats = {"rows": 0, "invalid": 0, "files": 0, "rebuild": rebuild}
+    batch_no = 0
+    for key, part in parts:
+        for lines in _iter_batches(part, progress[key]["lines"], batch_rows):
+            partitions = {}
+            for entry in resolve((decode(line) for line in lines), part.path):
+                if entry is None:
+                    stats["invalid"] += 1
+                    continue
+                value = _host(entry.get("origin_link")) if partition_by == "host" else today
+                partitions.setdefault(value, []).append(_row(entry))
+            for value, rows in partitions.items():
+                folder = os.path.join(dataset, f"{column}={value}")
+                os.makedirs(folder, exist_ok=True)
+                pq.write_table(pa.Table.from_pylist(rows, schema=SCHEMA),
+                               os.path.join(folder, f"part-{run_id}-{batch_no:05d}.parquet"))
+                stats["rows"] += len(rows)
+                stats["files"] += 1
+            batch_no += 1
+            progress[key] = {"lines": progress[key]["lines"] + len(lines), "last_line_check": _line_check(lines[-1])}
+            save()  # after every batch, so an interrupted export resumes where it stopped
+    save()
+    return stats
+
+
+def read_export(database: str, columns: Optional[List[str]] = None, filters=None,
+                export_dir: str = EXPORT_DIR, data_dir: str = DATA_DIR) -> pd.DataFrame:
+    """Load an exported database (optionally only some columns / partitions) as a DataFrame.
+
+    Args:
+        database (str): Database file name (e.g. "docs.sqlite") or path, or a name resolved like open_database.
+        columns (List[str]): Columns to read, e.g. ["origin_link", "heading"]; None reads all.
+        filters: pyarrow filters, e.g. [("host", "=", "www.example.com")].
+    """
+    filename = os.path.basename(database) if is_database_file(database) else _open(database, data_dir).filename
+    return pq.read_table(export_path(filename, export_dir), columns=columns, filters=filters,
+                         partitioning="hive").to_pandas()
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(database: str, data_dir: str = DATA_DIR, export_dir: str = EXPORT_DIR) -> None:
+    """Compare loading a database from its stored JSON lines with loading its Parquet export."""
+    store = _open(database, data_dir)
+    name = store.filename
+    export_database(store.path, export_dir=export_dir)
+    columns = ["origin_link", "heading"]
+    rows = {
+        "all columns": (
+            _timed(lambda: pd.DataFrame(list(store.iter_sections()))),
+            _timed(lambda: read_export(name, export_dir=export_dir)),
+        ),
+        f"columns {', '.join(columns)}": (
+            _timed(lambda: pd.DataFrame(list(store.iter_sections()))[columns]),
+            _timed(lambda: read_export(name, columns, export_dir=export_dir)),
+        ),
+    }
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(export_path(name, export_dir))
+               for f in files)
+    print(f"📦 {store.path}: {os.path.getsize(store.path) / 1e6:.1f} MB stored, {size / 1e6:.1f} MB as Parquet")
+    print(f"{'load into pandas':<34}{'JSON (ms)':>12}{'Parquet (ms)':>14}{'speedup':>10}")
+    for label, (json_ms, parquet_ms) in rows.items():
+        print(f"{label:<34}{json_ms:>12.1f}{parquet_ms:>14.1f}{json_ms / max(parquet_ms, 1e-6):>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export databases to partitioned Parquet datasets in exports/.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="append rows added since the last export")
+    exp.add_argument("databases", nargs="*", help="database files or names (default: every database file)")
+    exp.add_argument("--by", choices=list(PARTITIONS), default="host",
+                     help="partition by origin host or by export date (default: %(default)s)")
+    bench = sub.add_parser("bench", help="time pandas loads from JSON lines against the Parquet export")
+    bench.add_argument("database")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.database)
+        return 0
+    for store in [_open(database) for database in args.databases] or list_stores(DATA_DIR):
+        start = time.perf_counter()
+        stats = export_database(store.path, args.by)
+        skipped = f", {stats['invalid']} invalid lines skipped" if stats["invalid"] else ""
+        print(f"✅ {store.filename}: {'rebuilt' if stats['rebuild'] else 'appended'} {stats['rows']} rows in "
+              f"{stats['files']} files → {export_path(store.filename)} ({time.perf_counter() - start:.1f}s{skipped})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
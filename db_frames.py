@@ -0,0 +1,532 @@
+import os
+import sys
+import zlib
+import gzip
+import time
+import random
+import bisect
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; only needed for .zst databases
+    zstandard = None
+
+FRAMES_SUFFIX = ".frames"
+FRAMES_HEADER = struct.Struct(">4sI16s")  # magic, version, MD5 of the compressed bytes before the last frame end
+FRAMES_MAGIC = b"FRMS"
+FRAMES_VERSION = 1
+FRAME = struct.Struct(">QQ")              # compressed end offset, uncompressed end offset
+FRAME_BYTES = 256 * 1024                  # uncompressed bytes buffered before a writer emits a frame
+CHECK_BYTES = 64
+CACHE_FRAMES = 8                          # decompressed frames kept per reader for random access
+SCAN_CHUNK = 1 << 20
+
+
+class GzipCodec:
+    """Each frame is a complete gzip member; concatenated members are still a valid .gz file."""
+
+    suffix = ".gz"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    def decompressor(self):
+        return zlib.decompressobj(wbits=31)
+
+
+class ZstdCodec:
+    """Each frame is a complete zstd frame; concatenated frames are still a valid .zst file."""
+
+    suffix = ".zst"
+
+    def __init__(self):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed; run `pip install zstandard` to use .zst databases")
+        self._compressor = zstandard.ZstdCompressor(level=6)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompressor(self):
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+CODECS = {GzipCodec.suffix: GzipCodec, ZstdCodec.suffix: ZstdCodec}
+
+
+def codec_for(path: str):
+    """Return the codec for a compressed database path, or None for a plain file."""
+    for suffix, codec in CODECS.items():
+        if path.endswith(suffix):
+            return codec()
+    return None
+
+
+def is_compressed(path: str) -> bool:
+    return any(path.endswith(suffix) for suffix in CODECS)
+
+
+def _decompress(codec, raw: bytes) -> bytes:
+    d = codec.decompressor()
+    return d.decompress(raw)
+
+
+class FrameTable:
+    """Offsets of the complete frames of a compressed database, kept in a `<db>.frames` sidecar.
+
+    The sidecar is trusted while the compressed bytes before its last frame end still hash the
+    same; frames appended after it are scanned and added, anything else rescans the whole file.
+    Bytes after the last complete frame (a frame still being written) are ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sidecar = path + FRAMES_SUFFIX
+        self.codec = codec_for(path)
+        self.comp_ends: List[int] = []
+        self.logical_ends: List[int] = []
+        self._load()
+
+    @property
+    def size(self) -> int:
+        """Uncompressed size of the complete frames."""
+        return self.logical_ends[-1] if self.logical_ends else 0
+
+    @property
+    def comp_size(self) -> int:
+        return self.comp_ends[-1] if self.comp_ends else 0
+
+    def _tail_check(self, comp_end: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(max(0, comp_end - CHECK_BYTES))
+            return hashlib.md5(f.read(min(comp_end, CHECK_BYTES))).digest()
+
+    def _read_sidecar(self) -> Optional[Tuple[bytes, List[Tuple[int, int]]]]:
+        try:
+            with open(self.sidecar, "rb") as f:
+                data = f.read()
+            magic, version, check = FRAMES_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        body = data[FRAMES_HEADER.size:]
+        if magic != FRAMES_MAGIC or version != FRAMES_VERSION or len(body) % FRAME.size:
+            return None
+        return check, [FRAME.unpack_from(body, i) for i in range(0, len(body), FRAME.size)]
+
+    def _scan(self, comp_start: int, logical_start: int) -> List[Tuple[int, int]]:
+        """Decompress from comp_start to find the ends of the complete frames after it."""
+        frames = []
+        comp, logical = comp_start, logical_start
+        d, fed, produced, pending = self.codec.decompressor(), 0, 0, b""
+        with open(self.path, "rb") as f:
+            f.seek(comp_start)
+            while True:
+                data = pending or f.read(SCAN_CHUNK)
+                pending = b""
+                if not data:
+                    break
+                try:
+                    produced += len(d.decompress(data))
+                except Exception:
+                    break  # corrupt or torn tail; keep the frames found so far
+                fed += len(data)
+                if d.eof:
+                    pending = d.unused_data
+                    comp += fed - len(pending)
+                    logical += produced
+                    frames.append((comp, logical))
+                    d, fed, produced = self.codec.decompressor(), 0, 0
+        return frames
+
+    def _write_sidecar(self) -> None:
+        check = self._tail_check(self.comp_size) if self.comp_ends else b"\0" * 16
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.sidecar) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(FRAMES_HEADER.pack(FRAMES_MAGIC, FRAMES_VERSION, check))
+            f.write(b"".join(FRAME.pack(c, l) for c, l in zip(self.comp_ends, self.logical_ends)))
+        os.replace(tmp_path, self.sidecar)
+
+    def _load(self) -> None:
+        physical = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        sidecar = self._read_sidecar()
+        trusted = False
+        if sidecar:
+            check, frames = sidecar
+            last = frames[-1][0] if frames else 0
+            if last <= physical and (not frames or self._tail_check(last) == check):
+                self.comp_ends = [c for c, _ in frames]
+                self.logical_ends = [l for _, l in frames]
+                trusted = True
+        new = self._scan(self.comp_size, self.size) if physical > self.comp_size else []
+        for comp_end, logical_end in new:
+            self.comp_ends.append(comp_end)
+            self.logical_ends.append(logical_end)
+        if physical and (new or not trusted):
+            self._write_sidecar()
+
+    def add_frame(self, comp_end: int, logical_end: int) -> None:
+        """Record a frame a writer has just appended and flushed."""
+        self.comp_ends.append(comp_end)
+        self.logical_ends.append(logical_end)
+        check = self._tail_check(comp_end)
+        mode = "r+b" if os.path.exists(self.sidecar) else "w+b"
+        with open(self.sidecar, mode) as f:
+            if mode == "w+b":
+                f.write(FRAMES_HEADER.pack(FRAMES_MAGIC, FRAMES_VERSION, check))
+                f.write(b"".join(FRAME.pack(c, l) for c, l in zip(self.comp_ends, self.logical_ends)))
+                return
+            f.seek(0, os.SEEK_END)
+            f.write(FRAME.pack(comp_end, logical_end))
+            f.seek(0)
+            f.write(FRAMES_HEADER.pack(FRAMES_MAGIC, FRAMES_VERSION, check))
+
+    def bounds(self, i: int) -> Tuple[int, int, int, int]:
+        """Return (compressed start, compressed end, uncompressed start, uncompressed end) of frame i."""
+        return (self.comp_ends[i - 1] if i else 0, self.comp_ends[i],
+                self.logical_ends[i - 1] if i else 0, self.logical_ends[i])
+
+
+class FramedReader:
+    """Read-only binary file over the uncompressed content of a framed database.
+
+    Supports seek/tell/read and line iteration on uncompressed offsets, so the offset and line
+    indexes work unchanged; random reads decompress only the frames they touch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.table = FrameTable(path)
+        self.size = self.table.size
+        self.pos = 0
+        self._f = open(path, "rb")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _raw_frame(self, i: int) -> bytes:
+        comp_start, comp_end, _, _ = self.table.bounds(i)
+        with self._lock:
+            self._f.seek(comp_start)
+            raw = self._f.read(comp_end - comp_start)
+        return _decompress(self.table.codec, raw)
+
+    def _frame(self, i: int) -> bytes:
+        with self._lock:
+            if i in self._cache:
+                self._cache.move_to_end(i)
+                return self._cache[i]
+        data = self._raw_frame(i)
+        with self._lock:
+            self._cache[i] = data
+            while len(self._cache) > CACHE_FRAMES:
+                self._cache.popitem(last=False)
+        return data
+
+    def pread(self, offset: int, length: int) -> bytes:
+        """Return `length` uncompressed bytes from `offset` without moving the position."""
+        end = min(offset + length, self.size)
+        parts = []
+        i = bisect.bisect_right(self.table.logical_ends, offset)
+        while offset < end and i < len(self.table.logical_ends):
+            _, _, frame_start, frame_end = self.table.bounds(i)
+            parts.append(self._frame(i)[offset - frame_start:end - frame_start])
+            offset = frame_end
+            i += 1
+        return b"".join(parts)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def read(self, n: int = -1) -> bytes:
+        length = self.size - self.pos if n is None or n < 0 else n
+        data = self.pread(self.pos, length)
+        self.pos += len(data)
+        return data
+
+    def __iter__(self):
+        """Yield lines (with their newline) from the current position, decompressing frames in order."""
+        i = bisect.bisect_right(self.table.logical_ends, self.pos)
+        skip = self.pos - (self.table.logical_ends[i - 1] if i else 0)
+        carry = b""
+        for i in range(i, len(self.table.logical_ends)):
+            data = self._raw_frame(i)  # sequential scans bypass the random-access cache
+            if skip:
+                data, skip = data[skip:], 0
+            data = carry + data
+            start = 0
+            while True:
+                newline = data.find(b"\n", start)
+                if newline == -1:
+                    break
+                line = data[start:newline + 1]
+                self.pos += len(line)
+                yield line
+                start = newline + 1
+            carry = data[start:]
+        if carry:
+            self.pos += len(carry)
+            yield carry
+
+    def close(self) -> None:
+        self._f.close()
+        self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FramedWriter:
+    """Text-mode appender for a framed database.
+
+    Writes are buffered and compressed into a new frame on flush() or every FRAME_BYTES, so
+    flushed data is immediately readable through the frame table. A torn frame left by a crash
+    is truncated away on open.
+    """
+
+    def __init__(self, path: str, truncate: bool = False):
+        if truncate:
+            for stale in (path, path + FRAMES_SUFFIX):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        self.path = path
+        self.table = FrameTable(path)
+        if os.path.exists(path) and os.path.getsize(path) > self.table.comp_size:
+            with open(path, "r+b") as f:
+                f.truncate(self.table.comp_size)
+        self._f = open(path, "ab")
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8", errors="surrogateescape")
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= FRAME_BYTES:
+            self._write_frame()
+        return len(text)
+
+    def _write_frame(self) -> None:
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        compressed = self.table.codec.compress(data)
+        self._f.write(compressed)
+        self._f.flush()
+        self.table.add_frame(self.table.comp_size + len(compressed), self.table.size + len(data))
+        self._buffer = []
+        self._buffered = 0
+
+    def flush(self) -> None:
+        self._write_frame()
+
+    def tell(self) -> int:
+        return self.table.size + self._buffered
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._write_frame()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_read(path: str):
+    """Open a database for binary reading on uncompressed offsets (plain files are opened directly)."""
+    return FramedReader(path) if is_compressed(path) else open(path, "rb")
+
+
+def open_append(path: str):
+    """Open a database for appending text lines."""
+    return FramedWriter(path) if is_compressed(path) else open(path, "a", encoding="utf-8", errors="surrogateescape")
+
+
+def open_write(path: str):
+    """Create or truncate a database for writing text lines, compressed according to its suffix."""
+    return FramedWriter(path, truncate=True) if is_compressed(path) else open(path, "w", encoding="utf-8", errors="surrogateescape")
+
+
+def logical_size(path: str) -> int:
+    """Return the uncompressed size of a database's complete content."""
+    if not os.path.exists(path):
+        return 0
+    return FrameTable(path).size if is_compressed(path) else os.path.getsize(path)
+
+
+def ends_open(path: str) -> bool:
+    """Whether a database's content ends without a newline, so appending would join its last line.
+
+    Writers check under the database lock, where such a tail is a whole record (written by hand or
+    by another tool), and end it before appending.
+    """
+    size = logical_size(path)
+    if not size:
+        return False
+    with open_read(path) as f:
+        f.seek(size - 1)
+        return f.read(1) != b"\n"
+
+
+def replace_file(tmp_path: str, path: str) -> None:
+    """Atomically move a finished temp database (and its frame table) over `path`."""
+    if os.path.exists(tmp_path + FRAMES_SUFFIX):
+        os.replace(tmp_path + FRAMES_SUFFIX, path + FRAMES_SUFFIX)
+    elif os.path.exists(path + FRAMES_SUFFIX):
+        os.remove(path + FRAMES_SUFFIX)
+    os.replace(tmp_path, path)
+
+
+# --- migrate / benchmark -------------------------------------------------------------------
+
+SIDECAR_SUFFIXES = (".idx", ".lines", ".hashlog", ".hashidx", ".history")  # move with the data on migrate
+
+
+def _iter_text_lines(path: str):
+    with open_read(path) as f:
+        for line in f:
+            yield line.decode("utf-8", errors="surrogateescape")  # copies stay byte-exact even for invalid UTF-8
+
+
+def copy_database(src: str, dst: str) -> int:
+    """Copy a database's lines into dst (compressed per dst's suffix) via a temp file; returns bytes written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", suffix=".tmp" + (codec_for(dst).suffix if is_compressed(dst) else ""))
+    os.close(fd)
+    with open_write(tmp_path) as out:
+        for line in _iter_text_lines(src):
+            out.write(line)
+    identical = all(a == b for a, b in zip(_iter_text_lines(src), _iter_text_lines(tmp_path))) \
+        and logical_size(src) == logical_size(tmp_path)
+    if not identical:
+        os.remove(tmp_path)
+        raise RuntimeError(f"verification of {dst} against {src} failed")
+    replace_file(tmp_path, dst)
+    return os.path.getsize(dst)
+
+
+def _base(path: str) -> str:
+    for suffix in CODECS:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def migrate(path: str, to: str, keep: bool = False) -> str:
+    """Convert a JSONL database between plain, gzip and zstd framing; returns the new path.
+
+    Offset, line and dedup sidecars describe uncompressed offsets, so they move with the data, as
+    does the version history. Both databases stay locked from the copy to the removal of the
+    source, so no append lands in between and is lost; the old file's catalog entry is dropped.
+    """
+    from contextlib import ExitStack
+    from db_utils import database_lock
+    from db_catalog import forget
+
+    target = _base(path) + ("" if to == "plain" else "." + to)
+    if target == path:
+        raise ValueError(f"{path} is already {to}")
+    with ExitStack() as locks:
+        for locked in sorted((path, target)):
+            locks.enter_context(database_lock(locked))
+        if os.path.exists(target):
+            raise FileExistsError(f"{target} already exists")
+        before = os.path.getsize(path)
+        after = copy_database(path, target)
+        for suffix in SIDECAR_SUFFIXES:
+            if os.path.exists(path + suffix):
+                if keep:
+                    with open(path + suffix, "rb") as src, open(target + suffix, "wb") as dst:
+                        dst.write(src.read())
+                else:
+                    os.replace(path + suffix, target + suffix)
+        if not keep:
+            for stale in (path, path + FRAMES_SUFFIX):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            forget(path)
+    print(f"✅ {path} → {target}: {before / 1e6:.1f} MB → {after / 1e6:.1f} MB ({after / max(before, 1):.0%})")
+    return target
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(path: str, lookups: int = 200) -> None:
+    """Compare size, full scans and random line/URL reads of a database as plain, gzip and zstd."""
+    from db_index import line_index, lookup_spans, read_lines, indexed_links
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        variants = {"plain": os.path.join(tmpdir, "bench.jsonl")}
+        write_ms = {"plain": _timed(lambda: copy_database(path, variants["plain"]))}
+        for codec in ("gz", "zst"):
+            if codec == "zst" and zstandard is None:
+                print("⚠️ zstandard not installed; skipping .zst")
+                continue
+            variants[codec] = variants["plain"] + "." + codec
+            write_ms[codec] = _timed(lambda: copy_database(variants["plain"], variants[codec]))
+
+        # Time index builds first, before any variant's sidecars exist
+        build_ms = {name: _timed(lambda: (line_index(variant), indexed_links(variant)))
+                    for name, variant in variants.items()}
+        plain_size = os.path.getsize(variants["plain"])
+        count = len(line_index(variants["plain"]))
+        links = indexed_links(variants["plain"])
+        rng = random.Random(0)
+        line_sample = [rng.randrange(count) for _ in range(lookups)] if count else []
+        url_sample = rng.sample(links, min(50, len(links)))
+
+        print(f"📦 {path}: {count} lines, {len(links)} URLs")
+        print(f"{'variant':<8}{'size (MB)':>11}{'ratio':>8}{'write (ms)':>12}{'full scan (ms)':>16}"
+              f"{'index build (ms)':>18}{f'{lookups} lines (ms)':>16}{'50 URLs (ms)':>14}")
+        for name, variant in variants.items():
+            size = os.path.getsize(variant)
+            scan_ms = _timed(lambda: sum(1 for _ in _iter_text_lines(variant)))
+            lines_ms = _timed(lambda: [line_index(variant).line(i) for i in line_sample])
+            urls_ms = _timed(lambda: [read_lines(variant, lookup_spans(variant, u)) for u in url_sample])
+            print(f"{name:<8}{size / 1e6:>11.1f}{size / plain_size:>8.0%}{write_ms[name]:>12.0f}{scan_ms:>16.0f}"
+                  f"{build_ms[name]:>18.0f}{lines_ms:>16.1f}{urls_ms:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate JSONL databases to and from seekable gzip/zstd framing.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="rewrite a database as plain .jsonl, .jsonl.gz or .jsonl.zst")
+    mig.add_argument("databases", nargs="+")
+    mig.add_argument("--to", choices=["gz", "zst", "plain"], required=True)
+    mig.add_argument("--keep", action="store_true", help="keep the original file")
+    bench = sub.add_parser("bench", help="measure disk and read savings of each framing on a database")
+    bench.add_argument("database")
+    bench.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.database, args.lookups)
+        return 0
+    for path in args.databases:
+        migrate(path, args.to, args.keep)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
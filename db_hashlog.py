@@ -0,0 +1,364 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+import tempfile
+from typing import Optional, Set, Tuple
+
+from db_utils import section_hash, load_dedup_state, database_lock
+from db_frames import open_read, logical_size
+from db_records import project
+from db_blobs import REF_FIELD, resolve
+
+LOG_SUFFIX = ".hashlog"
+INDEX_SUFFIX = ".hashidx"
+RECORD_SIZE = 17                      # 1 type byte + 16-byte MD5 digest
+HEADER = struct.Struct(">4sIQQ8s")    # magic, version, merged log bytes, committed db size, db fingerprint
+MAGIC = b"HIDX"
+VERSION = 1
+COMPACT_THRESHOLD = 100_000           # log records read at startup before they are merged into the index
+FINGERPRINT_BYTES = 64
+
+HASH = b"H"     # section hash: MD5(content + origin_link)
+LINK = b"U"     # origin link: MD5(origin_link)
+COMMIT = b"C"   # payload: committed database size (8 bytes) + fingerprint (8 bytes)
+
+
+def _link_key(url: str) -> bytes:
+    return LINK + hashlib.md5(url.encode()).digest()
+
+
+def _hash_key(hex_digest: str) -> bytes:
+    return HASH + bytes.fromhex(hex_digest)
+
+
+def _fingerprint(db_path: str, size: int) -> bytes:
+    """Hash the bytes just before `size` so a rewritten database is not mistaken for the committed one."""
+    with open_read(db_path) as f:
+        f.seek(max(0, size - FINGERPRINT_BYTES))
+        return hashlib.md5(f.read(min(size, FINGERPRINT_BYTES))).digest()[:8]
+
+
+def _file_id(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _scan_keys(db_path: str, start: int = 0) -> Tuple[Set[bytes], int]:
+    """Read dedup keys of the lines from `start` to the end, returning them and the offset after the last one.
+
+    Callers hold the database lock, so no writer is mid-line: a final line without a newline is a
+    whole record (a writer terminates it before appending; see JsonlWriter.flush), not a torn one.
+    """
+    keys = set()
+    offset = [start]
+
+    def lines():
+        with open_read(db_path) as f:
+            f.seek(start)
+            for line in f:
+                offset[0] += len(line)
+                yield project(line, ("content", REF_FIELD, "origin_link"))
+
+    for data in resolve(lines(), db_path):
+        try:
+            keys.add(_hash_key(section_hash(data)))
+            keys.add(_link_key(data["origin_link"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return keys, offset[0]
+
+
+class _KeyView:
+    """Set-like view (`in` and `add`) over one kind of key in a DedupLog."""
+
+    def __init__(self, log: "DedupLog", make_key):
+        self.log = log
+        self.make_key = make_key
+
+    def __contains__(self, value) -> bool:
+        return self.log.contains(self.make_key(value))
+
+    def add(self, value) -> None:
+        self.log.add(self.make_key(value))
+
+
+class DedupLog:
+    """Persisted section hashes and origin links of one JSONL database.
+
+    Keys live in an append-only `<db>.hashlog` and a sorted, memory-mapped `<db>.hashidx` that
+    periodically absorbs the log. Each batch of keys is followed by a commit record holding the
+    database size it describes, so opening costs only the log tail since the last merge plus any
+    database lines written after the last commit - never a scan of the whole database.
+
+    `hashes` and `links` behave like the sets returned by db_utils.load_dedup_state.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.log_path = db_path + LOG_SUFFIX
+        self.index_path = db_path + INDEX_SUFFIX
+        self.hashes = _KeyView(self, _hash_key)
+        self.links = _KeyView(self, _link_key)
+        self._base = None
+        self._base_file = None
+        self._base_count = 0
+        self._tail = set()
+        self._pending = []
+        self._log_size = 0        # log bytes read into this instance
+        self._index_id = None     # (inode, mtime_ns) of the mapped index, to notice another process's merge
+        self.committed_size = 0
+        self._committed_fp = b"\0" * 8
+        self._open()
+
+    # --- loading -------------------------------------------------------------------------
+
+    def _open(self):
+        if not self._load():
+            self.rebuild()
+            return
+        self._catch_up()
+
+    def _catch_up(self) -> bool:
+        """Reconcile the committed size with the database, scanning only lines written after it.
+
+        Returns:
+            bool: Whether keys had to be read from the database.
+        """
+        db_size = logical_size(self.db_path)
+        changed = True
+        if db_size == self.committed_size and (db_size == 0 or self._committed_fp == _fingerprint(self.db_path, db_size)):
+            changed = False
+        elif db_size > self.committed_size and (self.committed_size == 0 or
+                                                self._committed_fp == _fingerprint(self.db_path, self.committed_size)):
+            # Lines were appended without reaching the log (crash or an older writer): catch up on that tail only
+            keys, end = _scan_keys(self.db_path, self.committed_size)
+            for key in keys - self._tail:
+                if not self._base_contains(key):
+                    self.add(key)
+            self.commit(end)
+        else:
+            self.rebuild()
+            return True
+        if len(self._tail) > COMPACT_THRESHOLD:
+            self.compact()
+        return changed
+
+    def _load(self) -> bool:
+        """Map the merged index and read the log tail; False if the files are missing or inconsistent."""
+        if not os.path.exists(self.log_path) and not os.path.exists(self.index_path):
+            return logical_size(self.db_path) == 0
+        merged, self.committed_size, self._committed_fp = 0, 0, b"\0" * 8
+        if os.path.exists(self.index_path):
+            self._base_file = open(self.index_path, "rb")
+            header = self._base_file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return False
+            magic, version, merged, self.committed_size, self._committed_fp = HEADER.unpack(header)
+            size = os.fstat(self._base_file.fileno()).st_size
+            if magic != MAGIC or version != VERSION or (size - HEADER.size) % RECORD_SIZE:
+                return False
+            self._base = mmap.mmap(self._base_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._base_count = (size - HEADER.size) // RECORD_SIZE
+            self._index_id = _file_id(self.index_path)
+
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if log_size < merged:
+            return False
+        if (log_size - merged) % RECORD_SIZE:
+            # Drop a record torn by a crash so later appends stay aligned
+            log_size -= (log_size - merged) % RECORD_SIZE
+            with open(self.log_path, "r+b") as f:
+                f.truncate(log_size)
+        self._read_log(merged, log_size)
+        return True
+
+    def _read_log(self, start: int, end: int) -> None:
+        if end > start:
+            with open(self.log_path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+            for i in range(0, len(data), RECORD_SIZE):
+                record = data[i:i + RECORD_SIZE]
+                if record[:1] == COMMIT:
+                    self.committed_size = int.from_bytes(record[1:9], "big")
+                    self._committed_fp = record[9:]
+                else:
+                    self._tail.add(record)
+        self._log_size = end
+
+    def refresh(self) -> bool:
+        """Pick up keys other writers committed since this instance last read the log.
+
+        Call while holding the database lock, before checking new sections against the log.
+
+        Returns:
+            bool: Whether anything changed on disk, i.e. keys may have been added or removed.
+        """
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if log_size < self._log_size or _file_id(self.index_path) != self._index_id:
+            # Rebuilt, merged or deleted elsewhere: start over from the files on disk
+            self._close_base()
+            self._tail, self._pending = set(), []
+            self._open()
+            return True
+        end = log_size - (log_size - self._log_size) % RECORD_SIZE
+        grew = end > self._log_size
+        self._read_log(self._log_size, end)
+        return self._catch_up() or grew
+
+    def _base_contains(self, key: bytes) -> bool:
+        lo, hi = 0, self._base_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = HEADER.size + mid * RECORD_SIZE
+            current = self._base[start:start + RECORD_SIZE]
+            if current == key:
+                return True
+            if current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+    # --- lookups and writes --------------------------------------------------------------
+
+    def contains(self, key: bytes) -> bool:
+        return key in self._tail or self._base_contains(key)
+
+    def add(self, key: bytes) -> None:
+        if key not in self._tail:
+            self._tail.add(key)
+            self._pending.append(key)
+
+    def commit(self, db_size: Optional[int] = None) -> None:
+        """Append keys added since the last commit, followed by a commit record for the database size.
+
+        Call after the matching section lines have been flushed to the database.
+        """
+        if db_size is None:
+            db_size = logical_size(self.db_path)
+        fp = _fingerprint(self.db_path, db_size) if db_size else b"\0" * 8
+        records = b"".join(self._pending) + COMMIT + db_size.to_bytes(8, "big") + fp
+        with open(self.log_path, "ab") as f:
+            at_end = f.tell() == self._log_size  # otherwise refresh() reads the records in between first
+            f.write(records)
+        if at_end:
+            self._log_size += len(records)
+        self._pending = []
+        self.committed_size = db_size
+        self._committed_fp = fp
+
+    def commit_file(self, f) -> None:
+        """Flush an open database file and commit the keys of everything written to it so far."""
+        f.flush()
+        self.commit(logical_size(self.db_path))
+
+    # --- maintenance ---------------------------------------------------------------------
+
+    def _close_base(self):
+        if self._base is not None:
+            self._base.close()
+            self._base = None
+        if self._base_file is not None:
+            self._base_file.close()
+            self._base_file = None
+        self._base_count = 0
+        self._index_id = None
+
+    def _write_index(self, keys, merged_log_bytes: int) -> None:
+        self._close_base()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, merged_log_bytes, self.committed_size, self._committed_fp))
+            f.write(b"".join(sorted(keys)))
+        os.replace(tmp_path, self.index_path)
+        self._tail = set()
+        self._index_id = _file_id(self.index_path)
+        self._base_file = open(self.index_path, "rb")
+        size = os.fstat(self._base_file.fileno()).st_size
+        self._base = mmap.mmap(self._base_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._base_count = (size - HEADER.size) // RECORD_SIZE
+
+    def compact(self) -> None:
+        """Merge the log tail into the sorted index so the next open reads almost nothing."""
+        if self._pending:
+            self.commit()
+        base = {self._base[HEADER.size + i * RECORD_SIZE:HEADER.size + (i + 1) * RECORD_SIZE]
+                for i in range(self._base_count)}
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        self._write_index(base | self._tail, log_size)
+
+    def rebuild(self) -> None:
+        """Recreate the log and index from a full scan of the database."""
+        self._close_base()
+        self._pending = []
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+        keys, end = _scan_keys(self.db_path) if os.path.exists(self.db_path) else (set(), 0)
+        self.committed_size = end
+        self._committed_fp = _fingerprint(self.db_path, end) if end else b"\0" * 8
+        open(self.log_path, "wb").close()
+        self._log_size = 0
+        self._write_index(keys, 0)
+
+    def keys(self) -> Set[bytes]:
+        base = {self._base[HEADER.size + i * RECORD_SIZE:HEADER.size + (i + 1) * RECORD_SIZE]
+                for i in range(self._base_count)}
+        return base | self._tail
+
+    def close(self) -> None:
+        if self._pending:
+            self.commit()
+        self._close_base()
+
+
+def open_dedup_log(db_path: str) -> DedupLog:
+    """Open (creating or repairing if needed) the dedup log of a JSONL database."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    return DedupLog(db_path)
+
+
+def verify(db_path: str) -> bool:
+    """Compare the dedup log with a full scan of the database and print any differences."""
+    hashes, links = load_dedup_state(db_path)
+    expected = {_hash_key(h) for h in hashes} | {_link_key(url) for url in links}
+    with database_lock(db_path):
+        log = open_dedup_log(db_path)
+        actual = log.keys()
+        log.close()
+    missing, extra = expected - actual, actual - expected
+    print(f"{'✅' if not missing and not extra else '❌'} {db_path}: {len(expected)} keys in database, "
+          f"{len(actual)} in log, {len(missing)} missing, {len(extra)} stale")
+    return not missing and not extra
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild the persisted dedup hash log of JSONL databases.")
+    parser.add_argument("command", choices=["verify", "rebuild", "compact"])
+    parser.add_argument("databases", nargs="+", help="paths to .jsonl files")
+    args = parser.parse_args()
+
+    ok = True
+    for db_path in args.databases:
+        if args.command == "verify":
+            ok = verify(db_path) and ok
+            continue
+        with database_lock(db_path):
+            log = open_dedup_log(db_path)
+            if args.command == "rebuild":
+                log.rebuild()
+            else:
+                log.compact()
+            print(f"✅ {args.command}: {db_path} ({len(log.keys())} keys, committed at {log.committed_size} bytes)")
+            log.close()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import difflib
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from db_utils import normalize_url, section_hash, database_lock
+from db_records import decode, dumps, encode
+
+HISTORY_SUFFIX = ".history"
+KEYFRAME_EVERY = 64        # versions after which a full snapshot is stored again, bounding reconstruction
+KEYFRAME_RATIO = 1.0       # ...or once the deltas since the last one add up to this share of a snapshot
+TEXT_DELTA_RATIO = 0.8     # a text delta larger than this share of the new text is stored whole
+EXACT_DIFF_TOKENS = 2000   # longer changed spans let difflib skip very common tokens to stay fast
+TEXT_FIELDS = ("content", "text", "heading")
+TOKEN = re.compile(r"\s+|[^\s]+")
+
+_indexes = {}  # history path -> _HistoryIndex, kept across Streamlit reruns
+_indexes_lock = threading.Lock()
+
+
+def history_path(db_path: str) -> str:
+    return db_path + HISTORY_SUFFIX
+
+
+def _stamp(when: Union[str, date, datetime, None]) -> str:
+    """Return a timestamp as a sortable ISO string; a bare date means the end of that day."""
+    if when is None:
+        return datetime.now().isoformat(timespec="seconds")
+    if isinstance(when, datetime):
+        return when.isoformat(timespec="seconds")
+    if isinstance(when, date):
+        when = when.isoformat()
+    return when + "T23:59:59" if len(when) == 10 else when
+
+
+# --- deltas --------------------------------------------------------------------------------
+
+def _opcodes(a: List[str], b: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    """difflib opcodes between token lists, matching the common head and tail without difflib."""
+    head = 0
+    while head < min(len(a), len(b)) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < min(len(a), len(b)) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+    middle_a, middle_b = a[head:len(a) - tail], b[head:len(b) - tail]
+    exact = max(len(middle_a), len(middle_b)) <= EXACT_DIFF_TOKENS
+    ops = [("equal", 0, head, 0, head)] if head else []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, middle_a, middle_b, autojunk=not exact).get_opcodes():
+        ops.append((op, i1 + head, i2 + head, j1 + head, j2 + head))
+    if tail:
+        ops.append(("equal", len(a) - tail, len(a), len(b) - tail, len(b)))
+    return ops
+
+
+def text_delta(old: str, new: str) -> List:
+    """Encode `new` against `old` as word-level edits: n > 0 copies n old tokens, n < 0 skips n, a string is inserted."""
+    a, b = TOKEN.findall(old), TOKEN.findall(new)
+    delta = []
+    for op, i1, i2, j1, j2 in _opcodes(a, b):
+        if op == "equal":
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append("".join(b[j1:j2]))
+    return delta
+
+
+def apply_text_delta(old: str, delta: List) -> str:
+    tokens = TOKEN.findall(old)
+    out, pos = [], 0
+    for op in delta:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(tokens[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def _section_delta(old: Dict, new: Dict) -> Optional[Dict]:
+    """Return the changes turning one section into another, or None if they are equal.
+
+    `f` holds replaced fields, `t` word-level deltas of long text fields, `x` removed fields.
+    """
+    if old == new:
+        return None
+    change = {}
+    for field, value in new.items():
+        if old.get(field) == value and field in old:
+            continue
+        if field in TEXT_FIELDS and isinstance(value, str) and isinstance(old.get(field), str):
+            delta = text_delta(old[field], value)
+            if len(dumps(delta)) < len(value) * TEXT_DELTA_RATIO:
+                change.setdefault("t", {})[field] = delta
+                continue
+        change.setdefault("f", {})[field] = value
+    removed = [field for field in old if field not in new]
+    if removed:
+        change["x"] = removed
+    return change
+
+
+def _apply_section_delta(old: Dict, change: Dict) -> Dict:
+    section = {k: v for k, v in old.items() if k not in change.get("x", ())}
+    for field, delta in change.get("t", {}).items():
+        section[field] = apply_text_delta(old[field], delta)
+    section.update(change.get("f", {}))
+    return section
+
+
+def _version_delta(old: List[Dict], new: List[Dict]) -> Dict:
+    """Changes per section position; positions past the old end hold whole sections."""
+    changes = {}
+    for i, section in enumerate(new):
+        change = _section_delta(old[i], section) if i < len(old) else {"f": section}
+        if change is not None:
+            changes[str(i)] = change
+    return changes
+
+
+def _apply_version_delta(old: List[Dict], n: int, changes: Dict) -> List[Dict]:
+    sections = []
+    for i in range(n):
+        change = changes.get(str(i))
+        base = old[i] if i < len(old) else {}
+        sections.append(base if change is None else _apply_section_delta(base, change))
+    return sections
+
+
+# --- history file --------------------------------------------------------------------------
+
+class _HistoryIndex:
+    """Versions per URL in a `<db>.history` file: (version, timestamp, offset, length, is_base).
+
+    The file is append-only, so the index is extended from where it stopped reading; a file that
+    shrank or was replaced is read again from the start.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.urls: Dict[str, List[Tuple[int, str, int, int, bool]]] = {}
+        self.end = 0
+        self.file_id = None
+
+    def refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.urls, self.end, self.file_id = {}, 0, None
+            return
+        if st.st_ino != self.file_id or st.st_size < self.end:
+            self.urls, self.end, self.file_id = {}, 0, st.st_ino
+        if st.st_size == self.end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.end)
+            pos = self.end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a version being written right now
+                entry = decode(line)
+                if entry is not None:
+                    self.urls.setdefault(entry["key"], []).append(
+                        (entry["v"], entry["ts"], pos, len(line), "sections" in entry))
+                pos += len(line)
+        self.end = pos
+
+    def read(self, offset: int, length: int) -> Dict:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return decode(f.read(length))
+
+
+def _index(db_path: str) -> _HistoryIndex:
+    path = history_path(db_path)
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = _HistoryIndex(path)
+        index.refresh()
+        return index
+
+
+def _reconstruct(index: _HistoryIndex, entries: List[Tuple], i: int) -> List[Dict]:
+    """Rebuild version entries[i] from the nearest full snapshot at or before it."""
+    start = max(j for j in range(i + 1) if entries[j][4])
+    sections = index.read(*entries[start][2:4])["sections"]
+    for entry in entries[start + 1:i + 1]:
+        record = index.read(*entry[2:4])
+        sections = _apply_version_delta(sections, record["n"], record["changes"])
+    return sections
+
+
+def versions(db_path: str, url: str) -> List[Dict]:
+    """Return the recorded versions of a URL, oldest first: version number, timestamp and whether it is a full snapshot."""
+    return [{"version": v, "ts": ts, "base": base}
+            for v, ts, _, _, base in _index(db_path).urls.get(normalize_url(url), [])]
+
+
+def version(db_path: str, url: str, number: Optional[int] = None) -> Optional[List[Dict]]:
+    """Return the sections of one version of a URL (the latest by default), or None if it was never recorded."""
+    index = _index(db_path)
+    entries = index.urls.get(normalize_url(url), [])
+    positions = [i for i, entry in enumerate(entries) if number is None or entry[0] == number]
+    return _reconstruct(index, entries, positions[-1]) if positions else None
+
+
+def as_of(db_path: str, url: str, when: Union[str, date, datetime]) -> Optional[Tuple[int, List[Dict]]]:
+    """Return (version, sections) of a URL as it was at `when`, or None if it had not been recorded yet.
+
+    A bare date ("2026-03-01") means the end of that day.
+    """
+    index = _index(db_path)
+    entries = index.urls.get(normalize_url(url), [])
+    stamp = _stamp(when)
+    positions = [i for i, entry in enumerate(entries) if entry[1] <= stamp]
+    return (entries[positions[-1]][0], _reconstruct(index, entries, positions[-1])) if positions else None
+
+
+def _snapshot_bytes(sections: List[Dict]) -> int:
+    return sum(len(encode(section).encode("utf-8")) for section in sections)
+
+
+def _seed(db_path: str, url: str) -> Optional[List[Dict]]:
+    """Sections a database already holds for a URL scraped before its history was kept."""
+    from storage import open_store
+
+    if not os.path.exists(db_path):
+        return None
+    return open_store(db_path).sections_for_url(url) or None
+
+
+def record_version(db_path: str, url: str, sections: List[Dict],
+                   when: Union[str, date, datetime, None] = None) -> Optional[int]:
+    """Record a scrape of a URL as its next version; returns the version number, or None if nothing changed.
+
+    Unchanged sections cost nothing and changed ones are stored as word-level deltas against the
+    previous version. A full snapshot is stored instead once the deltas since the last one are as
+    large as a snapshot (or after KEYFRAME_EVERY versions), so reconstruction reads at most about
+    two snapshots' worth. A URL the database held before its history started is first seeded with the
+    stored sections, stamped with the database's modification time.
+    """
+    key = normalize_url(url)
+    path = history_path(db_path)
+    with database_lock(path):
+        index = _index(db_path)
+        entries = index.urls.get(key, [])
+        if not entries:
+            seed = _seed(db_path, url)
+            if seed is not None and seed != sections:
+                stamp = datetime.fromtimestamp(os.path.getmtime(db_path)).isoformat(timespec="seconds")
+                _append(path, {"key": key, "url": url, "v": 1, "ts": min(stamp, _stamp(when)),
+                               "bytes": _snapshot_bytes(seed), "sections": seed})
+                index.refresh()
+                entries = index.urls[key]
+        previous = _reconstruct(index, entries, len(entries) - 1) if entries else None
+        if previous == sections:
+            return None
+        number = entries[-1][0] + 1 if entries else 1
+        record = {"key": key, "url": url, "v": number, "ts": _stamp(when), "bytes": _snapshot_bytes(sections)}
+        base = max((j for j, entry in enumerate(entries) if entry[4]), default=None)
+        changes = _version_delta(previous, sections) if previous is not None else None
+        chain = sum(entry[3] for entry in entries[base + 1:]) if base is not None else 0
+        if (changes is None or len(entries) - base >= KEYFRAME_EVERY
+                or chain + len(dumps(changes)) > record["bytes"] * KEYFRAME_RATIO):
+            record["sections"] = sections
+        else:
+            record.update(n=len(sections), changes=changes)
+        _append(path, record)
+        index.refresh()
+    return number
+
+
+def _append(path: str, record: Dict) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(encode(record))
+
+
+def word_diff(old: str, new: str) -> str:
+    """Mark word-level changes as [-removed-]{+added+}."""
+    a, b = TOKEN.findall(old), TOKEN.findall(new)
+    out = []
+    for op, i1, i2, j1, j2 in _opcodes(a, b):
+        if op == "equal":
+            out.append("".join(a[i1:i2]))
+            continue
+        if i2 > i1:
+            out.append("[-" + "".join(a[i1:i2]) + "-]")
+        if j2 > j1:
+            out.append("{+" + "".join(b[j1:j2]) + "+}")
+    return "".join(out)
+
+
+def changes(db_path: str, url: str, old: int, new: Optional[int] = None) -> List[Dict]:
+    """Compare two versions of a URL section by section (`new` defaults to the latest).
+
+    Returns one dict per differing position: `section` index, `change` (added, removed or changed),
+    the changed `fields` and a word `diff` of the content.
+    """
+    before, after = version(db_path, url, old), version(db_path, url, new)
+    if before is None or after is None:
+        raise KeyError(f"{url} has no version {old if before is None else new} in {history_path(db_path)}")
+    report = []
+    for i in range(max(len(before), len(after))):
+        a = before[i] if i < len(before) else None
+        b = after[i] if i < len(after) else None
+        if a == b:
+            continue
+        if a is None or b is None:
+            section = a or b
+            report.append({"section": i, "change": "removed" if b is None else "added", "fields": sorted(section),
+                           "heading": section.get("heading"), "diff": section.get("content") or section.get("text") or ""})
+            continue
+        fields = sorted(f for f in set(a) | set(b) if a.get(f) != b.get(f))
+        field = "content" if "content" in a or "content" in b else "text"
+        report.append({"section": i, "change": "changed", "fields": fields, "heading": b.get("heading"),
+                       "diff": word_diff(str(a.get(field, "")), str(b.get(field, ""))) if field in fields else ""})
+    return report
+
+
+def stats(db_path: str) -> Dict:
+    """Size of the history against full snapshots and against appending every changed section to the database.
+
+    The append-everything figure counts each distinct section (by dedup hash) once, as the writers do now.
+    """
+    index = _index(db_path)
+    history_bytes = os.path.getsize(index.path) if os.path.exists(index.path) else 0
+    snapshot_bytes = appended_bytes = count = bases = 0
+    for entries in index.urls.values():
+        seen = set()
+        sections = None
+        for entry in entries:
+            record = index.read(*entry[2:4])
+            sections = record["sections"] if entry[4] else _apply_version_delta(sections, record["n"], record["changes"])
+            snapshot_bytes += record["bytes"]
+            count += 1
+            bases += entry[4]
+            for section in sections:
+                try:
+                    h = section_hash(section)
+                except (KeyError, TypeError):
+                    h = dumps(section)
+                if h not in seen:
+                    seen.add(h)
+                    appended_bytes += len(encode(section).encode("utf-8"))
+    return {"urls": len(index.urls), "versions": count, "snapshots": bases, "history_bytes": history_bytes,
+            "snapshot_bytes": snapshot_bytes, "appended_bytes": appended_bytes}
+
+
+def _print_stats(label: str, result: Dict) -> None:
+    print(f"🕓 {label}: {result['urls']} URLs, {result['versions']} versions "
+          f"({result['snapshots']} full snapshots)")
+    for label, size in (("history (base + deltas)", result["history_bytes"]),
+                        ("append everything (now)", result["appended_bytes"]),
+                        ("full copy of every version", result["snapshot_bytes"])):
+        print(f"   {label:<28}{size / 1e6:>9.2f} MB{size / max(result['appended_bytes'], 1):>8.0%}")
+
+
+def _edit(sections: List[Dict], rng: random.Random) -> List[Dict]:
+    """Simulate a page update: rewrite a phrase in a few sections, sometimes add or drop one."""
+    sections = [dict(section) for section in sections]
+    for section in rng.sample(sections, max(1, len(sections) // 10)):
+        words = section.get("content", "").split(" ")
+        at = rng.randrange(len(words))
+        words[at:at + rng.randint(1, 12)] = rng.choices(["updated", "revised", "2026", "new", "changed"], k=rng.randint(1, 12))
+        section["content"] = " ".join(words)
+    roll = rng.random()
+    if roll < 0.2:
+        sections.append(dict(sections[-1], section=len(sections), content="Added paragraph " * 10))
+    elif roll < 0.3 and len(sections) > 1:
+        sections.pop(rng.randrange(len(sections)))
+    return sections
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(db_path: str, url_count: int = 50, version_count: int = 20, seed: int = 0) -> None:
+    """Record simulated page updates for a database's URLs and report size and reconstruction time."""
+    from storage import open_store
+
+    rng = random.Random(seed)
+    store = open_store(db_path)
+    urls = [url for url in store.urls()[:url_count * 2] if store.sections_for_url(url)][:url_count]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        target = os.path.join(tmpdir, "bench.jsonl")
+        pages = {url: store.sections_for_url(url) for url in urls}
+        start = datetime(2026, 1, 1)
+        record_ms = 0.0
+        for n in range(version_count):
+            when = start.replace(day=1 + n % 28, month=1 + n // 28)
+            for url in urls:
+                pages[url] = _edit(pages[url], rng) if n else pages[url]
+                record_ms += _timed(lambda: record_version(target, url, pages[url], when))
+        result = stats(target)
+        _indexes.clear()
+        load_ms = _timed(lambda: versions(target, urls[0]))
+        latest_ms = _timed(lambda: [version(target, url) for url in urls]) / len(urls)
+        middle = start.replace(day=1 + version_count // 2)
+        as_of_ms = _timed(lambda: [as_of(target, url, middle) for url in urls]) / len(urls)
+        diff_ms = _timed(lambda: [changes(target, url, 1) for url in urls]) / len(urls)
+        assert all(version(target, url) == pages[url] for url in urls)
+
+    _print_stats(f"{db_path} ({version_count} simulated updates per URL)", result)
+    print(f"{'operation':<34}{'ms':>10}")
+    for label, ms in ((f"record {result['versions']} versions", record_ms), ("load history index", load_ms),
+                      ("latest version (per URL)", latest_ms), ("as-of middle date (per URL)", as_of_ms),
+                      ("diff first..latest (per URL)", diff_ms)):
+        print(f"{label:<34}{ms:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the version history of the URLs in a database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("versions", "list the recorded versions of a URL"),
+                            ("as-of", "print a URL's sections as they were at a date or time"),
+                            ("diff", "show what changed between two versions of a URL"),
+                            ("stats", "compare the history's size with appending everything"),
+                            ("bench", "record simulated updates of a database's URLs and time queries")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("database")
+        if name in ("versions", "as-of", "diff"):
+            p.add_argument("url")
+        if name == "as-of":
+            p.add_argument("when", help="ISO date or timestamp, e.g. 2026-03-01 or 2026-03-01T12:00:00")
+        if name == "diff":
+            p.add_argument("old", type=int)
+            p.add_argument("new", type=int, nargs="?")
+        if name == "bench":
+            p.add_argument("--urls", type=int, default=50)
+            p.add_argument("--versions", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.database, args.urls, args.versions)
+    elif args.command == "stats":
+        _print_stats(history_path(args.database), stats(args.database))
+    elif args.command == "versions":
+        for entry in versions(args.database, args.url):
+            print(f"v{entry['version']:<5}{entry['ts']}  {'snapshot' if entry['base'] else 'delta'}")
+    elif args.command == "as-of":
+        found = as_of(args.database, args.url, args.when)
+        if found is None:
+            print(f"📭 {args.url} was not recorded by {args.when}")
+            return 1
+        number, sections = found
+        print(f"🕓 {args.url} as of {args.when}: version {number}, {len(sections)} sections")
+        for section in sections:
+            print(encode(section), end="")
+    else:
+        report = changes(args.database, args.url, args.old, args.new)
+        if not report:
+            print("✅ No changes")
+        for change in report:
+            print(f"§{change['section']} {change['change']} ({', '.join(change['fields'])}): {change['heading']}")
+            if change["diff"]:
+                print(f"   {change['diff']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
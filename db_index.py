@@ -0,0 +1,418 @@
+import os
+import sys
+import mmap
+import json
+import struct
+import time
+import hashlib
+import logging
+import tempfile
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from db_utils import DATA_DIR, normalize_url, database_lock
+from db_frames import open_read, logical_size, is_compressed
+from db_records import loads, decode, project
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+CHECK_BYTES = 64  # bytes hashed at the start and end of the indexed region to detect rewrites
+
+LINES_SUFFIX = ".lines"
+LINES_HEADER = struct.Struct(">4sIQQ32sQ")  # magic, version, indexed db size, db mtime_ns, region check, line count
+LINES_MAGIC = b"LIDX"
+LINES_VERSION = 2
+OFFSET = struct.Struct(">Q")                # start offset of one line
+SCAN_CHUNK = 1 << 24
+
+_memo = {}  # db path -> (size, mtime_ns, index); avoids re-reading sidecars on every Streamlit rerun
+_memo_lock = threading.Lock()
+
+
+def index_path(db_path: str) -> str:
+    """Return the sidecar index path for a database file."""
+    return db_path + INDEX_SUFFIX
+
+
+def _entry_url(line: bytes) -> Optional[str]:
+    """Return the origin link of a JSONL line, accepting dict entries, bare JSON strings and raw URL lines."""
+    fields = project(line, ("origin_link",))
+    if fields is not None:
+        return fields.get("origin_link") or None
+    try:
+        entry = loads(line)
+    except ValueError:
+        raw = line.decode("utf-8", errors="replace").strip()
+        return raw if raw.startswith(("http://", "https://")) else None
+    if isinstance(entry, str):
+        return entry
+    return None
+
+
+def _region_check(f, size: int) -> str:
+    """Fingerprint the first and last bytes of the indexed region of a database."""
+    f.seek(0)
+    head = f.read(min(CHECK_BYTES, size))
+    f.seek(max(0, size - CHECK_BYTES))
+    tail = f.read(min(CHECK_BYTES, size))
+    return hashlib.md5(head + tail).hexdigest()
+
+
+def _complete(line: bytes) -> bool:
+    """Whether a line read from a database is whole: newline-terminated, or a final record or URL without one.
+
+    A last line that is neither is a batch still being written; it is picked up on the next refresh.
+    Writers end such a final record before appending (see db_frames.ends_open).
+    """
+    return line.endswith(b"\n") or decode(line) is not None or line.strip().startswith((b"http://", b"https://"))
+
+
+def _scan(f, start: int, urls: Dict) -> int:
+    """Index complete lines from `start` onwards into `urls`, returning the offset after the last complete line."""
+    f.seek(start)
+    offset = start
+    for line in f:
+        if not _complete(line):
+            break
+        url = _entry_url(line)
+        if url:
+            entry = urls.setdefault(normalize_url(url), {"links": [], "spans": []})
+            if url not in entry["links"]:
+                entry["links"].append(url)
+            entry["spans"].append([offset, len(line)])
+        offset += len(line)
+    return offset
+
+
+def _save(db_path: str, index: Dict) -> None:
+    path = index_path(db_path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write index {path}: {e}")
+
+
+def _read_sidecar(db_path: str) -> Optional[Dict]:
+    try:
+        with open(index_path(db_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return index if index.get("version") == INDEX_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def load_index(db_path: str) -> Dict:
+    """Return the origin_link offset index of a database, building or refreshing its sidecar as needed.
+
+    The sidecar is reused while the database's size and mtime match. When the file only grew and
+    the indexed region is unchanged, just the appended tail is scanned; any other change rebuilds it.
+
+    Args:
+        db_path (str): Path to the .jsonl file.
+
+    Returns:
+        Dict: {"size", "mtime_ns", "check", "urls": {normalized_url: {"links": [...], "spans": [[offset, length], ...]}}}
+    """
+    stat = os.stat(db_path)
+    key = os.path.abspath(db_path)
+    with _memo_lock:
+        memo = _memo.get(key)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+
+        index = _read_sidecar(db_path)
+        size = logical_size(db_path)  # offsets are uncompressed offsets for .jsonl.gz/.zst
+        with open_read(db_path) as f:
+            if index and index["size"] == size and index["mtime_ns"] == stat.st_mtime_ns:
+                pass
+            elif index and index["size"] <= size and _region_check(f, index["size"]) == index["check"]:
+                index["size"] = _scan(f, index["size"], index["urls"])
+                index["mtime_ns"] = stat.st_mtime_ns
+                index["check"] = _region_check(f, index["size"])
+                _save(db_path, index)
+            else:
+                urls = {}
+                size = _scan(f, 0, urls)
+                index = {"version": INDEX_VERSION, "size": size, "mtime_ns": stat.st_mtime_ns,
+                         "check": _region_check(f, size), "urls": urls}
+                _save(db_path, index)
+
+        _memo[key] = (stat.st_size, stat.st_mtime_ns, index)
+        return index
+
+
+def update_index(db_path: str) -> None:
+    """Bring a database's index up to date after lines were appended to it."""
+    if os.path.exists(db_path):
+        load_index(db_path)
+
+
+def lookup_spans(db_path: str, url: str) -> List[Tuple[int, int]]:
+    """Return (offset, length) of every line in a database whose origin_link normalizes to url's."""
+    entry = load_index(db_path)["urls"].get(normalize_url(url))
+    return [tuple(span) for span in entry["spans"]] if entry else []
+
+
+def read_lines(db_path: str, spans: List[Tuple[int, int]]) -> List[str]:
+    """Read the given (offset, length) lines from a database by seeking, without scanning the file."""
+    lines = []
+    with open_read(db_path) as f:
+        for offset, length in spans:
+            f.seek(offset)
+            lines.append(f.read(length).decode("utf-8"))
+    return lines
+
+
+def indexed_links(db_path: str) -> List[str]:
+    """Return every distinct origin_link stored in a database, as written."""
+    return [link for entry in load_index(db_path)["urls"].values() for link in entry["links"]]
+
+
+def _line_starts(f, start: int) -> Tuple[bytes, int]:
+    """Return packed start offsets of the complete lines from `start` and the offset after the last one."""
+    f.seek(start)
+    starts = []
+    line_start = pos = start
+    while True:
+        chunk = f.read(SCAN_CHUNK)
+        if not chunk:
+            break
+        i = chunk.find(b"\n")
+        while i != -1:
+            starts.append(line_start)
+            line_start = pos + i + 1
+            i = chunk.find(b"\n", i + 1)
+        pos += len(chunk)
+    return struct.pack(f">{len(starts)}Q", *starts), line_start
+
+
+class LineIndex:
+    """Random access to the lines of a JSONL database by line number.
+
+    Line start offsets live in a `<db>.lines` sidecar (8 bytes per line) that is memory-mapped
+    together with the database, so reading any line costs two slices however large the file is.
+    Compressed databases are read through their frame table instead of a map of the file.
+    Like the URL index it is extended in place when the database only grew and rebuilt otherwise,
+    under the sidecar's own lock (readers do not take the database lock). The header is written
+    last and holds the line count, so offsets appended by an interrupted extension are ignored and
+    trimmed by the next one. A final line without a newline is readable but not indexed until it
+    is completed.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.path = db_path + LINES_SUFFIX
+        self._db = self._offsets = None
+        self._files = []
+        self.refresh()
+
+    def _sidecar_header(self):
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(LINES_HEADER.size)
+            magic, version, size, mtime_ns, check, count = LINES_HEADER.unpack(header)
+            if (magic == LINES_MAGIC and version == LINES_VERSION
+                    and os.path.getsize(self.path) >= LINES_HEADER.size + count * OFFSET.size):
+                return size, mtime_ns, check.decode(), count
+        except (OSError, struct.error):
+            pass
+        return None
+
+    def refresh(self) -> None:
+        """Bring the sidecar up to date with the database and remap both files."""
+        self.close()
+        stat = os.stat(self.db_path)
+        size = logical_size(self.db_path)
+        header = self._sidecar_header()
+        if not (header and header[0] == size and header[1] == stat.st_mtime_ns):
+            with database_lock(self.path), open_read(self.db_path) as f:
+                header = self._sidecar_header()  # another session may have extended it while we waited
+                if header and header[0] == size and header[1] == stat.st_mtime_ns:
+                    pass
+                elif header and header[0] <= size and _region_check(f, header[0]) == header[2]:
+                    starts, end = _line_starts(f, header[0])
+                    count = header[3] + len(starts) // OFFSET.size
+                    with open(self.path, "r+b") as out:
+                        out.truncate(LINES_HEADER.size + header[3] * OFFSET.size)  # offsets of an interrupted extension
+                        out.seek(0, os.SEEK_END)
+                        out.write(starts)
+                        out.flush()
+                        out.seek(0)
+                        out.write(LINES_HEADER.pack(LINES_MAGIC, LINES_VERSION, end, stat.st_mtime_ns,
+                                                    _region_check(f, end).encode(), count))
+                else:
+                    starts, end = _line_starts(f, 0)
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+                    with os.fdopen(fd, "wb") as out:
+                        out.write(LINES_HEADER.pack(LINES_MAGIC, LINES_VERSION, end, stat.st_mtime_ns,
+                                                    _region_check(f, end).encode(), len(starts) // OFFSET.size))
+                        out.write(starts)
+                    os.replace(tmp_path, self.path)
+                header = self._sidecar_header()
+
+        self.size, self.file_stat = size, (stat.st_size, stat.st_mtime_ns)
+        self.indexed_size, self._count = header[0], header[3]
+        if self.size and is_compressed(self.db_path):
+            self._db = open_read(self.db_path)
+        elif self.size:
+            db_file = open(self.db_path, "rb")
+            self._files.append(db_file)
+            self._db = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._count:
+            offsets_file = open(self.path, "rb")
+            self._files.append(offsets_file)
+            self._offsets = mmap.mmap(offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self._count + (1 if self.size > self.indexed_size else 0)
+
+    def _bounds(self, i: int) -> Tuple[int, int]:
+        if i >= self._count:
+            return self.indexed_size, self.size
+        start = OFFSET.unpack_from(self._offsets, LINES_HEADER.size + i * OFFSET.size)[0]
+        end = (OFFSET.unpack_from(self._offsets, LINES_HEADER.size + (i + 1) * OFFSET.size)[0]
+               if i + 1 < self._count else self.indexed_size)
+        return start, end
+
+    def line(self, i: int) -> str:
+        """Return line i (0-based) without its newline."""
+        if not 0 <= i < len(self):
+            raise IndexError(f"line {i} out of range for {self.db_path} ({len(self)} lines)")
+        start, end = self._bounds(i)
+        data = self._db[start:end] if isinstance(self._db, mmap.mmap) else self._db.pread(start, end - start)
+        return data.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def lines(self, start: int, count: int) -> List[str]:
+        """Return up to `count` lines from line `start` (0-based)."""
+        return [self.line(i) for i in range(max(0, start), min(start + count, len(self)))]
+
+    def close(self) -> None:
+        for m in (self._db, self._offsets):
+            if m is not None:
+                m.close()
+        for f in self._files:
+            f.close()
+        self._db = self._offsets = None
+        self._files = []
+
+
+_line_indexes = {}  # db path -> LineIndex, kept mapped across Streamlit reruns
+
+
+def line_index(db_path: str) -> LineIndex:
+    """Return the shared LineIndex of a database, refreshed if the file changed since last use."""
+    key = os.path.abspath(db_path)
+    with _memo_lock:
+        index = _line_indexes.get(key)
+        if index is None:
+            index = _line_indexes[key] = LineIndex(db_path)
+        else:
+            stat = os.stat(db_path)
+            if (stat.st_size, stat.st_mtime_ns) != index.file_stat:
+                index.refresh()
+        return index
+
+
+def list_databases(data_dir: str = DATA_DIR) -> List[str]:
+    """Return paths of all .jsonl databases (plain or compressed) in a directory."""
+    if not os.path.exists(data_dir):
+        return []
+    return [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir))
+            if f.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst"))]
+
+
+def _legacy_find(url: str, data_dir: str) -> List[str]:
+    """Full-scan lookup as find_matching_databases did before the index, kept for benchmarking."""
+    matches = []
+    target = normalize_url(url)
+    for path in list_databases(data_dir):
+        with open_read(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line.strip())
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and normalize_url(entry.get("origin_link", "")) == target:
+                    matches.append(os.path.basename(path))
+                    break
+    return matches
+
+
+def _legacy_sections(url: str, db_path: str) -> List[Dict]:
+    target = normalize_url(url)
+    sections = []
+    with open_read(db_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line.strip())
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and normalize_url(entry.get("origin_link", "")) == target:
+                sections.append(entry)
+    return sections
+
+
+def _timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def benchmark(data_dir: str, urls: List[str], repeat: int = 3) -> None:
+    """Print full-scan vs. index timings for database lookups and section loads."""
+    databases = list_databases(data_dir)
+    if not databases:
+        print(f"❌ No .jsonl databases in {data_dir}")
+        return
+
+    start = time.perf_counter()
+    for path in databases:
+        load_index(path)
+    print(f"🗂️ Indexed {len(databases)} databases in {(time.perf_counter() - start) * 1000:.1f} ms (cold, includes sidecar writes)")
+
+    if not urls:
+        urls = [indexed_links(path)[0] for path in databases if indexed_links(path)][:5]
+
+    print(f"{'operation':<42}{'full scan (ms)':>16}{'index (ms)':>12}{'speedup':>10}")
+    for url in urls:
+        def indexed_find():
+            return [os.path.basename(p) for p in databases if lookup_spans(p, url)]
+        scan_ms = _timed(lambda: _legacy_find(url, data_dir), repeat)
+        index_ms = _timed(indexed_find, repeat)
+        print(f"{'find databases: ' + url[-24:]:<42}{scan_ms:>16.2f}{index_ms:>12.3f}{scan_ms / max(index_ms, 1e-6):>9.0f}x")
+
+        for path in databases:
+            if not lookup_spans(path, url):
+                continue
+            scan_ms = _timed(lambda: _legacy_sections(url, path), repeat)
+            index_ms = _timed(lambda: [decode(l) for l in read_lines(path, lookup_spans(path, url))], repeat)
+            label = f"load sections: {os.path.basename(path)[-24:]}"
+            print(f"{label:<42}{scan_ms:>16.2f}{index_ms:>12.3f}{scan_ms / max(index_ms, 1e-6):>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and benchmark origin_link and line offset indexes for JSONL databases.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build or refresh the URL and line indexes of every database")
+    build.add_argument("--data-dir", default=DATA_DIR)
+    bench = sub.add_parser("bench", help="time full-scan lookups against indexed lookups")
+    bench.add_argument("--data-dir", default=DATA_DIR)
+    bench.add_argument("--url", action="append", default=[], help="URL to look up (default: a few from each database)")
+    bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in list_databases(args.data_dir):
+            index = load_index(path)
+            print(f"✅ {path}: {len(index['urls'])} URLs, {len(line_index(path))} lines")
+    else:
+        benchmark(args.data_dir, args.url, args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import sys
+import time
+import sqlite3
+import argparse
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+from db_utils import DATA_DIR, normalize_url
+from db_frames import open_read
+from db_index import load_index
+from db_records import decode, dumps, project
+from db_blobs import REF_FIELD, resolve
+from storage import SHARDS_SUFFIX, SQLITE_SUFFIX, is_database_file, list_stores, open_database, open_store
+
+
+def _host(url: str) -> str:
+    try:
+        return urlparse(url).netloc.lower()
+    except ValueError:
+        return ""
+
+
+def _resolve(databases: Optional[Iterable[str]], data_dir: str) -> List:
+    """Stores for database paths or names (file names without extension); all of data_dir by default."""
+    if databases is None:
+        return list_stores(data_dir)
+    return [open_store(db) if is_database_file(db) else open_database(db, data_dir) for db in databases]
+
+
+def _record(line: Union[str, bytes], fields: Optional[Sequence[str]]) -> Optional[Dict]:
+    return decode(line) if fields is None else project(line, fields)
+
+
+def _read_spans(path: str, spans: Iterable[Tuple[int, int]]) -> Iterator[bytes]:
+    with open_read(path) as f:
+        for offset, length in spans:
+            f.seek(offset)
+            yield f.read(length)
+
+
+def _jsonl_lines(path: str, keys: Optional[List[str]]) -> Iterator[bytes]:
+    """Stored lines of a JSONL database, all of them or those of the given normalized URLs (via the URL index)."""
+    if keys is None:
+        with open_read(path) as f:
+            for line in f:
+                if line.endswith(b"\n") or decode(line) is not None:  # skip a batch being written
+                    yield line
+        return
+    urls = load_index(path)["urls"]
+    for key in keys:
+        if key in urls:
+            yield from _read_spans(path, urls[key]["spans"])
+
+
+def _jsonl_keys(path: str, hosts: set) -> List[str]:
+    return sorted(key for key in load_index(path)["urls"] if _host(key) in hosts)
+
+
+def _sqlite_lines(path: str, keys: Optional[List[str]], hosts: Optional[set]) -> Iterator[str]:
+    """Stored lines of a SQLite database, through its norm_url index when URLs or hosts are given."""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        if keys is not None:
+            for key in keys:
+                for line, in conn.execute("SELECT line FROM sections WHERE norm_url = ? ORDER BY id", (key,)):
+                    yield line
+        elif hosts is not None:
+            # Normalized URLs of a host are "<scheme>://<host>" or start with "<scheme>://<host>/"
+            for host in sorted(hosts):
+                for scheme in ("http", "https"):
+                    root = f"{scheme}://{host}"
+                    rows = conn.execute("SELECT line FROM sections WHERE norm_url = ? OR (norm_url >= ? AND norm_url < ?) "
+                                        "ORDER BY norm_url, id", (root, root + "/", root + "0"))
+                    for line, in rows:
+                        yield line
+        else:
+            for line, in conn.execute("SELECT line FROM sections ORDER BY id"):
+                yield line
+    finally:
+        conn.close()
+
+
+def _store_lines(store, keys: Optional[List[str]], hosts: Optional[set], since: Optional[str],
+                 until: Optional[str]) -> Iterator[Union[str, bytes]]:
+    if store.path.endswith(SQLITE_SUFFIX):
+        yield from _sqlite_lines(store.path, keys, None if keys is not None else hosts)
+        return
+    paths = [store.path]
+    if store.path.endswith(SHARDS_SUFFIX):
+        # Only the shards that can hold the wanted hosts and months are opened at all
+        paths = store.shard_paths(hosts if keys is None else {_host(key) for key in keys}, since, until)
+    for path in paths:
+        yield from _jsonl_lines(path, keys if keys is not None or hosts is None else _jsonl_keys(path, hosts))
+
+
+def iter_sections(databases: Optional[Iterable[str]] = None, urls: Optional[Iterable[str]] = None,
+                  hosts: Optional[Iterable[str]] = None, fields: Optional[Sequence[str]] = None,
+                  data_dir: str = DATA_DIR, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+    """Stream sections from databases, optionally only those of some URLs or hosts, with only some fields.
+
+    Sections are read lazily one at a time, so memory stays constant however large the databases.
+    URL and host filters go through the URL index (JSONL) or the norm_url index (SQLite) and read
+    only the matching lines; URLs match after normalization, hosts case-insensitively, and giving
+    both keeps the URLs on those hosts. With `fields`, only those keys are decoded (see
+    db_records.project); records missing a field just leave it out. Invalid lines are skipped.
+
+    Args:
+        databases: Database paths or names; every database in `data_dir` by default.
+        urls: Origin links to read, in this order (then in file order per URL).
+        hosts: Host names (netlocs) whose sections to read, grouped by URL.
+        fields: Keys to return; whole records by default.
+        data_dir (str): Where to find databases given by name, or all of them.
+        since, until: First and last ingest month ("YYYY-MM") of sharded databases; other
+            databases do not record when a section was ingested and are read whole.
+
+    Yields:
+        Dict: One section (or its projection) at a time, database by database.
+    """
+    host_set = {host.lower() for host in hosts} if hosts is not None else None
+    keys = None
+    if urls is not None:
+        keys = list(dict.fromkeys(normalize_url(url) for url in urls))
+        if host_set is not None:
+            keys = [key for key in keys if _host(key) in host_set]
+    # Bodies kept in the blob store (see db_blobs) are looked up only when content is wanted
+    wanted = fields
+    if fields is not None and "content" in fields and REF_FIELD not in fields:
+        wanted = tuple(fields) + (REF_FIELD,)
+    for store in _resolve(databases, data_dir):
+        if not store.exists():
+            continue
+        records = (_record(line, wanted) for line in _store_lines(store, keys, host_set, since, until))
+        for record in resolve(records, store.path):
+            if record is not None:
+                if wanted is not fields:
+                    record.pop(REF_FIELD, None)
+                yield record
+
+
+def iter_field(field: str, **filters) -> Iterator:
+    """Stream one field of the matching sections (see iter_sections), skipping sections without it."""
+    for record in iter_sections(fields=(field,), **filters):
+        if field in record:
+            yield record[field]
+
+
+def _measure(fn) -> Tuple[float, float]:
+    """Return (ms, peak MB) of a call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    ms = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return ms, peak
+
+
+def benchmark(database: str, data_dir: str = DATA_DIR) -> None:
+    """Compare loading whole records into a list with streaming projections and indexed host filters."""
+    store = open_store(database) if is_database_file(database) else open_database(database, data_dir)
+    links = store.urls()
+    host = max({_host(link) for link in links}, key=lambda h: sum(_host(link) == h for link in links))
+    if not store.path.endswith((SQLITE_SUFFIX, SHARDS_SUFFIX)):
+        load_index(store.path)  # build outside the timings
+
+    def contents_list():
+        sections = list(store.iter_sections())
+        return " ".join(section.get("content", "") for section in sections)
+
+    def host_scan():
+        return [s for s in store.iter_sections() if _host(s.get("origin_link", "")) == host]
+
+    rows = {
+        "list of records, join content": _measure(contents_list),
+        "stream content only": _measure(lambda: sum(len(c) for c in iter_field("content", databases=[store.path]))),
+        f"host {host}: scan + filter": _measure(host_scan),
+        f"host {host}: indexed stream": _measure(lambda: sum(1 for _ in iter_sections([store.path], hosts=[host]))),
+        "one URL, origin_link+content": _measure(lambda: list(iter_sections([store.path], urls=links[:1],
+                                                                          fields=("origin_link", "content")))),
+    }
+    print(f"📦 {store.path}: {len(links)} URLs")
+    print(f"{'operation':<44}{'ms':>10}{'peak MB':>10}")
+    for label, (ms, peak) in rows.items():
+        print(f"{label:<44}{ms:>10.0f}{peak:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream sections from databases, filtered by URL or host, as JSON lines.")
+    parser.add_argument("databases", nargs="*", help="database paths or names (default: all)")
+    parser.add_argument("--url", action="append", dest="urls", help="only this origin link (repeatable)")
+    parser.add_argument("--host", action="append", dest="hosts", help="only this host (repeatable)")
+    parser.add_argument("--fields", help="comma-separated fields to output")
+    parser.add_argument("--since", help="first ingest month (YYYY-MM) of sharded databases")
+    parser.add_argument("--until", help="last ingest month (YYYY-MM) of sharded databases")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--bench", action="store_true", help="time streaming against loading whole records")
+    args = parser.parse_args()
+
+    if args.bench:
+        for database in args.databases or [store.path for store in list_stores(args.data_dir)]:
+            benchmark(database, args.data_dir)
+        return 0
+    fields = args.fields.split(",") if args.fields else None
+    for record in iter_sections(args.databases or None, args.urls, args.hosts, fields, args.data_dir,
+                                args.since, args.until):
+        sys.stdout.write(dumps(record) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import sys
+import json
+import time
+import argparse
+from json.decoder import scanstring
+from typing import Any, Dict, Iterable, List, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib json module is used instead
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+DecodeError = json.JSONDecodeError   # raised for invalid lines by either backend; has .pos and .msg
+
+CONTENT_FIELDS = ("content", "text")
+HEADING_FIELDS = ("heading", "document")
+EXTERNAL_LINK_FIELDS = ("external_links", "external_link")
+
+
+class Section(TypedDict, total=False):
+    """A section record, as written by the scrapers and the PDF pipeline."""
+    section: int
+    heading: str
+    content: str
+    origin_link: str
+    external_links: List[str]
+    last_updated: str
+    tags: List[str]
+
+
+class Document(TypedDict, total=False):
+    """The older document-style record: one `text` per `document`, links under `external_link`."""
+    document: str
+    text: str
+    origin_link: str
+    external_link: Union[str, List[str]]
+    last_updated: str
+    tags: List[str]
+
+
+Record = Union[Section, Document]
+
+
+def loads(line: Union[str, bytes]) -> Any:
+    """Parse one stored line. Raises DecodeError if it is not valid JSON."""
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass  # stdlib accepts a few things orjson rejects (NaN, lone surrogates) and reports positions the same way
+    return json.loads(line)
+
+
+def dumps(record: Any) -> str:
+    """Serialize a record compactly, keeping non-ASCII text unescaped."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(record).decode("utf-8")
+        except TypeError:
+            pass  # values orjson refuses (lone surrogates, huge ints) still round-trip through json
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode(record: Any) -> str:
+    """Return a record as one JSONL line, newline included."""
+    return dumps(record) + "\n"
+
+
+def decode(line: Union[str, bytes]) -> Optional[Dict]:
+    """Parse a stored line into a record dict, or None if it is invalid JSON or not an object."""
+    try:
+        entry = loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _field_value(line: str, field: str):
+    """Return (True, value) for a field found once as a key with a string value, else (False, None)."""
+    key = f'"{field}"'
+    i = line.find(key)
+    if i <= 0 or line[i - 1] == "\\" or line.find(key, i + 1) >= 0:
+        return False, None
+    j = i + len(key)
+    if not line.startswith(':"', j):  # compact writers; stdlib's default ': "' needs the slower walk
+        while line[j:j + 1] in (" ", "\t"):
+            j += 1
+        if line[j:j + 1] != ":":
+            return False, None
+        j += 1
+        while line[j:j + 1] in (" ", "\t"):
+            j += 1
+        if line[j:j + 1] != '"':
+            return False, None
+        j -= 1
+    try:
+        return True, scanstring(line, j + 2)[0]
+    except ValueError:
+        return False, None
+
+
+def project(line: Union[str, bytes], fields: Iterable[str]) -> Optional[Dict]:
+    """Decode only some fields of a stored line, or None if it is not a JSON object.
+
+    With orjson a full parse is as fast as picking fields out, so it is used directly. Otherwise
+    string-valued fields are read straight out of the line without parsing the rest of it (a field
+    name that occurs exactly once as a key is taken as the top-level one; records never nest
+    objects). Anything else - numbers, lists, repeated or escaped names - falls back to a full parse.
+    Missing fields are left out of the result.
+    """
+    if orjson is not None:
+        entry = decode(line)
+        return None if entry is None else {f: entry[f] for f in fields if f in entry}
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    if not line.startswith("{") and not line.lstrip().startswith("{"):
+        return None
+    found = {}
+    for field in fields:
+        ok, value = _field_value(line, field)
+        if not ok:
+            entry = decode(line)
+            return None if entry is None else {f: entry[f] for f in fields if f in entry}
+        found[field] = value
+    return found
+
+
+def _first(record: Dict, fields) -> Any:
+    for field in fields:
+        if record.get(field) is not None:
+            return record[field]
+    return None
+
+
+def content_of(record: Dict) -> Optional[str]:
+    """Return the body text of a section or document record."""
+    return _first(record, CONTENT_FIELDS)
+
+
+def heading_of(record: Dict) -> Optional[str]:
+    """Return the heading of a section, or the title of a document record."""
+    return _first(record, HEADING_FIELDS)
+
+
+def external_links_of(record: Dict) -> List[str]:
+    """Return a record's external links as a list, whichever field and shape it uses."""
+    links = _first(record, EXTERNAL_LINK_FIELDS)
+    if links is None:
+        return []
+    return [str(link) for link in links] if isinstance(links, list) else [str(links)]
+
+
+def _timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def benchmark(path: str) -> None:
+    """Compare stdlib json with the active backend and with projection on a database's lines."""
+    from storage import open_store
+
+    lines = list(open_store(path).iter_lines())
+    size = sum(len(line) for line in lines)
+    records = [json.loads(line) for line in lines]
+    rows = {
+        "json.loads (stdlib)": _timed(lambda: [json.loads(line) for line in lines]),
+        f"loads ({BACKEND})": _timed(lambda: [loads(line) for line in lines]),
+        "project origin_link": _timed(lambda: [project(line, ("origin_link",)) for line in lines]),
+        "json.dumps (stdlib)": _timed(lambda: [json.dumps(record, ensure_ascii=False) for record in records]),
+        f"dumps ({BACKEND})": _timed(lambda: [dumps(record) for record in records]),
+    }
+    print(f"📦 {path}: {len(lines)} lines, {size / 1e6:.1f} MB, backend {BACKEND}")
+    print(f"{'operation':<26}{'ms':>10}{'MB/s':>10}{'vs stdlib':>12}")
+    for label, ms in rows.items():
+        baseline = rows["json.dumps (stdlib)" if "dumps" in label else "json.loads (stdlib)"]
+        print(f"{label:<26}{ms:>10.0f}{size / 1e3 / max(ms, 1e-6):>10.0f}{baseline / max(ms, 1e-6):>11.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure record decode/encode throughput on a database.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("database", help="path to a .jsonl, .jsonl.gz, .jsonl.zst or .sqlite file")
+    args = parser.parse_args()
+    benchmark(args.database)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
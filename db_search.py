@@ -0,0 +1,366 @@
+import os
+import re
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from db_utils import DATA_DIR
+from db_frames import open_read, logical_size
+from db_records import content_of, decode, heading_of
+from db_blobs import resolve
+
+INDEX_FILE = "search_index.db"   # not a database suffix, so it never shows up as one
+SQLITE_SUFFIX = ".sqlite"
+BATCH_ROWS = 5000
+HEADING_WEIGHT = 4.0             # bm25 weight of a heading match relative to a content match
+SNIPPET_TOKENS = 16
+MARK = ("**", "**")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,     -- file relative to the data directory (one shard of a sharded database)
+    db TEXT NOT NULL,            -- database file name
+    inode INTEGER NOT NULL,
+    position INTEGER NOT NULL,   -- JSONL: uncompressed bytes indexed; SQLite: highest row id indexed
+    rows INTEGER NOT NULL        -- lines or rows read up to position
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5(
+    heading, content, url UNINDEXED, host UNINDEXED, db UNINDEXED, source UNINDEXED, section UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+"""
+
+
+def index_path(data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, INDEX_FILE)
+
+
+def _connect(data_dir: str) -> sqlite3.Connection:
+    """Open the index in autocommit mode; each source is indexed in its own BEGIN IMMEDIATE transaction."""
+    conn = sqlite3.connect(index_path(data_dir), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _host(url: Optional[str]) -> str:
+    try:
+        return urlparse(url).netloc.lower()
+    except (ValueError, AttributeError, TypeError):
+        return ""
+
+
+def _sources(path: str) -> List[str]:
+    """Files that hold a database's lines: the file itself, or the shards of a sharded database."""
+    from storage import open_store
+
+    store = open_store(path)
+    return store.shard_paths() if os.path.isdir(path) else [store.path]
+
+
+def _row(entry, db: str, source: str) -> Optional[Tuple]:
+    if not isinstance(entry, dict):
+        return None
+    url = entry.get("origin_link")
+    return (heading_of(entry) or "", content_of(entry) or "", url, _host(url), db, source, entry.get("section"))
+
+
+def _jsonl_lines(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Complete lines in uncompressed bytes [start, end) of a JSONL file.
+
+    A last line without a newline is taken if it is a whole record (see db_frames.ends_open), and
+    left for the next update if it is a batch still being written.
+    """
+    with open_read(path) as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if pos >= end or pos + len(line.rstrip(b"\r\n")) > end:
+                break
+            if not line.endswith(b"\n") and decode(line) is None:
+                break
+            pos += len(line)
+            yield line
+
+
+def _index_source(conn: sqlite3.Connection, data_dir: str, path: str, db: str) -> int:
+    """Index what was added to one file since it was last indexed; returns the sections added.
+
+    A file that was rewritten (other inode, shrunk, or SQLite rows deleted) is indexed again from
+    scratch. The whole step is one write transaction, so concurrent updaters never index a tail twice.
+    """
+    source = os.path.relpath(path, data_dir)
+    sqlite = path.endswith(SQLITE_SUFFIX)
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        return 0
+    if sqlite:
+        db_conn = sqlite3.connect(path, timeout=30)
+        try:
+            end = db_conn.execute("SELECT MAX(id) FROM sections").fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            end = 0
+    else:
+        end = logical_size(path)
+
+    known = conn.execute("SELECT inode, position, rows FROM sources WHERE source = ?", (source,)).fetchone()
+    if known and known[0] == inode and known[1] == end and not sqlite:
+        return 0
+
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        known = conn.execute("SELECT inode, position, rows FROM sources WHERE source = ?", (source,)).fetchone()
+        start, rows = (known[1], known[2]) if known and known[0] == inode else (0, 0)
+        if sqlite and start:
+            if db_conn.execute("SELECT COUNT(*) FROM sections WHERE id <= ?", (start,)).fetchone()[0] < rows:
+                start = rows = 0  # rows were deleted (replace_url, repair)
+        elif start > end:
+            start = rows = 0
+        if known and not start:
+            conn.execute("DELETE FROM sections WHERE source = ?", (source,))
+        if sqlite:
+            lines = (line for line, in db_conn.execute("SELECT line FROM sections WHERE id > ? AND id <= ? ORDER BY id",
+                                                       (start, end)))
+            position = end
+        else:
+            lines = _jsonl_lines(path, start, end)
+        batch, read = [], [0, 0]  # lines and bytes taken from the file
+
+        def decoded():
+            for line in lines:
+                read[0] += 1
+                read[1] += len(line)
+                yield decode(line)
+
+        for entry in resolve(decoded(), path):
+            row = _row(entry, db, source)
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= BATCH_ROWS:
+                conn.executemany("INSERT INTO sections (heading, content, url, host, db, source, section) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                added += len(batch)
+                batch = []
+        conn.executemany("INSERT INTO sections (heading, content, url, host, db, source, section) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        added += len(batch)
+        rows += read[0]
+        if not sqlite:
+            start += read[1]
+        conn.execute("INSERT OR REPLACE INTO sources (source, db, inode, position, rows) VALUES (?, ?, ?, ?, ?)",
+                     (source, db, inode, position if sqlite else start, rows))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        if sqlite:
+            db_conn.close()
+    return added
+
+
+def update(data_dir: str = DATA_DIR, create: bool = False) -> int:
+    """Bring the search index of a data directory up to date; returns the sections added.
+
+    Only lines added since the last update are read; rewritten files are indexed again and
+    deleted ones dropped. Without `create` nothing happens until the index has been built.
+    """
+    from storage import list_stores
+
+    if not create and not os.path.exists(index_path(data_dir)):
+        return 0
+    conn = _connect(data_dir)
+    try:
+        added, current = 0, set()
+        for store in list_stores(data_dir):
+            for path in _sources(store.path):
+                current.add(os.path.relpath(path, data_dir))
+                added += _index_source(conn, data_dir, path, store.filename)
+        for source, in conn.execute("SELECT source FROM sources").fetchall():
+            if source not in current:  # database deleted or renamed
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM sections WHERE source = ?", (source,))
+                conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+                conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return added
+
+
+def index_appended(path: str) -> None:
+    """Index the sections a writer just stored in a database, if its directory has a search index.
+
+    Called by the writers after each batch. A busy or broken index only logs a warning: the
+    next update() catches up from the last indexed position.
+    """
+    data_dir = os.path.dirname(path) or "."
+    if not os.path.exists(index_path(data_dir)):
+        return
+    try:
+        conn = _connect(data_dir)
+        try:
+            for source in _sources(path):
+                _index_source(conn, data_dir, source, os.path.basename(path))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ Search index not updated for {path}: {e}")
+
+
+def to_match(query: str) -> str:
+    """Turn a search box query into an FTS5 expression.
+
+    Words must all occur (in any order), "quoted words" as a phrase, `word*` matches any word
+    starting with it, and `-word` excludes sections containing it. Everything else is taken
+    literally, so punctuation never turns into FTS5 syntax errors.
+    """
+    include, exclude = [], []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        negate = word.startswith("-") and len(word) > 1
+        text = phrase or (word[1:] if negate else word)
+        prefix = bool(word) and text.endswith("*")
+        text = text.rstrip("*")
+        if not re.search(r"\w", text):
+            continue
+        term = '"' + text.replace('"', '""') + '"' + ("*" if prefix else "")
+        (exclude if negate else include).append(term)
+    if not include:
+        return ""
+    expression = " AND ".join(include)
+    return f"({expression}) NOT ({' OR '.join(exclude)})" if exclude else expression
+
+
+def search(query: str, hosts: Optional[Sequence[str]] = None, databases: Optional[Sequence[str]] = None,
+           limit: int = 20, offset: int = 0, data_dir: str = DATA_DIR, raw: bool = False,
+           mark: Tuple[str, str] = MARK) -> Dict:
+    """Return the best matching sections for a query, ranked by BM25 with headings weighted up.
+
+    Args:
+        query: Words, "phrases", prefix* and -excluded words (see to_match); an FTS5 expression with `raw`.
+        hosts: Only sections of these hosts (netlocs).
+        databases: Only sections of these database file names.
+        limit, offset: The page of results to return.
+        mark: Strings put around matched words in the snippets.
+
+    Returns:
+        Dict: `total` matches and `results`, each with db, url, heading, section, snippet and score.
+    """
+    expression = query if raw else to_match(query)
+    if not expression or not os.path.exists(index_path(data_dir)):
+        return {"total": 0, "results": []}
+    where, params = ["sections MATCH ?"], [expression]
+    for column, values in (("host", hosts), ("db", databases)):
+        if values:
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(value.lower() if column == "host" else value for value in values)
+    conn = sqlite3.connect(index_path(data_dir), timeout=30)
+    try:
+        condition = " AND ".join(where)
+        total = conn.execute(f"SELECT COUNT(*) FROM sections WHERE {condition}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT db, url, heading, section, snippet(sections, 1, ?, ?, ' … ', ?), bm25(sections, ?, 1.0) AS score "
+            f"FROM sections WHERE {condition} ORDER BY score LIMIT ? OFFSET ?",
+            [mark[0], mark[1], SNIPPET_TOKENS, HEADING_WEIGHT] + params + [limit, offset]).fetchall()
+    finally:
+        conn.close()
+    keys = ("db", "url", "heading", "section", "snippet", "score")
+    return {"total": total, "results": [dict(zip(keys, row)) for row in rows]}
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(database: str, copies: int = 5) -> None:
+    """Index several copies of a database and time queries against scanning every section."""
+    from storage import JSONL_SUFFIXES, open_store
+
+    source = open_store(database)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        suffix = next(s for s in JSONL_SUFFIXES[::-1] if source.filename.endswith(s))
+        for i in range(copies):
+            shutil.copy(source.path, os.path.join(tmpdir, f"copy{i}{suffix}"))
+        build_ms = _timed(lambda: update(tmpdir, create=True))
+        conn = sqlite3.connect(index_path(tmpdir))
+        total = conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+        sample = " ".join(text for text, in conn.execute("SELECT content FROM sections LIMIT 200"))
+        conn.close()
+        word = re.findall(r"[A-Za-z]{5,}", sample)[0].lower()
+        phrase = re.findall(r"[A-Za-z]{4,} [A-Za-z]{4,}", sample)[0].lower()
+        host = _host(next(source.iter_sections())["origin_link"]) or "unknown"
+        incremental = os.path.join(tmpdir, f"copy0{suffix}")
+        with open(incremental, "ab") as f:
+            for line in list(source.iter_lines())[:1000]:
+                f.write(line.encode("utf-8", "surrogateescape") + b"\n")
+
+        def scan():
+            from storage import list_stores
+            return [s for store in list_stores(tmpdir) for s in store.iter_sections()
+                    if word in (content_of(s) or "").lower()]
+
+        print(f"📦 {copies} copies of {source.path}: {total} sections indexed in {build_ms / 1000:.1f}s "
+              f"({os.path.getsize(index_path(tmpdir)) / 1e6:.0f} MB index)")
+        print(f"{'query':<44}{'ms':>10}{'matches':>10}")
+        queries = {
+            f"word: {word}": dict(query=word),
+            f"prefix: {word[:3]}*": dict(query=word[:3] + "*"),
+            f'phrase: "{phrase}"': dict(query=f'"{phrase}"'),
+            f"word + host {host}": dict(query=word, hosts=[host]),
+            f"word, page 10": dict(query=word, offset=180),
+        }
+        for label, options in queries.items():
+            result = {}
+            ms = min(_timed(lambda: result.update(search(data_dir=tmpdir, **options))) for _ in range(5))
+            print(f"{label[:43]:<44}{ms:>10.1f}{result['total']:>10}")
+        matches = []
+        print(f"{'scan every section for ' + word:<44}{_timed(lambda: matches.extend(scan())):>10.0f}{len(matches):>10}")
+        print(f"{'incremental update, 1000 new lines':<44}{_timed(lambda: update(tmpdir)):>10.0f}")
+        print(f"{'update with nothing new':<44}{_timed(lambda: update(tmpdir)):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over the headings and content of all databases.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="create the index or bring it up to date")
+    find = sub.add_parser("search", help="print the best matching sections")
+    find.add_argument("query", help='words, "phrases", prefix* and -excluded words')
+    find.add_argument("--host", action="append", dest="hosts", help="only this host (repeatable)")
+    find.add_argument("--db", action="append", dest="databases", help="only this database file (repeatable)")
+    find.add_argument("--limit", type=int, default=20)
+    find.add_argument("--raw", action="store_true", help="pass the query to FTS5 unchanged")
+    bench = sub.add_parser("bench", help="time queries on an index of several copies of a database")
+    bench.add_argument("database")
+    bench.add_argument("--copies", type=int, default=5)
+    for p in (sub.choices["build"], find):
+        p.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.database, args.copies)
+        return 0
+    if args.command == "build":
+        start = time.perf_counter()
+        added = update(args.data_dir, create=True)
+        print(f"✅ Indexed {added} new sections in {index_path(args.data_dir)} ({time.perf_counter() - start:.1f}s)")
+        return 0
+    update(args.data_dir)
+    start = time.perf_counter()
+    found = search(args.query, args.hosts, args.databases, args.limit, data_dir=args.data_dir, raw=args.raw)
+    print(f"🔎 {found['total']} matches ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    for result in found["results"]:
+        print(f"{result['score']:8.2f}  {result['db']}  {result['url']}  #{result['section']} {result['heading']}")
+        print(f"          {result['snippet']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,553 @@
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+import itertools
+import threading
+import urllib.error
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from db_utils import DATA_DIR, normalize_url
+from db_frames import open_read, logical_size
+from db_catalog import catalog_entries, fingerprint
+from db_records import decode, encode
+from db_blobs import enabled, resolve
+from db_query import iter_sections
+from storage import SQLITE_SUFFIX, JsonlStore, ShardedStore, is_database_file, open_database, open_store, shard_host
+
+HOST = "127.0.0.1"           # local consumers only, unless --host says otherwise
+PORT = 8765
+CHUNK_BYTES = 64 * 1024      # response bytes buffered before a chunk goes out
+GZIP_LEVEL = 6
+TAIL_BYTES = 64 * 1024       # read backwards at a time to find the last complete line
+NDJSON = "application/x-ndjson"
+PARAMETERS = ("url", "host", "fields", "since", "until", "offset", "limit", "cursor")
+
+
+def _open(database: str, data_dir: str):
+    """Store for a database file name, or a name without extension (see open_database)."""
+    if "/" in database or database.startswith("."):
+        raise FileNotFoundError(f"No database named {database}")
+    store = open_store(os.path.join(data_dir, database)) if is_database_file(database) else \
+        open_database(database, data_dir)
+    if not store.exists():
+        raise FileNotFoundError(f"No database named {database}")
+    return store
+
+
+def _params(query: str) -> Dict[str, List[str]]:
+    params = parse_qs(query, keep_blank_values=True)
+    unknown = sorted(set(params) - set(PARAMETERS))
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(unknown)} (expected {', '.join(PARAMETERS)})")
+    return params
+
+
+def _int(params: Dict[str, List[str]], name: str) -> Optional[int]:
+    if name not in params:
+        return None
+    try:
+        value = int(params[name][-1])
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValueError(f"{name} must be a non-negative integer")
+    return value
+
+
+def _etag(store, query: str, encoding: str) -> str:
+    """Strong ETag of one representation: the database's fingerprint, the query and the content coding."""
+    state = json.dumps([store.filename, fingerprint(store.path), sorted(parse_qs(query, keep_blank_values=True).items()),
+                        encoding])
+    return '"' + hashlib.sha1(state.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _complete_end(path: str) -> int:
+    """Logical size of a JSONL file up to its last complete line (a batch may be being appended)."""
+    end = logical_size(path)
+    with open_read(path) as f:
+        while end > 0:
+            start = max(0, end - TAIL_BYTES)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            end = start
+    return 0
+
+
+def _byte_range(header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """(first, last) of a single `bytes=` range, either side possibly open; None for anything else."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        return (int(first) if first else None), (int(last) if last else None)
+    except ValueError:
+        return None
+
+
+def _accepts_gzip(header: str) -> bool:
+    for coding in header.split(","):
+        name, _, q = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return q.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+# --- incremental cursors ------------------------------------------------------------------
+
+def encode_cursor(state: Dict[str, List[int]]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, List[int]]:
+    """Positions per source file of a cursor; an empty cursor starts from the beginning."""
+    if not token:
+        return {}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        state = None
+    if not isinstance(state, dict) or not all(isinstance(v, list) and len(v) == 3 and all(isinstance(n, int) for n in v)
+                                              for v in state.values()):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def _cursor_sources(store, urls: Optional[List[str]], hosts: Optional[List[str]], since: Optional[str],
+                    until: Optional[str]) -> List[Tuple[str, str]]:
+    """(cursor key, path) of the files a cursor walks: the database file, or the shards left after pruning."""
+    if not isinstance(store, ShardedStore):
+        return [(store.filename, store.path)]
+    wanted = hosts if hosts is not None else [shard_host(url) for url in urls] if urls is not None else None
+    return [(os.path.relpath(path, store.path).replace(os.sep, "/"), path)
+            for path in store.shard_paths(wanted, since, until)]
+
+
+def _position(path: str, conn: Optional[sqlite3.Connection], pos: Optional[int] = None) -> List[int]:
+    """Cursor state of a source: inode, position (offset after a complete line, or row id) and, for
+    SQLite, the rows up to it, which shrink when rows are deleted without the ids moving back.
+
+    Without `pos`, the state at the source's current end.
+    """
+    inode = os.stat(path).st_ino
+    if conn is None:
+        return [inode, _complete_end(path) if pos is None else pos, 0]
+    if pos is None:
+        try:
+            pos = conn.execute("SELECT MAX(id) FROM sections").fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            return [inode, 0, 0]
+    return [inode, pos, conn.execute("SELECT COUNT(*) FROM sections WHERE id <= ?", (pos,)).fetchone()[0]]
+
+
+class _Cursor:
+    """A consumer's position in a database, and the lines added since.
+
+    Every source file (the database, or each shard) is read from the cursor's position to its end
+    as of when the request started, so a response never stops halfway through a batch being
+    written. A source that was rewritten or lost lines since (compaction, replace_url, repair)
+    cannot be continued: then every source starts over and `reset` is set, telling the consumer
+    that this response is a full snapshot again.
+    """
+
+    def __init__(self, store, token: str, sources: List[Tuple[str, str]]):
+        self.store = store
+        self.sources = sources
+        self.conns = {path: sqlite3.connect(path, timeout=30) for _, path in sources if path.endswith(SQLITE_SUFFIX)}
+        before = decode_cursor(token)
+        self.ends = {key: _position(path, self.conns.get(path)) for key, path in sources}
+        self.starts = {}
+        self.reset = bool(set(before) - set(self.ends))
+        for key, path in sources:
+            state, end = before.get(key), self.ends[key]
+            if state is None:
+                self.starts[key] = [end[0], 0, 0]
+            elif state[0] != end[0] or state[1] > end[1] or \
+                    (path in self.conns and _position(path, self.conns[path], state[1])[2] != state[2]):
+                self.reset = True
+            else:
+                self.starts[key] = state
+        if self.reset:
+            self.starts = {key: [end[0], 0, 0] for key, end in self.ends.items()}
+        self.done = dict(self.starts)
+
+    def _lines(self, key: str, path: str) -> Iterator[Tuple[object, int]]:
+        """Lines of one source between the cursor and the end, each with the position after it."""
+        start, end = self.starts[key][1], self.ends[key][1]
+        if path in self.conns:
+            yield from ((line, row_id) for row_id, line in self.conns[path].execute(
+                "SELECT id, line FROM sections WHERE id > ? AND id <= ? ORDER BY id", (start, end)))
+            return
+        with open_read(path) as f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if pos >= end:
+                    break
+                pos += len(line)
+                yield line, pos
+
+    def records(self) -> Iterator[Dict]:
+        """Yield new sections in order, moving `done` along to just after each one yielded."""
+        for key, path in self.sources:
+            raw, parsed = itertools.tee(self._lines(key, path))
+            for (_, pos), entry in zip(raw, resolve((decode(line) for line, _ in parsed), self.store.path)):
+                self.done[key] = [self.starts[key][0], pos, 0]
+                if entry is not None:
+                    yield entry
+            self.done[key] = self.ends[key]
+
+    def more(self) -> bool:
+        """Whether some source was not read to its end (possibly only lines the filters skip)."""
+        return any(self.done[key][1] < self.ends[key][1] for key, _ in self.sources)
+
+    def token(self, finished: bool) -> str:
+        """The cursor to continue from: the ends read, or with a limit, just after the last record served."""
+        if finished:
+            return encode_cursor(self.ends)
+        state = {}
+        for key, path in self.sources:
+            done = self.done[key]
+            state[key] = done if done is self.ends[key] or path not in self.conns else \
+                _position(path, self.conns[path], done[1])
+        return encode_cursor(state)
+
+    def close(self) -> None:
+        for conn in self.conns.values():
+            conn.close()
+
+
+# --- HTTP ----------------------------------------------------------------------------------
+
+class _Body:
+    """Response body sent with chunked transfer coding, gzip-compressed when the client accepts it."""
+
+    def __init__(self, wfile, gzip: bool):
+        self.wfile = wfile
+        self.deflate = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if gzip else None
+        self.buffer, self.size = [], 0
+
+    def write(self, data: bytes) -> None:
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= CHUNK_BYTES:
+            self._send(False)
+
+    def _send(self, final: bool) -> None:
+        data = b"".join(self.buffer)
+        self.buffer, self.size = [], 0
+        if self.deflate:
+            data = self.deflate.compress(data) + (self.deflate.flush() if final else b"")
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def close(self) -> None:
+        self._send(True)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _listing(data_dir: str) -> List[Dict]:
+    """Catalog entries of every database (see db_catalog), with the URL each one is served at."""
+    return [dict({key: value for key, value in entry.items() if key not in ("path", "fingerprint")},
+                 href="/databases/" + quote(entry["filename"]))
+            for entry in catalog_entries(data_dir)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves `GET/HEAD /databases` (the catalog, as JSON) and `GET/HEAD /databases/<name>` (NDJSON).
+
+    A database is streamed section by section, with blob store references resolved. Query
+    parameters: `url` and `host` (repeatable) filter like db_query.iter_sections, `fields` picks
+    keys, `since`/`until` prune the months of a sharded database, `offset`/`limit` select a record
+    range, and `cursor` (empty to start) returns only what was added since that cursor; the next
+    one comes back in `X-Next-Cursor`. Every response has an ETag; `If-None-Match` answers 304
+    while nothing changed, and `If-Match` makes a resumed `offset` fail with 412 if the database
+    changed in between. A JSONL database requested without parameters is served as its stored
+    bytes and also takes byte `Range` requests (with `If-Range`).
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "db_serve/1"
+
+    def do_GET(self):
+        self._handle(True)
+
+    def do_HEAD(self):
+        self._handle(False)
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, "quiet", False):
+            super().log_message(format, *args)
+
+    def _handle(self, body: bool) -> None:
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        try:
+            if parts in ([], ["databases"]):
+                self._send_json(HTTPStatus.OK, {"databases": _listing(self.server.data_dir)}, body)
+            elif len(parts) == 2 and parts[0] == "databases":
+                self._serve_database(parts[1], url.query, body)
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"No such path: {url.path}"}, body)
+        except FileNotFoundError as e:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": str(e)}, body)
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)}, body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the consumer went away mid-stream
+
+    def _send_json(self, status: int, payload: Dict, body: bool) -> None:
+        data = json.dumps(payload, ensure_ascii=False, indent=1).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _start(self, status: int, etag: str, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")  # always revalidate: a database can grow any time
+        self.send_header("Vary", "Accept-Encoding")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _serve_database(self, name: str, query: str, body: bool) -> None:
+        store = _open(name, self.server.data_dir)
+        params = _params(query)
+        raw = not params and isinstance(store, JsonlStore) and not enabled(store.path)
+        wanted_range = _byte_range(self.headers.get("Range")) if raw else None
+        gzip = _accepts_gzip(self.headers.get("Accept-Encoding", "")) and wanted_range is None
+        etag = _etag(store, query, "gzip" if gzip else "identity")
+        if self.headers.get("If-None-Match") in (etag, "*"):
+            self._start(HTTPStatus.NOT_MODIFIED, etag, {"Content-Length": "0"})
+            return
+        if self.headers.get("If-Match") not in (None, etag, "*"):
+            self._send_json(HTTPStatus.PRECONDITION_FAILED, {"error": "The database changed", "etag": etag}, body)
+            return
+        headers = {"Content-Type": NDJSON + "; charset=utf-8", "X-Database": store.filename}
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+        if raw:
+            self._serve_file(store, etag, headers, wanted_range, gzip, body)
+        elif "cursor" in params:
+            self._serve_cursor(store, params, etag, headers, gzip, body)
+        else:
+            self._serve_records(store, params, etag, headers, gzip, body)
+
+    def _serve_file(self, store, etag: str, headers: Dict[str, str], wanted_range, gzip: bool, body: bool) -> None:
+        """The stored lines as they are, whole or a byte range of them."""
+        size = _complete_end(store.path)
+        headers["Accept-Ranges"] = "bytes"
+        first, last, status = 0, size - 1, HTTPStatus.OK
+        if wanted_range and self.headers.get("If-Range") in (None, etag):
+            first, last = wanted_range
+            if first is None:  # the last `last` bytes
+                first, last = max(0, size - (last or 0)), size - 1
+            last = size - 1 if last is None else min(last, size - 1)
+            if first >= size or last < first:
+                self._start(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, etag,
+                            {"Content-Range": f"bytes */{size}", "Content-Length": "0"})
+                return
+            status = HTTPStatus.PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+        if gzip:
+            headers["Transfer-Encoding"] = "chunked"
+        else:
+            headers["Content-Length"] = str(last - first + 1)
+        self._start(status, etag, headers)
+        if not body:
+            return
+        out = _Body(self.wfile, True) if gzip else self.wfile
+        with open_read(store.path) as f:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                data = f.read(min(CHUNK_BYTES, remaining))
+                if not data:
+                    break
+                out.write(data)
+                remaining -= len(data)
+        if gzip:
+            out.close()
+
+    def _serve_records(self, store, params: Dict[str, List[str]], etag: str, headers: Dict[str, str], gzip: bool,
+                       body: bool) -> None:
+        """Sections through db_query.iter_sections, from record `offset` on, at most `limit` of them."""
+        offset, limit = _int(params, "offset") or 0, _int(params, "limit")
+        records = iter_sections([store.path], params.get("url"), params.get("host"), _fields(params),
+                                self.server.data_dir, _last(params, "since"), _last(params, "until"))
+        self._stream(itertools.islice(records, offset, None if limit is None else offset + limit),
+                     etag, headers, gzip, body)
+
+    def _serve_cursor(self, store, params: Dict[str, List[str]], etag: str, headers: Dict[str, str], gzip: bool,
+                      body: bool) -> None:
+        """Sections added since a cursor; with `limit`, a page of them whose cursor continues after the last."""
+        if "offset" in params:
+            raise ValueError("offset cannot be combined with cursor; page with limit and the next cursor")
+        limit = _int(params, "limit")
+        urls, hosts = params.get("url"), params.get("host")
+        keys = {normalize_url(url) for url in urls} if urls is not None else None
+        host_set = {host.lower() for host in hosts} if hosts is not None else None
+        fields = _fields(params)
+        cursor = _Cursor(store, _last(params, "cursor"),
+                         _cursor_sources(store, urls, hosts, _last(params, "since"), _last(params, "until")))
+        try:
+            records = (_pick(entry, fields) for entry in cursor.records() if _matches(entry, keys, host_set))
+            if limit is not None:
+                # The next cursor depends on where the page ends, so a page is read before it is sent
+                records = iter(list(itertools.islice(records, limit)))
+                more = cursor.more()
+                next_token = cursor.token(not more)
+                headers["X-More"] = "true" if more else "false"
+            else:
+                next_token = cursor.token(True)
+            headers["X-Next-Cursor"] = next_token
+            headers["X-Cursor-Reset"] = "true" if cursor.reset else "false"
+            self._stream(records, etag, headers, gzip, body)
+        finally:
+            cursor.close()
+
+    def _stream(self, records: Iterable[Dict], etag: str, headers: Dict[str, str], gzip: bool, body: bool) -> None:
+        headers["Transfer-Encoding"] = "chunked"
+        self._start(HTTPStatus.OK, etag, headers)
+        if not body:
+            return
+        out = _Body(self.wfile, gzip)
+        for record in records:
+            out.write(encode(record).encode("utf-8", "replace"))
+        out.close()
+
+
+def _last(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    return params[name][-1] if name in params else None
+
+
+def _fields(params: Dict[str, List[str]]) -> Optional[List[str]]:
+    return [field for value in params["fields"] for field in value.split(",") if field] if "fields" in params else None
+
+
+def _matches(entry: Dict, keys: Optional[set], hosts: Optional[set]) -> bool:
+    link = entry.get("origin_link")
+    if keys is not None and (not isinstance(link, str) or normalize_url(link) not in keys):
+        return False
+    return hosts is None or shard_host(link) in hosts
+
+
+def _pick(entry: Dict, fields: Optional[List[str]]) -> Dict:
+    return entry if fields is None else {key: entry[key] for key in fields if key in entry}
+
+
+def make_server(host: str = HOST, port: int = PORT, data_dir: str = DATA_DIR, quiet: bool = False) -> ThreadingHTTPServer:
+    """An HTTP server for the databases in `data_dir`, one thread per request; call serve_forever() on it."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.data_dir = data_dir
+    server.quiet = quiet
+    return server
+
+
+# --- benchmark -----------------------------------------------------------------------------
+
+def _fetch(url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes, float]:
+    """(status, headers, body as sent, ms) of a GET."""
+    request = urllib.request.Request(url, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            status, got, data = response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        status, got, data = e.code, dict(e.headers), e.read()
+    return status, got, data, (time.perf_counter() - start) * 1000
+
+
+def benchmark(database: str, data_dir: str = DATA_DIR, new_fraction: float = 0.02) -> None:
+    """Compare full downloads with conditional, ranged, filtered and cursor requests on a copy of a database.
+
+    The copy first gets all but the last `new_fraction` of the sections; the rest are appended
+    between an initial download and the polls that follow.
+    """
+    store = open_store(database) if is_database_file(database) else open_database(database, data_dir)
+    sections = list(store.iter_sections())
+    split = int(len(sections) * (1 - new_fraction))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        copy = JsonlStore(os.path.join(tmpdir, "bench.jsonl"))
+        with copy.writer() as writer:
+            writer.append(sections[:split])
+        server = make_server(HOST, 0, tmpdir, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://{HOST}:{server.server_address[1]}/databases/bench.jsonl"
+        host = max({shard_host(s.get("origin_link")) for s in sections},
+                   key=lambda h: sum(shard_host(s.get("origin_link")) == h for s in sections[:5000]))
+        rows = []
+
+        def row(label, url, headers=None):
+            status, got, data, ms = _fetch(url, headers)
+            lines = (zlib.decompress(data, 31) if got.get("Content-Encoding") == "gzip" else data).count(b"\n")
+            rows.append((label, status, len(data), lines, ms))
+            return got
+
+        first = row("full download", base)
+        row("full download, gzip", base, {"Accept-Encoding": "gzip"})
+        row("revalidate, unchanged (304)", base, {"If-None-Match": first["ETag"]})
+        size = int(first["Content-Length"])
+        row("resume last 10% (Range)", base, {"Range": f"bytes={size - size // 10}-", "If-Range": first["ETag"]})
+        row(f"host {host}, gzip", f"{base}?host={quote(host)}", {"Accept-Encoding": "gzip"})
+        synced = row("cursor: initial sync, gzip", base + "?cursor=", {"Accept-Encoding": "gzip"})
+        with copy.writer() as writer:
+            writer.append(sections[split:])
+        row(f"after +{len(sections) - split} sections: full download", base)
+        polled = row("cursor: poll new sections, gzip", f"{base}?cursor={synced['X-Next-Cursor']}",
+                     {"Accept-Encoding": "gzip"})
+        row("cursor: poll, nothing new", f"{base}?cursor={polled['X-Next-Cursor']}", {"Accept-Encoding": "gzip"})
+        server.shutdown()
+        server.server_close()
+
+    print(f"📦 {store.path}: {len(sections)} sections, {len(sections) - split} appended before the polls")
+    print(f"{'request':<44}{'status':>7}{'MB sent':>10}{'lines':>9}{'ms':>9}")
+    for label, status, sent, lines, ms in rows:
+        print(f"{label:<44}{status:>7}{sent / 1e6:>10.2f}{lines:>9}{ms:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve databases over HTTP as NDJSON, with filters, ranges, cursors and ETags.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="serve every database in the data directory")
+    serve.add_argument("--host", default=HOST, help="interface to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=PORT)
+    serve.add_argument("--quiet", action="store_true", help="do not log requests")
+    bench = sub.add_parser("bench", help="time full, conditional, ranged and cursor requests on a copy of a database")
+    bench.add_argument("database", help="database path or name")
+    bench.add_argument("--new", type=float, default=0.02, help="fraction of sections appended before polling")
+    for p in (serve, bench):
+        p.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.database, args.data_dir, args.new)
+        return 0
+    server = make_server(args.host, args.port, args.data_dir, args.quiet)
+    print(f"🌐 Serving {args.data_dir}/ at http://{args.host}:{args.port}/databases (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 Stopped")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
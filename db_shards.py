@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from db_utils import DATA_DIR, database_lock
+from db_frames import open_append
+from db_hashlog import open_dedup_log
+from db_index import update_index
+from db_records import content_of, dumps, project
+from storage import (JSONL_SUFFIX, JSONL_SUFFIXES, SHARDS_SUFFIX, JsonlStore, ShardedStore, is_database_file,
+                     open_database, open_store, shard_host)
+
+WORKERS = max(1, min(8, os.cpu_count() or 1))
+SPILL_LINES = 50_000    # lines buffered across hosts before they are appended to their shards
+
+
+def _open(database: str, data_dir: str = DATA_DIR):
+    return open_store(database) if is_database_file(database) else open_database(database, data_dir)
+
+
+def shard_database(source: str, target: Optional[str] = None, suffix: str = JSONL_SUFFIX,
+                   month: Optional[str] = None) -> Dict:
+    """Copy a database into a new sharded one next to it, line for line, split by host.
+
+    Flat databases do not record when each section was ingested, so all of them go to one month:
+    `month` (YYYY-MM), by default the month the source was last written. Lines are buffered in
+    bounded memory and appended to their shards in batches; the source is left untouched.
+
+    Returns:
+        Dict: lines copied, shards written and the path of the sharded database.
+    """
+    store = open_store(source)
+    target = target or os.path.join(os.path.dirname(store.path), store.name + SHARDS_SUFFIX)
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} already exists")
+    month = month or time.strftime("%Y-%m", time.localtime(os.path.getmtime(store.path)))
+    sharded = ShardedStore(target)
+    buffers, hosts = {}, set()
+    lines = buffered = 0
+
+    def spill():
+        for host, rows in buffers.items():
+            with open_append(sharded.shard_path(host, month)) as f:
+                f.write("".join(rows))
+        buffers.clear()
+
+    with database_lock(sharded.path):
+        sharded.create(suffix)
+        for line in store.iter_lines():
+            entry = project(line, ("origin_link",))
+            host = shard_host(entry.get("origin_link") if entry else None)
+            if host not in hosts:
+                os.makedirs(os.path.join(sharded.path, host), exist_ok=True)
+                hosts.add(host)
+            buffers.setdefault(host, []).append(line + "\n")
+            lines += 1
+            buffered += 1
+            if buffered >= SPILL_LINES:
+                spill()
+                buffered = 0
+        spill()
+        for host in sorted(hosts):
+            path = sharded.add_shard(host, month)
+            open_dedup_log(path).close()  # build the sidecars now rather than on first use
+            update_index(path)
+    return {"lines": lines, "shards": len(hosts), "path": sharded.path}
+
+
+def scan(database: str, worker: Callable, args: Sequence = (), hosts: Optional[Sequence[str]] = None,
+         since: Optional[str] = None, until: Optional[str] = None, workers: int = WORKERS,
+         data_dir: str = DATA_DIR) -> Iterator:
+    """Run `worker(shard_path, *args)` on every shard left after pruning, in parallel worker processes.
+
+    Shards of other hosts or ingest months are never opened. `worker` must be a module-level
+    function (it is sent to spawned processes); results are yielded in shard order. A flat database
+    is a single shard, so it is scanned whole by one worker.
+    """
+    store = _open(database, data_dir)
+    paths = store.shard_paths(hosts, since, until) if isinstance(store, ShardedStore) else [store.path]
+    if len(paths) <= 1 or workers <= 1:
+        for path in paths:
+            yield worker(path, *args)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(worker, paths, *[[arg] * len(paths) for arg in args])
+
+
+def _grep_shard(path: str, pattern: str, hosts: Optional[List[str]], fields: Optional[Sequence[str]]) -> Dict:
+    """Worker: sections of one shard (or flat database) whose content matches `pattern`."""
+    regex = re.compile(pattern)
+    matches, lines = [], 0
+    for entry in JsonlStore(path).iter_sections():
+        lines += 1
+        if not isinstance(entry, dict):
+            continue
+        if hosts is not None and shard_host(entry.get("origin_link")) not in hosts:
+            continue
+        if regex.search(content_of(entry) or ""):
+            matches.append(entry if fields is None else {key: entry[key] for key in fields if key in entry})
+    return {"shard": path, "lines": lines, "matches": matches}
+
+
+def grep(database: str, pattern: str, hosts: Optional[Sequence[str]] = None, since: Optional[str] = None,
+         until: Optional[str] = None, fields: Optional[Sequence[str]] = None, workers: int = WORKERS,
+         data_dir: str = DATA_DIR) -> Iterator[Dict]:
+    """Yield the sections of some hosts and ingest months whose content matches a regular expression.
+
+    Shards are pruned through the manifest and searched in parallel (see scan); flat databases
+    are searched whole and filtered by host line by line.
+    """
+    host_list = sorted(host.lower() for host in hosts) if hosts is not None else None
+    for report in scan(database, _grep_shard, (pattern, host_list, fields), host_list, since, until, workers, data_dir):
+        yield from report["matches"]
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(database: str, workers: int = WORKERS, data_dir: str = DATA_DIR) -> None:
+    """Compare searching a flat database with searching a sharded copy, pruned and in parallel."""
+    store = _open(database, data_dir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        copy = os.path.join(tmpdir, store.name + SHARDS_SUFFIX)
+        shard_ms = _timed(lambda: shard_database(store.path, copy))
+        sharded = ShardedStore(copy)
+        sizes = {path: os.path.getsize(path) for path in sharded.shard_paths()}
+        by_size = sorted(sizes, key=sizes.get, reverse=True)
+        host, small = (os.path.basename(os.path.dirname(path)) for path in (by_size + by_size)[:2])
+        others = sorted({os.path.basename(os.path.dirname(path)) for path in sizes} - {host})
+        pattern = r"\d{4}"
+        print(f"📦 {store.path}: {len(sizes)} shards written in {shard_ms:.0f} ms; largest host {host} "
+              f"({max(sizes.values()) / 1e6:.1f} of {sum(sizes.values()) / 1e6:.1f} MB); "
+              f"{os.cpu_count()} CPUs, {workers} workers")
+        print(f"{'search /' + pattern + '/':<52}{'ms':>10}")
+        rows = {
+            "all hosts, flat file": lambda: sum(1 for _ in grep(store.path, pattern, workers=1)),
+            "all hosts, shards, 1 worker": lambda: sum(1 for _ in grep(copy, pattern, workers=1)),
+            f"all hosts, shards, {workers} workers": lambda: sum(1 for _ in grep(copy, pattern, workers=workers)),
+            f"host {host}, flat file": lambda: sum(1 for _ in grep(store.path, pattern, [host], workers=1)),
+            f"host {host}, pruned shards": lambda: sum(1 for _ in grep(copy, pattern, [host], workers=workers)),
+            f"host {small}, flat file": lambda: sum(1 for _ in grep(store.path, pattern, [small], workers=1)),
+            f"host {small}, pruned shards": lambda: sum(1 for _ in grep(copy, pattern, [small], workers=workers)),
+            f"other hosts, pruned shards, {workers} workers": lambda: sum(1 for _ in grep(copy, pattern, others,
+                                                                                       workers=workers)),
+        }
+        for label, fn in rows.items():
+            print(f"{label:<52}{_timed(fn):>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split databases into host/month shards and search them in parallel.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split = sub.add_parser("shard", help="copy a database into database/<name>.shards/")
+    split.add_argument("database", help="database path or name")
+    split.add_argument("--to", help="sharded database path (default: alongside the source)")
+    split.add_argument("--suffix", choices=JSONL_SUFFIXES, default=JSONL_SUFFIX, help="shard file format")
+    split.add_argument("--month", help="ingest month of the copied sections (default: the source's last write)")
+    show = sub.add_parser("list", help="list the shards of a sharded database")
+    show.add_argument("database")
+    search = sub.add_parser("grep", help="print sections whose content matches a regular expression, as JSON lines")
+    search.add_argument("database")
+    search.add_argument("pattern")
+    search.add_argument("--fields", help="comma-separated fields to output")
+    bench = sub.add_parser("bench", help="time flat against pruned and parallel sharded searches on a copy")
+    bench.add_argument("database")
+    for p in (show, search):
+        p.add_argument("--host", action="append", dest="hosts", help="only this host (repeatable)")
+        p.add_argument("--since", help="first ingest month (YYYY-MM)")
+        p.add_argument("--until", help="last ingest month (YYYY-MM)")
+    for p in (search, bench):
+        p.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: %(default)s)")
+    for p in (split, show, search, bench):
+        p.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "shard":
+        start = time.perf_counter()
+        result = shard_database(_open(args.database, args.data_dir).path, args.to, args.suffix, args.month)
+        print(f"✅ Copied {result['lines']} lines into {result['shards']} shards in {result['path']} "
+              f"({time.perf_counter() - start:.1f}s)")
+        return 0
+    if args.command == "bench":
+        benchmark(args.database, args.workers, args.data_dir)
+        return 0
+    store = _open(args.database, args.data_dir)
+    if not isinstance(store, ShardedStore):
+        parser.error(f"{store.path} is not a sharded database")
+    if args.command == "list":
+        for path in store.shard_paths(args.hosts, args.since, args.until):
+            print(f"{os.path.relpath(path, store.path):<60}{os.path.getsize(path) / 1e6:>9.1f} MB")
+        return 0
+    fields = args.fields.split(",") if args.fields else None
+    for match in grep(store.path, args.pattern, args.hosts, args.since, args.until, fields, args.workers):
+        sys.stdout.write(dumps(match) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
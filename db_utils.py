@@ -0,0 +1,127 @@
+import os
+import time
+import hashlib
+import logging
+import traceback
+from contextlib import contextmanager
+from typing import Dict, Iterable, Set, Tuple
+from urllib.parse import urlparse, urlunparse
+
+from db_frames import open_read
+from db_records import encode, project
+
+DATA_DIR = "database"  # your JSONL folder
+LOCK_SUFFIX = ".lock"
+LOCK_TIMEOUT = 60.0
+
+try:
+    import fcntl
+
+    def _try_lock(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _try_lock(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL by removing query params and fragments, preserving case for paths."""
+    try:
+        parsed = urlparse(url)
+        normalized = urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path.rstrip('/'), '', '', ''))
+        return normalized
+    except Exception as e:
+        logging.error(f"URL normalization failed for {url}: {str(e)}\n{traceback.format_exc()}")
+        return url
+
+
+def section_hash(section: Dict) -> str:
+    """Return the dedup hash of a section: MD5 of its content plus origin link."""
+    return hashlib.md5((section["content"] + section["origin_link"]).encode()).hexdigest()
+
+
+@contextmanager
+def database_lock(db_path: str, timeout: float = LOCK_TIMEOUT):
+    """Hold the advisory write lock of a database (a `<db>.lock` file next to it).
+
+    Writers, rewrites and deletes take it so they never interleave; readers do not need it. The
+    lock is per open file, so it also separates threads of one process (e.g. Streamlit sessions).
+    The lock file is left in place on purpose: removing it would let two writers lock different files.
+
+    Raises:
+        TimeoutError: If another writer holds the lock for longer than `timeout` seconds.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    with open(db_path + LOCK_SUFFIX, "a+b") as f:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _try_lock(f)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"{db_path} is locked by another writer")
+                time.sleep(0.02)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def load_dedup_state(path: str) -> Tuple[Set[str], Set[str]]:
+    """Load the section hashes and origin links already stored in a JSONL database.
+
+    Args:
+        path (str): Path to the .jsonl (or .jsonl.gz/.zst) file. A missing file yields empty sets.
+
+    Returns:
+        Tuple[Set[str], Set[str]]: Existing section hashes and existing origin links.
+    """
+    existing_hashes = set()
+    existing_links = set()
+    if not os.path.isfile(path):
+        return existing_hashes, existing_links
+    from db_blobs import REF_FIELD, resolve
+
+    with open_read(path) as f_check:
+        for data in resolve((project(line, ("content", REF_FIELD, "origin_link")) for line in f_check), path):
+            try:
+                existing_hashes.add(section_hash(data))
+                existing_links.add(data["origin_link"])
+            except (KeyError, TypeError, ValueError):
+                continue
+    return existing_hashes, existing_links
+
+
+def append_new_sections(f, sections: Iterable[Dict], existing_hashes: Set[str], existing_links: Set[str]) -> int:
+    """Write sections that are not already stored to an open JSONL file.
+
+    Args:
+        f: File object opened for appending.
+        sections (Iterable[Dict]): Sections to store, consumed lazily.
+        existing_hashes (Set[str]): Known section hashes, updated in place.
+        existing_links (Set[str]): Known origin links, updated in place.
+
+    Returns:
+        int: Number of sections written.
+    """
+    written = 0
+    for section in sections:
+        h = section_hash(section)
+        if h in existing_hashes:
+            continue
+        existing_hashes.add(h)
+        existing_links.add(section["origin_link"])
+        f.write(encode(section))
+        written += 1
+    return written
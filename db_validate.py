@@ -0,0 +1,356 @@
+import os
+import sys
+import time
+import codecs
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from db_utils import database_lock
+from db_frames import FRAMES_SUFFIX, open_read, open_write, open_append, logical_size, replace_file
+from db_records import DecodeError, loads
+from db_hashlog import open_dedup_log
+from db_index import update_index
+from db_catalog import forget
+from storage import MANIFEST_FILE, SQLITE_SUFFIX, JsonlStore, open_store
+
+CHUNK_BYTES = 16 << 20       # byte range checked by one task
+CHUNK_ROWS = 50_000          # SQLite rows checked by one task
+MAX_ERRORS = 1000            # error details kept in a summary; counts are always complete
+PREVIEW_CHARS = 100
+WORKERS = max(1, min(8, os.cpu_count() or 1))
+
+STAT_KEYS = ("lines", "valid", "invalid", "not_object", "blank", "bytes")
+
+
+def _preview(text: str) -> str:
+    return text[:PREVIEW_CHARS] + "..." if len(text) > PREVIEW_CHARS else text
+
+
+def _check_line(raw: bytes, length: int, stats: Dict, errors: List, offset: int, index: int, details: bool) -> None:
+    """Classify one stored line into the stats, recording an error if it is bad.
+
+    `raw` is the line without its terminator and `length` the bytes it occupies including it.
+    """
+    stats["lines"] += 1
+    stats["bytes"] += length
+    if not raw.strip():
+        stats["blank"] += 1
+        return
+    try:
+        entry = loads(raw)
+    except DecodeError as e:
+        stats["invalid"] += 1
+        error = {"index": index, "offset": offset, "length": length, "error_type": "JSONDecodeError",
+                 "char_pos": e.pos, "message": str(e)}
+    except UnicodeDecodeError as e:
+        stats["invalid"] += 1
+        error = {"index": index, "offset": offset, "length": length, "error_type": "UnicodeDecodeError",
+                 "char_pos": e.start, "message": str(e)}
+    else:
+        if isinstance(entry, dict):
+            stats["valid"] += 1
+            return
+        stats["not_object"] += 1
+        error = {"index": index, "offset": offset, "length": length, "error_type": "NotAnObject",
+                 "char_pos": 0, "message": f"line holds a JSON {type(entry).__name__}, not an object"}
+    if details:
+        error["line_preview"] = _preview(raw.decode("utf-8", errors="replace"))
+    errors.append(error)
+
+
+def _check_range(path: str, start: int, end: int, details: bool = True) -> Dict:
+    """Worker: check the lines of a JSONL database that begin within [start, end) of its uncompressed bytes.
+
+    Error offsets are uncompressed byte offsets; `index` counts lines from the start of the range.
+    """
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    errors = []
+    with open_read(path) as f:
+        pos = start
+        if start > 0:
+            # The line that crosses `start` belongs to the previous range
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                pos = start + len(next(iter(f), b""))
+        f.seek(pos)
+        for line in f:
+            if pos >= end:
+                break
+            _check_line(line.rstrip(b"\r\n"), len(line), stats, errors, pos, stats["lines"], details)
+            pos += len(line)
+    return {"start": start, "end": end, "stats": stats, "errors": errors}
+
+
+def _check_rows(path: str, first_id: int, last_id: int, details: bool = True) -> Dict:
+    """Worker: check SQLite rows with first_id <= id < last_id; the row id stands in for the offset."""
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    errors = []
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        rows = conn.execute("SELECT id, line FROM sections WHERE id >= ? AND id < ? ORDER BY id", (first_id, last_id))
+        for row_id, line in rows:
+            raw = line.encode("utf-8", errors="surrogatepass")
+            _check_line(raw, len(raw) + 1, stats, errors, row_id, stats["lines"], details)
+    finally:
+        conn.close()
+    return {"start": first_id, "end": last_id, "stats": stats, "errors": errors}
+
+
+def _plan(path: str, chunk_bytes: int, chunk_rows: int, start: int = 0,
+          end: Optional[int] = None) -> Tuple[Callable, List[Tuple[int, int]]]:
+    """Split a database (or bytes [start, end) of a JSONL one) into tasks for the matching worker function."""
+    if path.endswith(SQLITE_SUFFIX):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            low, high = conn.execute("SELECT MIN(id), MAX(id) FROM sections").fetchone()
+        finally:
+            conn.close()
+        if low is None:
+            return _check_rows, []
+        return _check_rows, [(i, min(i + chunk_rows, high + 1)) for i in range(low, high + 1, chunk_rows)]
+    end = logical_size(path) if end is None else end
+    return _check_range, [(i, min(i + chunk_bytes, end)) for i in range(start, end, chunk_bytes)]
+
+
+def iter_validate(path: str, workers: int = WORKERS, chunk_bytes: int = CHUNK_BYTES,
+                  chunk_rows: int = CHUNK_ROWS, details: bool = True) -> Iterator[Dict]:
+    """Check a database in parallel chunks, yielding each chunk's report in file order as it is ready.
+
+    Every report has the chunk's `stats`, the cumulative `totals`, the `progress` (0-1) and its
+    `errors` with 1-based `line` numbers, uncompressed byte `offset` (SQLite: row id) and `length`.
+    Memory stays bounded by the chunk size times the number of workers. Sharded databases are
+    checked shard by shard; their errors also name the `shard` their line numbers refer to.
+    """
+    if os.path.isdir(path):
+        yield from _iter_validate_shards(path, workers, chunk_bytes, chunk_rows, details)
+        return
+    worker, tasks = _plan(path, chunk_bytes, chunk_rows)
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    span = (tasks[-1][1] - tasks[0][0]) if tasks else 0
+    for report in _run(worker, path, tasks, workers, details):
+        for error in report["errors"]:
+            error["line"] = totals["lines"] + error.pop("index") + 1
+        for key in STAT_KEYS:
+            totals[key] += report["stats"][key]
+        report["totals"] = dict(totals)
+        report["progress"] = (report["end"] - tasks[0][0]) / span if span else 1.0
+        yield report
+
+
+def _iter_validate_shards(path: str, workers: int, chunk_bytes: int, chunk_rows: int, details: bool) -> Iterator[Dict]:
+    shards = open_store(path).shard_paths()
+    sizes = [logical_size(shard) for shard in shards]
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    done, span = 0, sum(sizes)
+    for shard, size in zip(shards, sizes):
+        for report in iter_validate(shard, workers, chunk_bytes, chunk_rows, details):
+            for error in report["errors"]:
+                error["shard"] = os.path.relpath(shard, path)
+            for key in STAT_KEYS:
+                totals[key] += report["stats"][key]
+            report["totals"] = dict(totals)
+            report["progress"] = (done + report["progress"] * size) / span if span else 1.0
+            yield report
+        done += size
+
+
+def validate(path: str, workers: int = WORKERS, chunk_bytes: int = CHUNK_BYTES,
+             progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Check a whole database and return its totals plus the first MAX_ERRORS errors.
+
+    `progress` is called with each chunk report as it arrives (e.g. to update a progress bar).
+    """
+    errors = []
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    for report in iter_validate(path, workers, chunk_bytes):
+        errors.extend(report["errors"][:MAX_ERRORS - len(errors)])
+        totals = report["totals"]
+        if progress:
+            progress(report)
+    return {"path": path, "totals": totals, "errors": errors}
+
+
+def _bad_spans(path: str, workers: int, chunk_bytes: int, start: int = 0,
+               end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Return (offset, length) of every bad line (SQLite: (row id, length)), in file order."""
+    worker, tasks = _plan(path, chunk_bytes, CHUNK_ROWS, start, end)
+    spans = []
+    for report in _run(worker, path, tasks, workers, False):
+        spans.extend((error["offset"], error["length"]) for error in report["errors"])
+    return spans
+
+
+def _run(worker: Callable, path: str, tasks: List[Tuple[int, int]], workers: int, details: bool) -> Iterator[Dict]:
+    """Yield worker reports in task order, in worker processes unless there is only one task."""
+    if len(tasks) <= 1 or workers <= 1:
+        for start, end in tasks:
+            yield worker(path, start, end, details)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(worker, [path] * len(tasks), *zip(*tasks), [details] * len(tasks))
+
+
+def _copy_skipping(path: str, out, start: int, end: int, bad: List[Tuple[int, int]]) -> int:
+    """Copy uncompressed bytes [start, end) of a database to `out`, leaving out the bad line spans.
+
+    Returns:
+        int: Lines copied.
+    """
+    kept = 0
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="surrogateescape")  # blocks may split a character
+    with open_read(path) as f:
+        pos = start
+        for offset, length in bad + [(end, 0)]:
+            f.seek(pos)
+            remaining = offset - pos
+            while remaining > 0:
+                block = f.read(min(remaining, CHUNK_BYTES))
+                if not block:
+                    break
+                out.write(decoder.decode(block))
+                kept += block.count(b"\n")
+                remaining -= len(block)
+            pos = offset + length
+    out.write(decoder.decode(b"", final=True))
+    return kept
+
+
+def repaired_path(path: str) -> str:
+    """Where the Manage page writes the clean copy of a database: `<name>_repaired<suffix>` next to it.
+
+    The copy keeps the backend's suffix, so it is listed (and can be opened) as a database of its own.
+    """
+    store = open_store(path.rstrip(os.sep))
+    return os.path.join(os.path.dirname(store.path), f"{store.name}_repaired{store.filename[len(store.name):]}")
+
+
+def repair(path: str, output: Optional[str] = None, workers: int = WORKERS, chunk_bytes: int = CHUNK_BYTES) -> Dict:
+    """Write a database without its invalid and non-object lines, streaming in bounded memory.
+
+    Valid lines are copied byte for byte. Without `output` the database is repaired in place:
+    the clean copy is built next to it without holding the lock, then the lock is taken, lines
+    appended meanwhile are checked and copied too, and the copy replaces the original with its
+    sidecars refreshed. SQLite databases are repaired in place by deleting the bad rows.
+
+    Returns:
+        Dict: lines removed, lines kept and the path written.
+    """
+    target = output or path
+    if os.path.isdir(path):  # sharded: repair each shard, into the same layout under `output` if given
+        removed = kept = 0
+        for shard in open_store(path).shard_paths():
+            shard_output = os.path.join(output, os.path.relpath(shard, path)) if output else None
+            if shard_output:
+                os.makedirs(os.path.dirname(shard_output), exist_ok=True)
+            result = repair(shard, shard_output, workers, chunk_bytes)
+            removed += result["removed"]
+            kept += result["kept"]
+        if output:
+            shutil.copy(os.path.join(path, MANIFEST_FILE), os.path.join(output, MANIFEST_FILE))
+        return {"removed": removed, "kept": kept, "path": target}
+    if path.endswith(SQLITE_SUFFIX):
+        bad_ids = [offset for offset, _ in _bad_spans(path, workers, chunk_bytes)]
+        if output:
+            bad = set(bad_ids)
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                lines = (line for row_id, line in conn.execute("SELECT id, line FROM sections ORDER BY id")
+                         if row_id not in bad)
+                kept = open_store(output).import_lines(lines)
+            finally:
+                conn.close()
+            return {"removed": len(bad_ids), "kept": kept, "path": output}
+        with database_lock(path):
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM sections WHERE id = ?", [(i,) for i in bad_ids])
+                kept = conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+            finally:
+                conn.close()
+            forget(path)  # deleted rows need not move the highest row id the catalog checks
+        return {"removed": len(bad_ids), "kept": kept, "path": path}
+
+    with database_lock(path):
+        size = logical_size(path)  # writers hold the lock mid-batch, so this ends on a complete line
+    bad = _bad_spans(path, workers, chunk_bytes, 0, size)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target) or ".", suffix=".tmp" + JsonlStore(target).suffix)
+    os.close(fd)
+    try:
+        with open_write(tmp_path) as out:
+            kept = _copy_skipping(path, out, 0, size, bad)
+        with database_lock(path):
+            grown = logical_size(path)
+            if grown < size:
+                raise RuntimeError(f"{path} was rewritten during the repair; nothing was changed")
+            if grown > size:
+                # Lines appended while the copy was built
+                tail_bad = _bad_spans(path, 1, chunk_bytes, size, grown)
+                with open_append(tmp_path) as out:
+                    kept += _copy_skipping(path, out, size, grown, tail_bad)
+                bad += tail_bad
+            if output is None:
+                replace_file(tmp_path, path)
+                open_dedup_log(path).close()
+                update_index(path)
+        if output is not None:
+            with database_lock(output):
+                replace_file(tmp_path, output)
+    finally:
+        for leftover in (tmp_path, tmp_path + FRAMES_SUFFIX):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return {"removed": len(bad), "kept": kept, "path": target}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate or repair databases in parallel, streaming chunks of each file.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("validate", help="report invalid lines with their line numbers and byte offsets")
+    check.add_argument("databases", nargs="+")
+    fix = sub.add_parser("repair", help="drop invalid and non-object lines (in place unless --out is given)")
+    fix.add_argument("database")
+    fix.add_argument("--out", help="write the clean copy here instead of replacing the database")
+    for p in (check, fix):
+        p.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: %(default)s)")
+        p.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20, help="bytes per task in MB (default: %(default)s)")
+    args = parser.parse_args()
+    chunk_bytes = args.chunk_mb << 20
+
+    if args.command == "repair":
+        start = time.perf_counter()
+        result = repair(args.database, args.out, args.workers, chunk_bytes)
+        print(f"✅ {result['path']}: removed {result['removed']} bad lines, kept {result['kept']} "
+              f"({time.perf_counter() - start:.1f}s)")
+        return 0
+
+    ok = True
+    for path in args.databases:
+        start = time.perf_counter()
+        shown = 0
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        for report in iter_validate(path, args.workers, chunk_bytes):
+            for error in report["errors"]:
+                if shown < MAX_ERRORS:
+                    print(f"   ❌ line {error['line']} (byte {error['offset']}): {error['error_type']}: {error['message']}")
+                shown += 1
+            totals = report["totals"]
+            if sys.stdout.isatty():
+                print(f"🔎 {path}: {report['progress']:.0%} - {totals['lines']} lines, "
+                      f"{totals['invalid'] + totals['not_object']} bad", end="\r", flush=True)
+        seconds = time.perf_counter() - start
+        bad = totals["invalid"] + totals["not_object"]
+        ok = ok and not bad
+        print(f"{'✅' if not bad else '❌'} {path}: {totals['lines']} lines, {totals['valid']} valid, "
+              f"{totals['invalid']} invalid JSON, {totals['not_object']} not objects, {totals['blank']} blank "
+              f"({totals['bytes'] / 1e6:.1f} MB in {seconds:.1f}s, {totals['bytes'] / 1e6 / max(seconds, 1e-6):.0f} MB/s)")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
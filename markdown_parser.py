@@ -0,0 +1,83 @@
+import io
+import re
+from typing import Dict, Iterable, Iterator, List, Union
+from urllib.parse import urlparse
+
+# ATX headings of any level ("#" through "######")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+MARKDOWN_LINK_RE = re.compile(r"\[(.*?)\]\((https?://.*?)\)")
+PLAIN_URL_RE = re.compile(r'https?://[^\s>]+')
+
+
+def _is_external(url: str, domain: str) -> bool:
+    return not url.startswith(f"https://{domain}") and not url.startswith(f"http://{domain}")
+
+
+def _find_links(text: str) -> List[str]:
+    """Return Markdown-style and plain text URLs found in text, in order of appearance."""
+    links = [url for _, url in MARKDOWN_LINK_RE.findall(text) if url.startswith("http")]
+    links.extend(PLAIN_URL_RE.findall(text))
+    return links
+
+
+def extract_external_links(text_lines, base_url):
+    """Extract external links from text content (supports both Markdown and plain text)"""
+    text = " ".join(text_lines)
+    domain = urlparse(base_url).netloc
+    return [url for url in set(_find_links(text)) if _is_external(url, domain)]
+
+
+def _iter_lines(markdown: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Yield lines without their trailing newline from a string or any iterable of lines."""
+    source = io.StringIO(markdown) if isinstance(markdown, str) else markdown
+    for line in source:
+        yield line.rstrip("\r\n")
+
+
+def iter_markdown_sections(markdown: Union[str, Iterable[str]], origin_link: str) -> Iterator[Dict]:
+    """Stream sections out of markdown, yielding each one as soon as the next heading closes it.
+
+    Args:
+        markdown (str | Iterable[str]): Markdown text, an open file or any iterable of lines.
+        origin_link (str): URL (or path) the markdown was produced from.
+
+    Yields:
+        Dict: Section with section number, heading, content, origin link and external links.
+    """
+    domain = urlparse(origin_link).netloc
+    current_section = 1
+    current_heading = ""
+    current_content = []
+    current_links = {}  # dict keeps first-seen order while deduplicating
+    in_fence = False
+
+    def build_section() -> Dict:
+        return {
+            "section": current_section,
+            "heading": current_heading or "No Heading",
+            "content": "\n".join(current_content).strip(),
+            "origin_link": origin_link,
+            "external_links": list(current_links),
+            "last_updated": "Date not found"
+        }
+
+    for line in _iter_lines(markdown):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            if current_heading or current_content:
+                yield build_section()
+                current_section += 1
+                current_content = []
+                current_links = {}
+            current_heading = match.group(2).strip()
+        else:
+            current_content.append(line)
+            for url in _find_links(line):
+                if _is_external(url, domain):
+                    current_links[url] = None
+
+    if current_heading or current_content:
+        yield build_section()
@@ -1,11 +1,39 @@
 import streamlit as st
 import os
-import json
+import tempfile
 import pandas as pd
 from pathlib import Path
+from storage import JsonlStore, open_store
+from db_catalog import catalog_entries
+from db_records import DecodeError, dumps, loads
+from db_blobs import enabled, resolve
+from db_validate import MAX_ERRORS, iter_validate, repair, repaired_path
+from db_export import export_database, export_path
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def download_source(store):
+    """Return (path, file name, temporary) of the file to offer for download.
+
+    A JSONL file holding whole sections is offered as stored (plain, .gz or .zst, named with its real
+    suffix). SQLite, sharded and blob store databases are written out line by line to a temporary
+    .jsonl file, so no copy of the database is built in memory.
+    """
+    if isinstance(store, JsonlStore) and not enabled(store.path):
+        return store.path, store.filename, False
+    fd, tmp_path = tempfile.mkstemp(suffix=".jsonl")
+    with os.fdopen(fd, "w", encoding="utf-8") as out:
+        if enabled(store.path):  # whole sections, not blob store references
+            for section in store.iter_sections():
+                out.write(dumps(section) + "\n")
+        else:
+            for line in store.iter_lines():
+                out.write(line + "\n")
+    return tmp_path, f"{store.name}.jsonl", True
 
 st.set_page_config(page_title="📚 Manage Databases", layout="wide")
-st.title("📚 Manage JSONL Databases")
+st.title("📚 Manage Databases")
 
 # Initialize session state for error details
 if 'error_details' not in st.session_state:
@@ -15,15 +43,29 @@ if 'error_details' not in st.session_state:
 database_dir = "database"
 Path(database_dir).mkdir(exist_ok=True)
 
-# List all .jsonl files
-jsonl_files = [f for f in os.listdir(database_dir) if f.endswith(".jsonl")]
+# List all .jsonl and .sqlite databases with their counts from the catalog (no file is opened)
+catalog = {entry["filename"]: entry for entry in catalog_entries(database_dir)}
+jsonl_files = list(catalog)
 
 if not jsonl_files:
-    st.info("No .jsonl files found in the database folder.")
+    st.info("No .jsonl or .sqlite files found in the database folder.")
 else:
-    st.subheader("📂 Select a JSONL file to view:")
+    st.dataframe(pd.DataFrame([{
+        "database": entry["filename"],
+        "backend": entry["backend"],
+        "entries": entry["entries"],
+        "URLs": entry["urls"],
+        "hosts": len(entry["hosts"]),
+        "size (MB)": round(entry["bytes"] / 1e6, 2),
+        "schema": entry["schema"],
+        "last ingest": entry["last_ingest"],
+    } for entry in catalog.values()]).set_index("database"), use_container_width=True)
+
+    st.subheader("📂 Select a database to view:")
     selected_file = st.selectbox("", jsonl_files)
-    file_path = os.path.join(database_dir, selected_file)
+    info = catalog[selected_file]
+    store = open_store(info["path"])
+    file_path = store.path
 
     # Error handling options
     error_options = st.expander("🔍 Error Handling Options", expanded=False)
@@ -32,111 +74,144 @@ else:
         show_validation = st.checkbox("Show file validation details")
         show_repair = st.checkbox("🔧 Show repair options")
 
-    if st.button("📖 Load and display"):
+    # Paginated view: only the visible page is read (through the line offset index) and decoded
+    total_lines = store.line_count()
+    col_size, col_page, col_jump = st.columns(3)
+    with col_size:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+    page_count = max(1, -(-total_lines // page_size))
+    with col_page:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    with col_jump:
+        jump_to = st.number_input("Jump to line (0 = use page)", min_value=0, max_value=max(total_lines, 1), value=0, step=1)
+    if jump_to:
+        page = (jump_to - 1) // page_size + 1
+
+    first_line = (page - 1) * page_size
+    rows = []
+    page_errors = []
+    for line_num, line in enumerate(store.read_page(first_line, page_size), first_line + 1):
+        if not line.strip():
+            continue  # Skip empty lines
+        try:
+            entry = loads(line)
+            rows.append({"line": line_num, **entry} if isinstance(entry, dict) else {"line": line_num, "value": entry})
+        except DecodeError as je:
+            page_errors.append({
+                "line": line_num,
+                "char_pos": je.pos,
+                "error_type": "JSONDecodeError",
+                "message": str(je),
+                "line_preview": line[:100] + "..." if len(line) > 100 else line
+            })
+
+    rows = list(resolve(rows, file_path))  # bodies of reference lines come from the blob store
+
+    st.caption(f"Lines {first_line + 1}–{min(first_line + page_size, total_lines)} of {total_lines} in {selected_file} ({store.backend})")
+    if rows:
+        st.dataframe(pd.DataFrame(rows).set_index("line"), use_container_width=True)
+    if page_errors:
+        st.warning(f"{len(page_errors)} invalid line(s) on this page")
+        st.dataframe(pd.DataFrame(page_errors), use_container_width=True)
+
+    if st.button("🔎 Validate whole database"):
         try:
-            with st.spinner("Loading file..."):
-                data = []
-                errors = []
-                
-                # Process file line by line
-                with open(file_path, "r", encoding="utf-8") as f:
-                    for line_num, line in enumerate(f, 1):
-                        if not line.strip():
-                            continue  # Skip empty lines
-                        
-                        try:
-                            data.append(json.loads(line))
-                        except json.JSONDecodeError as je:
-                            errors.append({
-                                "line": line_num,
-                                "char_pos": je.pos,
-                                "error_type": "JSONDecodeError",
-                                "message": str(je),
-                                "line_preview": line[:100] + "..." if len(line) > 100 else line
-                            })
-                        except Exception as e:
-                            errors.append({
-                                "line": line_num,
-                                "error_type": type(e).__name__,
-                                "message": str(e),
-                                "line_preview": line[:100] + "..." if len(line) > 100 else line
-                            })
-                
-                # Store error details in session state
-                st.session_state.error_details = {
-                    "file": selected_file,
-                    "errors": errors,
-                    "valid_entries": data
-                }
-                
-                # Display results
-                if errors:
-                    st.warning(f"Loaded file with {len(errors)} errors. Only valid entries are shown.")
-                    st.markdown("### ❌ Error Details")
-                    
-                    # Error summary table
-                    error_df = pd.DataFrame(errors)
-                    st.dataframe(error_df, use_container_width=True)
-                    
-                    # Detailed error display
-                    for error in errors:
-                        st.markdown(f"""
-                        **Error on line {error['line']}**  
-                        Type: `{error['error_type']}`  
-                        Message: `{error['message']}`  
-                        Line preview: `{error['line_preview']}`
-                        """)
-                    
-                    # Repair option
-                    if show_repair:
-                        st.markdown("### 🔧 Repair Options")
-                        if st.button("Create Clean File"):
-                            repaired_path = os.path.join(database_dir, f"{selected_file}.repaired")
-                            with open(repaired_path, "w", encoding="utf-8") as f:
-                                for item in data:
-                                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
-                            st.success(f"✅ Clean file created at: {repaired_path}")
-                            st.info("You can now load the repaired version")
-                else:
-                    df = pd.DataFrame(data)
-                    st.success(f"✅ Successfully loaded {len(df)} valid entries from {selected_file}")
-                    st.dataframe(df, use_container_width=True)
-
-                    # Download button
-                    if st.download_button("⬇️ Download as JSONL", 
-                                       data=open(file_path, "rb"), 
-                                       file_name=selected_file):
-                        st.toast("Download started!")
-                    
+            # Checked in parallel chunks straight from disk; only the first MAX_ERRORS details are kept
+            bar = st.progress(0.0, text="Validating file...")
+            counts = st.empty()
+            errors = []
+            totals = {}
+            for report in iter_validate(file_path):
+                totals = report["totals"]
+                errors.extend(report["errors"][:MAX_ERRORS - len(errors)])
+                bar.progress(min(report["progress"], 1.0), text=f"Validating file... {totals['bytes'] / 1e6:.0f} MB")
+                counts.caption(f"{totals['lines']} lines: {totals['valid']} valid, "
+                               f"{totals['invalid'] + totals['not_object']} invalid")
+            bar.empty()
+            bad_count = totals.get("invalid", 0) + totals.get("not_object", 0)
+
+            # Store a small summary in session state
+            st.session_state.error_details = {
+                "file": selected_file,
+                "errors": errors,
+                "valid_count": totals.get("valid", 0),
+                "bad_count": bad_count,
+            }
+
+            if bad_count:
+                st.warning(f"Found {bad_count} errors and {totals['valid']} valid entries."
+                           + (f" Showing the first {len(errors)}." if bad_count > len(errors) else ""))
+                st.markdown("### ❌ Error Details")
+                st.dataframe(pd.DataFrame(errors).drop(columns=["length"]), use_container_width=True)
+            else:
+                st.success(f"✅ All {totals.get('valid', 0)} entries in {selected_file} are valid")
+
+                # Download button
+                download_path, download_name, temporary = download_source(store)
+                try:
+                    with open(download_path, "rb") as f:
+                        if st.download_button(f"⬇️ Download {download_name}", data=f, file_name=download_name):
+                            st.toast("Download started!")
+                finally:
+                    if temporary:
+                        os.remove(download_path)
+
         except Exception as e:
             st.error(f"🚨 Unexpected error loading file: {e}")
             st.exception(e)  # Show full traceback in development
 
+    # Repair options stay available after the rerun a button click triggers
+    details = st.session_state.error_details
+    if show_repair and details and details.get("file") == selected_file and details.get("bad_count"):
+        st.markdown("### 🔧 Repair Options")
+        col_clean, col_in_place = st.columns(2)
+        with col_clean:
+            if st.button("Create Clean File"):
+                with st.spinner("Writing clean copy..."):
+                    result = repair(file_path, output=repaired_path(file_path))
+                st.success(f"✅ Clean file created at: {result['path']} ({result['removed']} bad lines dropped)")
+                st.info("You can now load the repaired version")
+        with col_in_place:
+            if st.button("Repair in place"):
+                with st.spinner("Removing bad lines..."):
+                    result = repair(file_path)
+                st.session_state.error_details = None
+                st.success(f"✅ Removed {result['removed']} bad lines from {selected_file}; {result['kept']} kept")
+
     # Show raw content if requested
     if show_raw and os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            st.markdown("### 🔍 Raw File Content")
-            st.code(f.read(2000) + "...", language="json")
+        st.markdown("### 🔍 Raw File Content")
+        raw = "\n".join(store.read_page(0, 50))
+        st.code(raw[:2000] + "...", language="json")
     
     # File validation details
     if show_validation and os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            file_size = os.path.getsize(file_path) / 1024  # in KB
-            line_count = sum(1 for _ in f)
-            f.seek(0)
-            first_lines = ''.join(next(f) for x in range(3))
+        file_size = info["bytes"] / 1024  # in KB
+        first_lines = '\n'.join(store.read_page(0, 3))
+        top_hosts = ", ".join(sorted(info["hosts"], key=info["hosts"].get, reverse=True)[:5])
             
         st.info(f"""
         **File Validation Details**  
-        - File: {selected_file}  
+        - File: {selected_file} ({store.backend})  
         - Size: {file_size:.2f} KB  
-        - Total lines: {line_count}  
+        - Entries: {info['entries']} ({info['urls']} URLs, {info['schema']} records)  
+        - Top hosts: {top_hosts}  
         - First 3 lines preview:  
         ```json
         {first_lines}...
         ```
         """)
 
+    # Columnar export for analysis in pandas; only rows added since the last export are written
+    if st.button("📦 Export to Parquet"):
+        try:
+            with st.spinner("Exporting to Parquet..."):
+                stats = export_database(store.path)
+            st.success(f"✅ {'Rebuilt' if stats['rebuild'] else 'Appended'} {stats['rows']} rows in {export_path(store.filename)} "
+                       f"— load with `db_export.read_export('{store.filename}', columns=[...])`")
+        except Exception as e:
+            st.error(f"❌ Export failed: {e}")
+
 # Deletion section
 st.markdown("---")
 st.subheader("🗑️ Delete one or more databases")
@@ -146,7 +221,7 @@ if to_delete:
     if st.button("🗑️ Delete selected database(s)"):
         for db in to_delete:
             try:
-                os.remove(os.path.join(database_dir, db))
+                open_store(catalog[db]["path"]).delete()  # also removes index, dedup log, WAL files and catalog entry
                 st.success(f"✅ Deleted: {db}")
             except Exception as e:
                 st.error(f"❌ Failed to delete {db}: {e}")
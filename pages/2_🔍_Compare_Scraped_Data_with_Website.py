@@ -2,9 +2,14 @@ import streamlit as st
 from utils import (
     fetch_rendered_text, semantic_similarity, update_state,
     parse_live_content, find_matching_databases, display_sections,
-    generate_diff_html, load_scraped_sections, validate_url, fetch_pdf_text, is_pdf_url
+    generate_diff_html, load_scraped_sections, validate_url, fetch_pdf_text, is_pdf_url, embedding_cache, POOLING
 )
 import os
+import pandas as pd
+from datetime import date
+from db_history import versions, as_of, changes, record_version, word_diff
+from db_align import align_sections, changed_sections, describe, latest_sections, section_text
+from storage import open_store
 
 st.set_page_config(page_title="🧪 Compare Scraped vs Live Content", layout="wide")
 st.title("🧪 Compare Scraped Content with Live Website or PDF")
@@ -23,6 +28,7 @@ if 'state' not in st.session_state:
         'pdf_text': None,
         'pdf_sections': [],
         'similarity': None,
+        'alignment': None,
         'scraped_sections': [],
         'live_sections': [],
         'show_full_screen_scraped': False,
@@ -45,6 +51,7 @@ if input_type != st.session_state.state['input_type']:
     update_state('pdf_text', None, st.session_state.state)
     update_state('pdf_sections', [], st.session_state.state)
     update_state('similarity', None, st.session_state.state)
+    update_state('alignment', None, st.session_state.state)
     update_state('scraped_sections', [], st.session_state.state)
     update_state('live_sections', [], st.session_state.state)
     update_state('url_input', '', st.session_state.state)
@@ -65,6 +72,7 @@ if input_type == "Web Page":
         update_state('pdf_text', None, st.session_state.state)
         update_state('pdf_sections', [], st.session_state.state)
         update_state('similarity', None, st.session_state.state)
+        update_state('alignment', None, st.session_state.state)
         update_state('scraped_sections', [], st.session_state.state)
         update_state('live_sections', [], st.session_state.state)
         update_state('matching_dbs', [], st.session_state.state)
@@ -94,6 +102,7 @@ else:
         update_state('pdf_text', None, st.session_state.state)
         update_state('pdf_sections', [], st.session_state.state)
         update_state('similarity', None, st.session_state.state)
+        update_state('alignment', None, st.session_state.state)
         update_state('scraped_sections', [], st.session_state.state)
         update_state('live_sections', [], st.session_state.state)
         update_state('matching_dbs', [], st.session_state.state)
@@ -178,9 +187,40 @@ if (input_type == "Web Page" and st.session_state.state['url_input'] and st.sess
                 st.error(f"Failed to load scraped data: {str(e)}")
 
 
+# Version history of the URL in the selected database (recorded when the pipeline re-scrapes known URLs)
+if input_type == "Web Page" and st.session_state.state['url_input'] and st.session_state.state['selected_db']:
+    history_db = os.path.join("database", st.session_state.state['selected_db'])
+    url_versions = versions(history_db, st.session_state.state['url_input'])
+    if url_versions:
+        with st.expander(f"🕓 Version history ({len(url_versions)} versions)", expanded=False):
+            st.dataframe(pd.DataFrame(url_versions).set_index("version"), use_container_width=True)
+            as_of_date = st.date_input("Show the page as of", value=date.today())
+            found = as_of(history_db, st.session_state.state['url_input'], as_of_date)
+            if found is None:
+                st.info(f"No version recorded by {as_of_date}")
+            else:
+                number, sections = found
+                st.caption(f"Version {number}: {len(sections)} sections")
+                st.text_area("Content as of that date", " ".join(str(sec.get("content", "")) for sec in sections),
+                             height=200, key="as_of_text")
+            numbers = [v["version"] for v in url_versions]
+            col_old, col_new = st.columns(2)
+            with col_old:
+                old_version = st.selectbox("Compare version", numbers, index=max(0, len(numbers) - 2))
+            with col_new:
+                new_version = st.selectbox("with version", numbers, index=len(numbers) - 1)
+            drift = changes(history_db, st.session_state.state['url_input'], old_version, new_version)
+            if not drift:
+                st.success("✅ No changes between these versions")
+            for change in drift:
+                st.markdown(f"**§{change['section']} {change['change']}** ({', '.join(change['fields'])}) {change['heading'] or ''}")
+                if change["diff"]:
+                    st.code(change["diff"], language=None)
+
 # Compare button
 if st.session_state.state['scraped_text'] or (input_type == "PDF" and st.session_state.state['pdf_input']):
     if st.button(f"🔍 Fetch and compare {'live page' if input_type == 'Web Page' else 'PDF content'}", key="compare_button"):
+        cache_before = embedding_cache.counts()
         with st.spinner(f"🌐 Fetching {'live page' if input_type == 'Web Page' else 'PDF'} content..."):
             update_state('show_full_screen_scraped', False, st.session_state.state)
             update_state('show_full_screen_live', False, st.session_state.state)
@@ -225,6 +265,18 @@ if st.session_state.state['scraped_text'] or (input_type == "PDF" and st.session
                     else:
                         st.warning("No scraped data available for comparison, displaying PDF text only")
                         update_state('similarity', None, st.session_state.state)
+            # Section-level drift against the latest stored version (the database also keeps older copies)
+            fetched_sections = st.session_state.state['live_sections'] if input_type == "Web Page" else st.session_state.state['pdf_sections']
+            if st.session_state.state['scraped_sections'] and fetched_sections:
+                stored_sections = latest_sections(
+                    os.path.join("database", st.session_state.state['selected_db']),
+                    st.session_state.state['url_input'] if input_type == "Web Page" else st.session_state.state['pdf_input'])
+                update_state('alignment', {"old": stored_sections,
+                                           "rows": align_sections(stored_sections, fetched_sections, embedding_cache, POOLING)},
+                             st.session_state.state)
+            else:
+                update_state('alignment', None, st.session_state.state)
+        st.caption(embedding_cache.summary(cache_before))
 
 # Display comparison results only if not in fullscreen mode
 if not any([st.session_state.state['show_full_screen_scraped'], 
@@ -258,6 +310,39 @@ if not any([st.session_state.state['show_full_screen_scraped'],
                                           st.session_state.state['scraped_text']),
                         unsafe_allow_html=True)
 
+        alignment = st.session_state.state.get('alignment')
+        if alignment and comparison_sections:
+            scraped_sections, alignment = alignment["old"], alignment["rows"]
+            source = 'Live' if input_type == 'Web Page' else 'PDF'
+            with st.expander(f"Section drift: {describe(alignment)}", expanded=True):
+                marks = {"matched": "✅ matched", "changed": "🟡 changed", "added": "🟢 added", "removed": "🔴 removed"}
+                st.dataframe(pd.DataFrame([{
+                    "Status": marks[row["status"]],
+                    "Scraped §": scraped_sections[row["old"]].get("section", row["old"] + 1) if row["old"] is not None else "",
+                    f"{source} §": comparison_sections[row["new"]].get("section", row["new"] + 1) if row["new"] is not None else "",
+                    "Heading": row["heading"],
+                    "Score": f"{row['score']:.3f}" if row["score"] is not None else "",
+                } for row in alignment]), use_container_width=True, hide_index=True)
+                for row in alignment:
+                    if row["status"] == "changed":
+                        st.markdown(f"**🟡 {row['heading'] or '(no heading)'}** ({row['score']:.3f})")
+                        st.code(word_diff(section_text(scraped_sections[row["old"]]),
+                                          section_text(comparison_sections[row["new"]])), language=None)
+
+                to_store = changed_sections(alignment, comparison_sections)
+                db_path = os.path.join("database", st.session_state.state['selected_db'] or "")
+                page_url = st.session_state.state['url_input'] if input_type == "Web Page" else st.session_state.state['pdf_input']
+                if to_store and st.session_state.state['selected_db'] and \
+                        st.button(f"💾 Store the {len(to_store)} changed and added sections in {st.session_state.state['selected_db']}",
+                                  key="store_changed_button"):
+                    version = record_version(db_path, page_url, comparison_sections)
+                    with open_store(db_path).writer() as writer:
+                        stored = writer.append(to_store)
+                    st.success(f"✅ Stored {stored} sections" + (f" as version {version}" if version else ""))
+                    update_state('scraped_sections', [], st.session_state.state)
+                    update_state('scraped_text', None, st.session_state.state)
+                    update_state('alignment', None, st.session_state.state)
+
         col1, col2 = st.columns(2)
         with col1:
             st.subheader(f"📄 {'Live Website' if input_type == 'Web Page' else 'PDF'} Text")
@@ -1,9 +1,11 @@
 import streamlit as st
-import json
 import os
 import pandas as pd
-from utils import load_all_urls, load_scraped_text, fetch_rendered_text, semantic_similarity, get_status
+from utils import fetch_rendered_text, similarity_batch, get_status, embedding_cache
 from batch_processing import get_database_files, load_cached_results, save_cached_results
+from storage import open_store
+from db_catalog import catalog_entry
+from db_query import iter_sections
 
 DATA_DIR = "database"
 
@@ -41,6 +43,7 @@ if st.session_state.batch_running:
     
     to_process = db_files if selected_db == "All Databases" else [selected_db]
     overall_results = {}
+    cache_before = embedding_cache.counts()
     
     total_dbs = len(to_process)
     for db_idx, db in enumerate(to_process):
@@ -48,7 +51,7 @@ if st.session_state.batch_running:
             st.warning(f"Batch stopped by user before processing database: {db}")
             break
 
-        db_path = os.path.join(DATA_DIR, f"{db}.jsonl")  # Only append .jsonl once
+        db_path = os.path.join(DATA_DIR, db)
         st.write(f"Processing: {db} → {db_path}")
         
         with st.expander(f"📦 Processing: {db}", expanded=True):
@@ -61,20 +64,27 @@ if st.session_state.batch_running:
                 continue
             
             results = {}
-            db_path = f"{DATA_DIR}/{db}.jsonl"
-            
+
+            def scored(url, similarity_score):
+                results[url]["similarity"] = similarity_score
+                results[url]["status"] = get_status(similarity_score)
+
+            def unscored(url, error):
+                results[url]["status"] = "❌ Not scored"
+                st.error(f"Error scoring {url}: {error}")
+
             try:
-                with open(db_path, "r", encoding="utf-8") as f:
-                    total_lines = sum(1 for _ in f)  # Count total lines
-                    f.seek(0)  # Reset file pointer
-                    
-                    for line_idx, line in enumerate(f):
+                store = open_store(db_path)
+                total_lines = max(catalog_entry(store.path)["entries"], 1)  # Count total entries
+
+                # Stream only the two fields compared, one section at a time; pairs are scored in batches
+                with similarity_batch(scored, unscored) as batch:
+                    for line_idx, obj in enumerate(iter_sections([store.path], fields=("origin_link", "content"))):
                         if st.session_state.stop_batch:
                             st.warning("Batch stopped by user during processing.")
                             break
                         
                         try:
-                            obj = json.loads(line)
                             url = obj.get("origin_link", "")
                             scraped_content = obj.get("content", "")
                             
@@ -97,13 +107,13 @@ if st.session_state.batch_running:
                                         "status": "⚠️ Empty"
                                     }
                                 else:
-                                    similarity_score = semantic_similarity(scraped_content, live_content)
                                     results[url] = {
-                                        "similarity": similarity_score,
+                                        "similarity": None,  # filled in by scored() when the batch is flushed
                                         "scraped_length": len(scraped_content),
                                         "live_length": len(live_content),
-                                        "status": get_status(similarity_score)
+                                        "status": "⏳ Scoring"
                                     }
+                                    batch.add(scraped_content, live_content, url)
                         except Exception as e:
                             st.error(f"Error processing line: {e}")
                             continue
@@ -111,7 +121,10 @@ if st.session_state.batch_running:
                 st.error(f"⚠️ Error reading database file '{db_path}': {str(e)}")
                 continue  # Skip this file and move to the next
             
-            if not st.session_state.stop_batch:
+            missing = sum(1 for result in results.values() if result["status"] in ("⏳ Scoring", "❌ Not scored"))
+            if missing:
+                st.warning(f"{missing} pages of {db} could not be scored; results not cached")
+            elif not st.session_state.stop_batch:
                 save_cached_results(db, results)
                 st.success(f"Saved results for {db} ({len(results)} entries)")
             
@@ -122,6 +135,7 @@ if st.session_state.batch_running:
     status_text.empty()
     
     st.success("✅ Batch processing complete!")
+    st.caption(embedding_cache.summary(cache_before))
     
     # Display Results
     table_data = []
@@ -1,15 +1,12 @@
 import streamlit as st
 import os
-import json
-import re
-from urllib.parse import urlparse
 from utils import (
     find_matching_databases,
-    load_scraped_sections,
-    normalize_url,
-    validate_url,
-    is_pdf_url
+    validate_url
 )
+from storage import open_store
+
+PAGE_SIZES = [5, 10, 25, 50]
 
 st.set_page_config(page_title="🔍 JSONL Entry Viewer", layout="wide")
 st.title("🔍 JSONL Entry Viewer")
@@ -21,7 +18,7 @@ if 'viewer_state' not in st.session_state:
         'url_input': '',
         'matching_dbs': [],
         'selected_db': None,
-        'scraped_sections': [],
+        'entry_count': 0,
         'show_entries': False
     }
 
@@ -33,7 +30,7 @@ if url_input != st.session_state.viewer_state['url_input']:
     st.session_state.viewer_state['url_input'] = url_input
     st.session_state.viewer_state['matching_dbs'] = []
     st.session_state.viewer_state['selected_db'] = None
-    st.session_state.viewer_state['scraped_sections'] = []
+    st.session_state.viewer_state['entry_count'] = 0
     st.session_state.viewer_state['show_entries'] = False
     
     if url_input:
@@ -58,12 +55,12 @@ if st.session_state.viewer_state['url_input'] and st.session_state.viewer_state[
         )
         if selected_db != st.session_state.viewer_state['selected_db']:
             st.session_state.viewer_state['selected_db'] = selected_db
-            st.session_state.viewer_state['scraped_sections'] = []
+            st.session_state.viewer_state['entry_count'] = 0
             st.session_state.viewer_state['show_entries'] = False
     elif len(st.session_state.viewer_state['matching_dbs']) == 1:
         if st.session_state.viewer_state['selected_db'] != st.session_state.viewer_state['matching_dbs'][0]:
             st.session_state.viewer_state['selected_db'] = st.session_state.viewer_state['matching_dbs'][0]
-            st.session_state.viewer_state['scraped_sections'] = []
+            st.session_state.viewer_state['entry_count'] = 0
             st.session_state.viewer_state['show_entries'] = False
 else:
     if st.session_state.viewer_state['url_input'] and validate_url(st.session_state.viewer_state['url_input']):
@@ -75,34 +72,49 @@ if st.session_state.viewer_state['url_input'] and st.session_state.viewer_state[
         with st.spinner("📚 Loading all entries from database..."):
             db_path = os.path.join("database", st.session_state.viewer_state['selected_db'])
             try:
-                scraped_sections, _ = load_scraped_sections(
-                    st.session_state.viewer_state['url_input'],
-                    db_path
-                )
-                if not scraped_sections:
+                # Only count matches here; each page of entries is read from the index when shown
+                entry_count = open_store(db_path).count_url(st.session_state.viewer_state['url_input'])
+                if not entry_count:
                     st.warning(f"No matching entries found in {st.session_state.viewer_state['selected_db']}")
                 else:
-                    st.success(f"Loaded {len(scraped_sections)} entries from {st.session_state.viewer_state['selected_db']}")
-                st.session_state.viewer_state['scraped_sections'] = scraped_sections
+                    st.success(f"Found {entry_count} entries in {st.session_state.viewer_state['selected_db']}")
+                st.session_state.viewer_state['entry_count'] = entry_count
                 st.session_state.viewer_state['show_entries'] = True
             except Exception as e:
                 st.error(f"Failed to load data: {str(e)}")
 
 # Display all entries
-if st.session_state.viewer_state['show_entries'] and st.session_state.viewer_state['scraped_sections']:
-    entries = st.session_state.viewer_state['scraped_sections']
+if st.session_state.viewer_state['show_entries'] and st.session_state.viewer_state['entry_count']:
+    entry_count = st.session_state.viewer_state['entry_count']
     st.subheader(f"All Entries for {st.session_state.viewer_state['url_input']}")
-    st.markdown(f"**Database:** {st.session_state.viewer_state['selected_db']} | **Total Entries:** {len(entries)}")
+    st.markdown(f"**Database:** {st.session_state.viewer_state['selected_db']} | **Total Entries:** {entry_count}")
     
     # Back button
     if st.button("← Back to Search", key="back_button"):
         st.session_state.viewer_state['show_entries'] = False
         st.experimental_rerun()
     
-    # Display all entries
-    for i, entry in enumerate(entries):
+    # Pagination: only the entries on the current page are read, decoded and rendered
+    col_size, col_page, col_jump = st.columns(3)
+    with col_size:
+        page_size = st.selectbox("Entries per page", PAGE_SIZES, index=1)
+    page_count = max(1, -(-entry_count // page_size))
+    with col_page:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    with col_jump:
+        jump_to = st.number_input("Jump to entry (0 = use page)", min_value=0, max_value=entry_count, value=0, step=1)
+    if jump_to:
+        page = (jump_to - 1) // page_size + 1
+    first_entry = (page - 1) * page_size
+    db_path = os.path.join("database", st.session_state.viewer_state['selected_db'])
+    entries = open_store(db_path).sections_for_url(
+        st.session_state.viewer_state['url_input'], first_entry, page_size
+    )
+    
+    # Display entries on this page
+    for i, entry in enumerate(entries, first_entry):
         st.markdown("---")
-        st.subheader(f"Entry {i+1} of {len(entries)}")
+        st.subheader(f"Entry {i+1} of {entry_count}")
         
         # Handle different entry types
         if isinstance(entry, dict):
@@ -184,8 +196,8 @@ elif not st.session_state.viewer_state['url_input']:
     **How to use this viewer:**
     1. Enter a URL you want to view entries for
     2. Select a database that contains this URL
-    3. Click "Load All Entries" to retrieve all entries from the database
-    4. View all entries in fullscreen
+    3. Click "Load All Entries" to find all entries in the database
+    4. Page through the entries in fullscreen
     """)
     
     st.markdown("### Supported JSONL Formats")
@@ -0,0 +1,75 @@
+import streamlit as st
+import os
+import html
+import time
+from db_catalog import catalog_entries
+from db_search import index_path, search, update
+
+DATA_DIR = "database"
+PAGE_SIZES = [10, 25, 50]
+MARK = ("\x02", "\x03")  # around matched words in snippets; replaced after HTML escaping
+
+st.set_page_config(page_title="🔎 Search Databases", layout="wide")
+st.title("🔎 Search Databases")
+st.markdown('Full-text search over the headings and content of every database. Use `"quoted phrases"`, '
+            '`prefix*` and `-excluded` words.')
+
+if not os.path.exists(index_path(DATA_DIR)):
+    st.info("The search index has not been built yet. Building it reads every database once; "
+            "afterwards it is kept up to date as sections are stored.")
+    if st.button("🏗️ Build search index"):
+        with st.spinner("Indexing all databases..."):
+            start = time.perf_counter()
+            added = update(DATA_DIR, create=True)
+        st.success(f"✅ Indexed {added} sections in {time.perf_counter() - start:.1f}s")
+        st.rerun()
+    st.stop()
+
+# Pick up databases changed without a writer (copied in, compacted, deleted); usually a few stats
+update(DATA_DIR)
+
+catalog = catalog_entries(DATA_DIR)
+col_query, col_size = st.columns([4, 1])
+with col_query:
+    query = st.text_input("Search:", placeholder='e.g. "opening hours" library*')
+with col_size:
+    page_size = st.selectbox("Results per page", PAGE_SIZES)
+col_hosts, col_dbs = st.columns(2)
+with col_hosts:
+    hosts = st.multiselect("Only these hosts:", sorted({host for entry in catalog for host in entry["hosts"]}))
+with col_dbs:
+    databases = st.multiselect("Only these databases:", [entry["filename"] for entry in catalog])
+
+if query:
+    page = st.session_state.get("search_page", 1)
+    if st.session_state.get("search_key") != (query, tuple(hosts), tuple(databases), page_size):
+        st.session_state.search_key = (query, tuple(hosts), tuple(databases), page_size)
+        page = 1
+    start = time.perf_counter()
+    found = search(query, hosts or None, databases or None, limit=page_size, offset=(page - 1) * page_size,
+                   data_dir=DATA_DIR, mark=MARK)
+    ms = (time.perf_counter() - start) * 1000
+
+    if not found["total"]:
+        st.warning(f"No sections match {query}")
+        st.stop()
+    page_count = -(-found["total"] // page_size)
+    st.caption(f"{found['total']} matching sections ({ms:.0f} ms) — page {page} of {page_count}")
+
+    for result in found["results"]:
+        snippet = html.escape(result["snippet"]).replace(MARK[0], "<mark>").replace(MARK[1], "</mark>")
+        st.markdown(f"**{html.escape(result['heading'] or '(no heading)')}** · section {result['section']} · "
+                    f"`{result['db']}`  \n[{html.escape(result['url'] or '')}]({result['url'] or ''})", unsafe_allow_html=True)
+        st.markdown(snippet, unsafe_allow_html=True)
+        st.markdown("---")
+
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if page > 1 and st.button("⬅️ Previous"):
+            st.session_state.search_page = page - 1
+            st.rerun()
+    with col_next:
+        if page < page_count and st.button("Next ➡️"):
+            st.session_state.search_page = page + 1
+            st.rerun()
+    st.session_state.search_page = page
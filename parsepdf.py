@@ -1,101 +1,65 @@
-from docling.document_converter import DocumentConverter
-import re
-import json
 import os
-import hashlib
 from contextlib import redirect_stdout
-import io
-from urllib.parse import urlparse, urljoin
-from utils import load_scraped_text, semantic_similarity, extract_external_links # Import required utils
+from utils import load_scraped_text, similarity_batch, embedding_cache # Import required utils
+from markdown_parser import iter_markdown_sections
+from storage import open_store
+from pdf_conversion import convert_pdf_to_markdown
 
-def parse_pdf_markdown(markdown_text, origin_link):
+def iter_pdf_sections(markdown_text, origin_link):
     """
-    Parse PDF markdown with fallback for documents without clear headings
-    and maintain detailed terminal output
+    Stream sections out of PDF markdown with detailed terminal output.
+    Sections are yielded as soon as they close so callers can persist them immediately.
     """
-    sections = []
-    lines = markdown_text.split("\n")
-    current_section = 1
-    current_heading = ""
-    current_content = []
-    
-    # Keep old-style logging
     print("1/4 🧾 Starting PDF markdown parsing")
     print("2/4 📥 Reading markdown content")
-    
-    for line in lines:
-        # Detect Markdown headers
-        if line.startswith("## ") or line.startswith("### "):
-            # Save previous section if we have content
-            if current_heading or current_content:
-                sections.append({
-                    "section": current_section,
-                    "heading": current_heading or "No Heading",
-                    "content": "\n".join(current_content).strip(),
-                    "origin_link": origin_link,
-                    "external_links": extract_external_links(current_content, origin_link),
-                    "last_updated": "Date not found"
-                })
-                print(f"📝 Created section {current_section}: {current_heading[:30]}...")
-                current_section += 1
-                current_content = []
-            
-            # Extract new heading
-            current_heading = line.replace("## ", "").replace("### ", "").strip()
-        else:
-            current_content.append(line)
-    
-    # Save final section (even if no heading found)
-    if current_heading or current_content:
-        sections.append({
-            "section": current_section,
-            "heading": current_heading or "No Heading",
-            "content": "\n".join(current_content).strip(),
-            "origin_link": origin_link,
-            "external_links": extract_external_links(current_content, origin_link),
-            "last_updated": "Date not found"
-        })
-        print(f"📝 Created final section {current_section}: {current_heading[:30]}..." if current_heading else f"📝 Created final section {current_section}: No Heading")
-    
-    # Restore old-style progress indicators
+
+    count = 0
+    for section in iter_markdown_sections(markdown_text, origin_link):
+        heading = section["heading"]
+        print(f"📝 Created section {section['section']}: {heading[:30]}...")
+        count += 1
+        yield section
+
+    # External links are extracted while each section is read
     print("3/4 🔗 Extracting external links")
-    # External links are already extracted during section creation
-    
-    print(f"4/4 ✅ Returning {len(sections)} sections")
-    print(f"📄 Created {len(sections)} sections from {origin_link}")
-    
-    return sections
+    print(f"4/4 ✅ Returning {count} sections")
+    print(f"📄 Created {count} sections from {origin_link}")
+
+def parse_pdf_markdown(markdown_text, origin_link):
+    """
+    Parse PDF markdown with fallback for documents without clear headings
+    and maintain detailed terminal output
+    """
+    return list(iter_pdf_sections(markdown_text, origin_link))
 
 def process_all_pdfs(pdf_paths, output_jsonl, log_area, log_buffer):
     """Process all PDFs with enhanced logging, original URL tracking, and semantic analysis"""
     similarity_results = []  # Store similarity results for PDFs
+    cache_before = embedding_cache.counts()
+
+    def scored(result, similarity):
+        result["score"] = similarity
+        print(f"📊 Semantic similarity score for {result['url']}: {similarity:.3f}")
+
+    def unscored(result, error):
+        result["status"] = "not_scored"
+        print(f"⚠️ Could not score {result['url']}: {error}")
+
     with redirect_stdout(log_buffer):
         print(f"1/7 📁 Setting up output directory: {os.path.dirname(output_jsonl)}")
         os.makedirs(os.path.dirname(output_jsonl), exist_ok=True)
         print(f"2/7 🔍 Checking existing file: {output_jsonl}")
         
-        file_exists = os.path.isfile(output_jsonl)
-        existing_hashes = set()
-        existing_links = set()
-
-        if file_exists:
+        if os.path.isfile(output_jsonl):
             print(f"3/7 🔍 Loading existing data from {output_jsonl}")
-            with open(output_jsonl, "r", encoding="utf-8") as f_check:
-                for line in f_check:
-                    try:
-                        data = json.loads(line)
-                        h = hashlib.md5((data["content"] + data["origin_link"]).encode()).hexdigest()
-                        existing_hashes.add(h)
-                        existing_links.add(data["origin_link"])
-                    except:
-                        continue
         else:
             print("3/7 🧹 Creating new database for PDFs")
 
         print("4/7 🧾 Starting PDF processing")
         log_area.code(log_buffer.getvalue())
 
-        with open(output_jsonl, "a", encoding="utf-8") as f:
+        with open_store(output_jsonl).writer() as writer, similarity_batch(scored, unscored) as batch:
+            existing_links = writer.links
             for local_path, original_url in pdf_paths:  # Now receives tuple (local path + original URL)
                 print(f"\n{'=' * 50}")
                 print(f"🚀 Processing PDF: {original_url}")
@@ -113,30 +77,33 @@ def process_all_pdfs(pdf_paths, output_jsonl, log_area, log_buffer):
                     continue
 
                 try:
-                    converter = DocumentConverter()
-                    result = converter.convert(local_path)
-                    markdown = result.document.export_to_markdown()
+                    markdown = convert_pdf_to_markdown(local_path)
                     
                     print(f"6/7 🔗 Parsing content from {original_url}")
                     log_area.code(log_buffer.getvalue())
                     
-                    pdf_sections = parse_pdf_markdown(markdown, original_url)
-                    new_sections = 0
-                    
-                    # Aggregate content for similarity check
-                    scraped_for_similarity = " ".join(sec["content"] for sec in pdf_sections if sec.get("content"))
-                    
-                    # Fetch existing content from database for comparison
+                    # Fetch existing content from database before new sections land in it
                     existing_content = load_scraped_text(original_url)
+
+                    # Persist sections as the parser yields them
+                    scraped_parts = []
+                    def collect(sections):
+                        for section in sections:
+                            if section.get("content"):
+                                scraped_parts.append(section["content"])
+                            yield section
+                    new_sections = writer.append(collect(iter_pdf_sections(markdown, original_url)))
+
+                    # Aggregate content for similarity check
+                    scraped_for_similarity = " ".join(scraped_parts)
                     
                     if scraped_for_similarity and existing_content:
-                        similarity = semantic_similarity(existing_content, scraped_for_similarity)
                         similarity_results.append({
                             "url": original_url,
-                            "score": similarity,
+                            "score": None,  # set by scored() when the batch is flushed
                             "status": "scraped"
                         })
-                        print(f"📊 Semantic similarity score: {similarity:.3f}")
+                        batch.add(existing_content, scraped_for_similarity, similarity_results[-1])
                     elif scraped_for_similarity:
                         similarity_results.append({
                             "url": original_url,
@@ -152,15 +119,6 @@ def process_all_pdfs(pdf_paths, output_jsonl, log_area, log_buffer):
                         })
                         print("⚠️ No content extracted from PDF for similarity check")
                     
-                    for section in pdf_sections:
-                        h = hashlib.md5((section["content"] + section["origin_link"]).encode()).hexdigest()
-                        if h in existing_hashes:
-                            continue
-                        existing_hashes.add(h)
-                        existing_links.add(original_url)
-                        f.write(json.dumps(section, ensure_ascii=False) + "\n")
-                        new_sections += 1
-                    
                     print(f"7/7 💾 Saved {new_sections} new sections from {original_url}")
                     log_area.code(log_buffer.getvalue())
                     
@@ -172,5 +130,8 @@ def process_all_pdfs(pdf_paths, output_jsonl, log_area, log_buffer):
                         "score": None,
                         "status": "error"
                     })
+
+        print(embedding_cache.summary(cache_before))
+        log_area.code(log_buffer.getvalue())
     
     return similarity_results  # Return similarity results for display
\ No newline at end of file
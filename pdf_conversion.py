@@ -0,0 +1,246 @@
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+import PyPDF2
+import requests
+from docling.document_converter import DocumentConverter
+
+from markdown_parser import HEADING_RE
+from pdf_workers import SupervisedProcessPool
+
+CONVERSION_CACHE_DIR = os.path.join("cache", "conversions")
+CACHE_VERSION = 1  # bump when the markdown export changes shape
+
+SHARD_PAGES = 20       # pages per shard when a document is split
+SHARD_MIN_PAGES = 60   # documents with more pages than this are split into shards
+SHARD_RETRIES = 1      # extra attempts for a failed shard before falling back to plain text
+
+# Docling runs in supervised worker processes so its models never grow inside the app process
+WORKER_COUNT = int(os.environ.get("PDF_WORKERS", max(1, min(2, os.cpu_count() or 1))))
+WORKER_RSS_LIMIT_MB = int(os.environ.get("PDF_WORKER_RSS_LIMIT_MB", 6144))   # 0 disables the ceiling
+WORKER_MAX_DOCUMENTS = int(os.environ.get("PDF_WORKER_MAX_DOCUMENTS", 25))   # documents or shards per worker
+
+_converter = None  # warm converter, one per process
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_converter() -> DocumentConverter:
+    """Return this process's DocumentConverter, creating it on first use so models load once."""
+    global _converter
+    if _converter is None:
+        _converter = DocumentConverter()
+    return _converter
+
+
+def warm_worker() -> None:
+    """Process pool initializer that loads the Docling models once per worker."""
+    get_converter()
+
+
+def get_worker_pool() -> SupervisedProcessPool:
+    """Return the shared pool of memory-bounded Docling workers, starting it on first use."""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = SupervisedProcessPool(
+                WORKER_COUNT, initializer=warm_worker,
+                rss_limit_mb=WORKER_RSS_LIMIT_MB, max_tasks_per_worker=WORKER_MAX_DOCUMENTS
+            )
+            atexit.register(_worker_pool.shutdown, wait=False)
+        return _worker_pool
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CONVERSION_CACHE_DIR, f"v{CACHE_VERSION}", key[:2], f"{key}.md")
+
+
+def load_cached_markdown(key: str) -> Optional[str]:
+    """Return cached markdown for a PDF content hash, or None if it was never converted."""
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def save_cached_markdown(key: str, markdown: str) -> None:
+    """Store markdown for a PDF content hash, replacing the file atomically."""
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(markdown)
+    os.replace(tmp_path, path)
+
+
+def count_pdf_pages(path: str) -> int:
+    """Return the number of pages in a PDF, or 0 if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    except Exception:
+        return 0
+
+
+def plan_page_shards(page_count: int, shard_pages: int = SHARD_PAGES) -> List[Tuple[int, int]]:
+    """Split 1..page_count into consecutive inclusive page ranges of at most shard_pages pages."""
+    return [(start, min(start + shard_pages - 1, page_count))
+            for start in range(1, page_count + 1, shard_pages)]
+
+
+def convert_page_range(path: str, start: Optional[int] = None, end: Optional[int] = None) -> str:
+    """Convert a PDF, or only pages start..end (1-based, inclusive), to markdown with the warm converter."""
+    if start is None:
+        result = get_converter().convert(path)
+    else:
+        result = get_converter().convert(path, page_range=(start, end))
+    return result.document.export_to_markdown()
+
+
+def extract_page_range_text(path: str, start: int, end: int) -> str:
+    """Extract plain text for pages start..end with PyPDF2, used when Docling keeps failing on a shard."""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        texts = [reader.pages[i].extract_text() or "" for i in range(start - 1, end)]
+    return "\n\n".join(text.strip() for text in texts if text.strip())
+
+
+def _last_line(text: str) -> str:
+    lines = text.rstrip().rsplit("\n", 1)
+    return lines[-1].strip()
+
+
+def _first_line(text: str) -> str:
+    return text.lstrip().split("\n", 1)[0].strip()
+
+
+def stitch_markdown(parts: List[str]) -> str:
+    """Join per-shard markdown in page order.
+
+    Sections are parsed from the stitched text, so a heading at the end of one shard keeps the
+    body that continues in the next. When Docling repeats a heading on both sides of a shard
+    boundary, the copy opening the later shard is dropped.
+    """
+    stitched = []
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if stitched:
+            previous = _last_line(stitched[-1])
+            first = _first_line(part)
+            if HEADING_RE.match(previous) and first == previous:
+                part = part.lstrip().split("\n", 1)[1] if "\n" in part.lstrip() else ""
+        stitched.append(part)
+    return "\n\n".join(p for p in stitched if p)
+
+
+def convert_shards(pool, path: str, shards: List[Tuple[int, int]], key: Optional[str] = None,
+                   retries: int = SHARD_RETRIES) -> Tuple[str, List[Tuple[int, int]]]:
+    """Convert page-range shards of one PDF in parallel and stitch them back together in order.
+
+    A failed shard is resubmitted on its own up to `retries` times; if it still fails its pages
+    fall back to PyPDF2 text so one bad page does not fail the document.
+
+    Args:
+        pool: Executor whose workers run convert_page_range.
+        path (str): Local path to the PDF.
+        shards (List[Tuple[int, int]]): Inclusive 1-based page ranges, in order.
+        key (str): Content hash of the PDF; converted shards are cached under it.
+        retries (int): Extra attempts per failed shard.
+
+    Returns:
+        Tuple[str, List[Tuple[int, int]]]: Stitched markdown and the shards that fell back to plain text.
+    """
+    parts = [None] * len(shards)
+    futures = {}
+    for i, (start, end) in enumerate(shards):
+        cached = load_cached_markdown(f"{key}-p{start}-{end}") if key else None
+        if cached is not None:
+            parts[i] = cached
+        else:
+            futures[i] = pool.submit(convert_page_range, path, start, end)
+
+    degraded = []
+    for i, future in futures.items():
+        start, end = shards[i]
+        for attempt in range(retries + 1):
+            try:
+                parts[i] = future.result()
+                if key:
+                    save_cached_markdown(f"{key}-p{start}-{end}", parts[i])
+                break
+            except Exception:
+                if attempt < retries:
+                    future = pool.submit(convert_page_range, path, start, end)
+        if parts[i] is None:
+            degraded.append((start, end))
+            try:
+                parts[i] = extract_page_range_text(path, start, end)
+            except Exception:
+                parts[i] = ""
+
+    return stitch_markdown(parts), degraded
+
+
+def convert_pdf_to_markdown(path: str, use_cache: bool = True, pool=None,
+                            shard_pages: int = SHARD_PAGES) -> str:
+    """Convert a local PDF to markdown with the warm converter, reusing cached conversions.
+
+    PDFs longer than SHARD_MIN_PAGES are split into page-range shards that convert in parallel.
+    A worker that crashes or exceeds its memory ceiling surfaces as WorkerCrashedError.
+
+    Args:
+        path (str): Local path to the PDF.
+        use_cache (bool): Look up and store results in the conversion cache keyed by file hash.
+        pool: Executor to run conversions on; defaults to the shared supervised worker pool.
+        shard_pages (int): Pages per shard; 0 disables sharding.
+
+    Returns:
+        str: The document exported as markdown.
+    """
+    key = file_sha256(path) if use_cache else None
+    if key:
+        cached = load_cached_markdown(key)
+        if cached is not None:
+            return cached
+
+    pool = pool or get_worker_pool()
+    page_count = count_pdf_pages(path) if shard_pages else 0
+    if page_count > SHARD_MIN_PAGES:
+        markdown, degraded = convert_shards(pool, path, plan_page_shards(page_count, shard_pages), key)
+        if degraded:
+            # Leave the document uncached so a later run retries the failed shards
+            ranges = ", ".join(f"{start}-{end}" for start, end in degraded)
+            print(f"⚠️ Pages {ranges} of {path} fell back to plain text extraction")
+            return markdown
+    else:
+        markdown = pool.submit(convert_page_range, path).result()
+
+    if key:
+        save_cached_markdown(key, markdown)
+    return markdown
+
+
+def download_pdf(url: str, dest_dir: str, timeout: int = 30) -> str:
+    """Download a PDF into dest_dir and return the local path."""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    fd, local_path = tempfile.mkstemp(dir=dest_dir, suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(response.content)
+    return local_path
@@ -0,0 +1,223 @@
+import os
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Executor, Future
+from typing import Callable, Optional
+
+try:
+    import psutil
+except ImportError:  # optional; /proc is used on Linux without it
+    psutil = None
+
+POLL_INTERVAL = 0.5      # seconds between memory/liveness checks while a task runs
+RECYCLE_FRACTION = 0.8   # restart an idle worker once it holds this share of the RSS ceiling
+
+
+class WorkerCrashedError(RuntimeError):
+    """A worker process died while running a task (for example killed by the OOM killer)."""
+
+
+class WorkerMemoryError(WorkerCrashedError):
+    """A worker process was stopped because it grew past the configured RSS ceiling."""
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """Return the resident set size of a process in bytes, or None if it cannot be measured."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _worker_main(conn, initializer):
+    """Worker loop: run (fn, args, kwargs) tasks from the pipe until told to stop."""
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            conn.send((True, fn(*args, **kwargs)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}\n{traceback.format_exc()}"))
+
+
+class _WorkerSlot:
+    """One supervised worker process and the thread that feeds it tasks."""
+
+    def __init__(self, pool: "SupervisedProcessPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.tasks_done = 0
+        self.thread = threading.Thread(target=self.run, name=f"pdf-worker-supervisor-{index}", daemon=True)
+        self.thread.start()
+
+    def start_process(self):
+        parent_conn, child_conn = self.pool.context.Pipe()
+        self.process = self.pool.context.Process(
+            target=_worker_main, args=(child_conn, self.pool.initializer),
+            name=f"pdf-worker-{self.index}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.tasks_done = 0
+
+    def stop_process(self, kill: bool = False):
+        if self.process is None:
+            return
+        if not kill and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+            except (OSError, BrokenPipeError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def restart(self, reason: str):
+        logging.warning(f"Restarting PDF worker {self.index}: {reason}")
+        self.stop_process(kill=True)
+        self.pool.restarts += 1
+
+    def run(self):
+        while True:
+            item = self.pool.tasks.get()
+            if item is None:
+                self.stop_process()
+                return
+            future, task = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.process is None or not self.process.is_alive():
+                self.start_process()
+            self.execute(future, task)
+
+    def execute(self, future: Future, task):
+        limit = self.pool.rss_limit_bytes
+        try:
+            self.conn.send(task)
+        except (OSError, BrokenPipeError) as e:
+            self.restart(f"could not send task ({e})")
+            future.set_exception(WorkerCrashedError(f"PDF worker {self.index} was not reachable: {e}"))
+            return
+
+        while True:
+            try:
+                ready = self.conn.poll(POLL_INTERVAL)
+            except (OSError, EOFError):
+                ready = False
+            if ready:
+                try:
+                    ok, payload = self.conn.recv()
+                except (OSError, EOFError):
+                    ok, payload = None, None
+                if ok is not None:
+                    break
+            if not self.process.is_alive() or ready:
+                self.process.join(timeout=1)
+                exitcode = self.process.exitcode
+                self.restart(f"exited with code {exitcode}")
+                future.set_exception(WorkerCrashedError(
+                    f"PDF worker exited with code {exitcode} while converting "
+                    f"(most likely killed for running out of memory)"
+                ))
+                return
+            rss = process_rss(self.process.pid) if limit else None
+            if rss is not None and rss > limit:
+                self.restart(f"RSS {rss / 2**20:.0f} MB above ceiling")
+                future.set_exception(WorkerMemoryError(
+                    f"PDF worker exceeded the {limit / 2**20:.0f} MB memory ceiling "
+                    f"({rss / 2**20:.0f} MB) and was stopped"
+                ))
+                return
+
+        self.tasks_done += 1
+        if ok:
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+        # Recycle between tasks so model caches and fragmentation cannot accumulate forever
+        max_tasks = self.pool.max_tasks_per_worker
+        if max_tasks and self.tasks_done >= max_tasks:
+            logging.info(f"Recycling PDF worker {self.index} after {self.tasks_done} documents")
+            self.stop_process()
+        elif limit:
+            rss = process_rss(self.process.pid)
+            if rss is not None and rss > limit * RECYCLE_FRACTION:
+                logging.info(f"Recycling PDF worker {self.index} at {rss / 2**20:.0f} MB RSS")
+                self.stop_process()
+
+
+class SupervisedProcessPool(Executor):
+    """Process pool whose workers are restarted when they crash, grow too large or age out.
+
+    Unlike ProcessPoolExecutor, a worker that dies (for example killed by the OOM killer)
+    only fails the task it was running; the pool starts a fresh worker and keeps going.
+
+    Args:
+        max_workers (int): Number of worker processes.
+        initializer (Callable): Called once in every new worker, e.g. to warm up models.
+        rss_limit_mb (int): Resident memory ceiling per worker; 0 disables the check.
+        max_tasks_per_worker (int): Tasks a worker runs before it is replaced; 0 disables recycling.
+    """
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None,
+                 rss_limit_mb: int = 0, max_tasks_per_worker: int = 0):
+        self.context = multiprocessing.get_context("spawn")
+        self.initializer = initializer
+        self.rss_limit_bytes = rss_limit_mb * 2**20
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.restarts = 0
+        self.tasks = queue.Queue()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._slots = [_WorkerSlot(self, i) for i in range(max(1, max_workers))]
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that has been shut down")
+            future = Future()
+            self.tasks.put((future, (fn, args, kwargs)))
+            return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self.tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self._slots:
+                self.tasks.put(None)
+        if wait:
+            for slot in self._slots:
+                slot.thread.join()
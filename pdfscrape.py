@@ -1,30 +1,170 @@
-from docling.document_converter import DocumentConverter
+import os
 import sys
+import glob
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def main():
-    # Check if argument is provided
-    if len(sys.argv) != 2:
-        print("❌ Usage: python pdfscrape.py <pdf_path_or_url>")
-        print("   Example: python pdfscrape.py https://arxiv.org/pdf/2408.09869")
-        print("   Example: python pdfscrape.py ./document.pdf")
-        sys.exit(1)
-    
-    # Get source from command line argument
-    source = sys.argv[1]
-    
-    print(f"📄 Converting: {source}")
-    
+from db_utils import DATA_DIR
+from storage import BACKENDS, FSYNC_POLICIES, open_store
+from markdown_parser import iter_markdown_sections
+from pdf_conversion import (
+    SHARD_MIN_PAGES, SHARD_PAGES, WORKER_MAX_DOCUMENTS, WORKER_RSS_LIMIT_MB,
+    warm_worker, convert_pdf_to_markdown, download_pdf
+)
+from pdf_workers import SupervisedProcessPool
+
+
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def expand_sources(sources, url_list=None):
+    """Expand directories, glob patterns and URL list files into individual PDF sources"""
+    expanded = []
+    for source in sources:
+        if is_url(source):
+            expanded.append(source)
+        elif os.path.isdir(source):
+            expanded.extend(sorted(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True)))
+        elif os.path.isfile(source):
+            expanded.append(source)
+        else:
+            matches = sorted(glob.glob(source, recursive=True))
+            if not matches:
+                print(f"⚠️ No PDFs matched: {source}")
+            expanded.extend(matches)
+
+    if url_list:
+        with open(url_list, "r", encoding="utf-8") as f:
+            expanded.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    # Local files are stored under their absolute path so reruns from other folders dedup correctly
+    expanded = [s if is_url(s) else os.path.abspath(s) for s in expanded]
+    return list(dict.fromkeys(expanded))
+
+
+def _convert_source(source, tmpdir, pool, use_cache, shard_pages):
+    """Download (if needed) and convert one PDF, running Docling on the shared process pool"""
+    start = time.perf_counter()
+    path = download_pdf(source, tmpdir) if is_url(source) else source
     try:
-        # Create converter and convert
-        converter = DocumentConverter()
-        result = converter.convert(source)
-        
-        # Output the markdown
-        print(result.document.export_to_markdown())
-        
-    except Exception as e:
-        print(f"❌ Error converting PDF: {str(e)}")
+        markdown = convert_pdf_to_markdown(path, use_cache=use_cache, pool=pool, shard_pages=shard_pages)
+    finally:
+        if path != source:
+            os.unlink(path)
+    return markdown, time.perf_counter() - start
+
+
+def run_batch(sources, output_path, workers, use_cache=True, shard_pages=SHARD_PAGES,
+              rss_limit_mb=WORKER_RSS_LIMIT_MB, max_docs_per_worker=WORKER_MAX_DOCUMENTS, fsync="close"):
+    """Convert PDFs in parallel and append their sections to a JSONL or SQLite database"""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = open_store(output_path).writer(fsync=fsync)
+
+    to_convert = [s for s in sources if s not in writer.links]
+    skipped = len(sources) - len(to_convert)
+    print(f"📚 {len(sources)} PDFs found, {skipped} already in {output_path}, {len(to_convert)} to convert")
+    print(f"⚙️ Using {workers} worker(s), conversion cache {'on' if use_cache else 'off'}, "
+          f"{f'{shard_pages}-page shards above {SHARD_MIN_PAGES} pages' if shard_pages else 'sharding off'}")
+
+    failures = []
+    converted = 0
+    sections_written = 0
+    convert_seconds = 0.0
+    start = time.perf_counter()
+
+    # Driver threads download and split documents; Docling runs on the process pool, so shards of
+    # one large PDF and whole small PDFs share the same warm workers.
+    with writer, \
+            tempfile.TemporaryDirectory() as tmpdir, \
+            SupervisedProcessPool(workers, initializer=warm_worker, rss_limit_mb=rss_limit_mb,
+                                  max_tasks_per_worker=max_docs_per_worker) as pool, \
+            ThreadPoolExecutor(max_workers=workers * 2) as drivers:
+        futures = {
+            drivers.submit(_convert_source, source, tmpdir, pool, use_cache, shard_pages): source
+            for source in to_convert
+        }
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                markdown, seconds = future.result()
+            except Exception as e:
+                print(f"❌ {source}: {str(e)}")
+                failures.append((source, str(e)))
+                continue
+
+            written = writer.append(iter_markdown_sections(markdown, source))
+            converted += 1
+            sections_written += written
+            convert_seconds += seconds
+            print(f"✅ [{converted + len(failures)}/{len(to_convert)}] {source}: {written} new sections ({seconds:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{'=' * 50}")
+    print("📊 Batch summary")
+    print(f"   Converted: {converted}   Skipped: {skipped}   Failed: {len(failures)}")
+    print(f"   Sections written: {sections_written} → {output_path}")
+    print(f"   Wall time: {elapsed:.1f}s   Conversion time: {convert_seconds:.1f}s   Worker restarts: {pool.restarts}")
+    if converted and elapsed > 0:
+        print(f"   Throughput: {converted / elapsed * 60:.1f} PDFs/min")
+    for source, error in failures:
+        print(f"   ❌ {source}: {error}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert PDFs to markdown, or with --db convert many PDFs into a database.",
+        epilog="Examples:\n"
+               "  python pdfscrape.py https://arxiv.org/pdf/2408.09869\n"
+               "  python pdfscrape.py ./document.pdf\n"
+               "  python pdfscrape.py ./handbooks 'scans/**/*.pdf' --url-list urls.txt --db handbooks --workers 4",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", help="PDF paths, URLs, directories or glob patterns")
+    parser.add_argument("--url-list", help="text file with one PDF URL per line")
+    parser.add_argument("--db", help=f"database name (no extension); sections are appended to {DATA_DIR}/<name>.jsonl or .sqlite")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="JSONL",
+                        help="storage backend of a new database (default: %(default)s)")
+    parser.add_argument("--fsync", choices=list(FSYNC_POLICIES), default="close",
+                        help="sync written batches to disk after each batch, once at the end, or never (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+                        help="parallel conversion processes (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the conversion cache")
+    parser.add_argument("--shard-pages", type=int, default=SHARD_PAGES,
+                        help=f"split PDFs longer than {SHARD_MIN_PAGES} pages into shards of this many pages "
+                             "converted in parallel; 0 disables (default: %(default)s)")
+    parser.add_argument("--max-rss-mb", type=int, default=WORKER_RSS_LIMIT_MB,
+                        help="restart a worker that grows past this resident memory; 0 disables (default: %(default)s)")
+    parser.add_argument("--max-docs-per-worker", type=int, default=WORKER_MAX_DOCUMENTS,
+                        help="replace each worker after this many documents or shards; 0 disables (default: %(default)s)")
+    args = parser.parse_args()
+
+    sources = expand_sources(args.sources, args.url_list)
+    if not sources:
+        parser.print_usage()
+        print("❌ No PDF sources given")
         sys.exit(1)
 
+    # Single-source mode: print markdown to stdout as before
+    if not args.db:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for source in sources:
+                print(f"📄 Converting: {source}")
+                try:
+                    markdown, _ = _convert_source(source, tmpdir, None, not args.no_cache, args.shard_pages)
+                    print(markdown)
+                except Exception as e:
+                    print(f"❌ Error converting PDF: {str(e)}")
+                    sys.exit(1)
+        return
+
+    output_path = os.path.join(DATA_DIR, args.db + BACKENDS[args.backend])
+    failures = run_batch(sources, output_path, args.workers, use_cache=not args.no_cache,
+                         shard_pages=args.shard_pages, rss_limit_mb=args.max_rss_mb,
+                         max_docs_per_worker=args.max_docs_per_worker, fsync=args.fsync)
+    sys.exit(1 if failures else 0)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
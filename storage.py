@@ -0,0 +1,975 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import pathlib
+import argparse
+import tempfile
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from db_utils import DATA_DIR, normalize_url, section_hash, append_new_sections, database_lock
+from db_hashlog import open_dedup_log, LOG_SUFFIX, INDEX_SUFFIX as HASHIDX_SUFFIX
+from db_index import INDEX_SUFFIX, LINES_SUFFIX, lookup_spans, read_lines, indexed_links, update_index, line_index
+from db_frames import FRAMES_SUFFIX, ends_open, open_read, open_append, open_write, replace_file
+from db_records import decode, dumps, encode, project
+from db_catalog import fingerprint, forget, record_append
+from db_history import HISTORY_SUFFIX
+from db_search import index_appended
+from db_blobs import open_blobs, resolve
+
+JSONL_SUFFIX = ".jsonl"
+JSONL_GZ_SUFFIX = ".jsonl.gz"
+JSONL_ZST_SUFFIX = ".jsonl.zst"
+SQLITE_SUFFIX = ".sqlite"
+SHARDS_SUFFIX = ".shards"
+JSONL_SUFFIXES = (JSONL_SUFFIX, JSONL_GZ_SUFFIX, JSONL_ZST_SUFFIX)
+BACKENDS = {"JSONL": JSONL_SUFFIX, "JSONL.gz": JSONL_GZ_SUFFIX, "JSONL.zst": JSONL_ZST_SUFFIX, "SQLite": SQLITE_SUFFIX,
+            "Sharded JSONL": SHARDS_SUFFIX}
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+BATCH_SECTIONS = 500     # queued sections that trigger a batch write
+BATCH_SECONDS = 5.0      # ...or time since the last one
+FSYNC_POLICIES = ("batch", "close", "never")
+
+
+class JsonlStore:
+    """A database stored as one JSON object per line, with offset index and dedup log sidecars.
+
+    `.jsonl.gz` and `.jsonl.zst` files hold the same lines in independently compressed frames
+    (see db_frames), so indexes and random access work on their uncompressed offsets.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.suffix = next(s for s in JSONL_SUFFIXES[::-1] if path.endswith(s))
+        self.name = self.filename[:-len(self.suffix)]
+        self.backend = {v: k for k, v in BACKENDS.items()}[self.suffix]
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def has_url(self, url: str) -> bool:
+        return bool(lookup_spans(self.path, url))
+
+    def sections_for_url(self, url: str, start: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Return sections whose origin_link normalizes to the same URL, in file order.
+
+        `start` and `limit` select a page of the matching lines; only that page is read and decoded.
+        """
+        spans = lookup_spans(self.path, url)
+        spans = spans[start:start + limit] if limit is not None else spans[start:]
+        entries = resolve((decode(line) for line in read_lines(self.path, spans)), self.path)
+        return [entry for entry in entries if entry is not None]
+
+    def count_url(self, url: str) -> int:
+        return len(lookup_spans(self.path, url))
+
+    def urls(self) -> List[str]:
+        return indexed_links(self.path)
+
+    def iter_lines(self, locked: bool = False) -> Iterator[str]:
+        """Yield raw lines without their newline, exactly as stored.
+
+        A final line without a newline is only yielded if it is a complete record, so a batch that
+        another process is writing at this moment is not read half-way. Callers holding the database
+        lock pass `locked`: no batch can be mid-write then, so the last line is yielded as stored.
+        """
+        with open_read(self.path) as f:
+            for line in f:
+                if not locked and not line.endswith(b"\n") and decode(line) is None:
+                    break
+                yield line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def iter_sections(self) -> Iterator[Dict]:
+        """Yield every valid record, with section bodies from the blob store filled in (see db_blobs)."""
+        for entry in resolve((decode(line) for line in self.iter_lines()), self.path):
+            if entry is not None:
+                yield entry
+
+    def count(self) -> int:
+        with open_read(self.path) as f:
+            return sum(1 for line in f if line.strip())
+
+    def line_count(self) -> int:
+        """Number of stored lines, from the line offset index (no scan once the index exists)."""
+        return len(line_index(self.path))
+
+    def read_page(self, start: int, count: int) -> List[str]:
+        """Return up to `count` raw lines from line `start` (0-based) through the memory-mapped line index."""
+        return line_index(self.path).lines(start, count)
+
+    def writer(self, **options) -> "JsonlWriter":
+        """Open a batched writer; see JsonlWriter for `batch_sections`, `batch_seconds` and `fsync`."""
+        return JsonlWriter(self, **options)
+
+    def replace_url(self, url: str, sections: List[Dict]) -> None:
+        """Replace all sections of a URL by rewriting the file through a temp file and rename."""
+        target = normalize_url(url)
+        blobs = open_blobs(self.path)
+        if blobs:
+            sections = blobs.references(sections)
+            blobs.close()
+        with database_lock(self.path):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp" + self.suffix)
+            os.close(fd)
+            with open_write(tmp_path) as out:
+                for line in self.iter_lines(locked=True) if self.exists() else []:
+                    entry = project(line, ("origin_link",))
+                    if entry is not None and normalize_url(entry.get("origin_link", "")) == target:
+                        continue
+                    out.write(line + "\n")
+                for section in sections:
+                    out.write(encode(section))
+            replace_file(tmp_path, self.path)
+            update_index(self.path)
+
+    def delete(self) -> None:
+        """Remove the database, its sidecars and version history, waiting for a batch being written to finish."""
+        with database_lock(self.path):
+            for suffix in ("", INDEX_SUFFIX, LINES_SUFFIX, LOG_SUFFIX, HASHIDX_SUFFIX, FRAMES_SUFFIX, HISTORY_SUFFIX):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            forget(self.path)
+
+
+class _QueuedKeys:
+    """`in` view over keys that are stored or queued in a writer; `add` queues a key."""
+
+    def __init__(self, stored, queued: set):
+        self.stored = stored
+        self.queued = queued
+
+    def __contains__(self, value) -> bool:
+        return value in self.queued or value in self.stored
+
+    def add(self, value) -> None:
+        self.queued.add(value)
+
+
+class JsonlWriter:
+    """Appends new sections to a JSONL database, deduplicating through its persisted hash log.
+
+    Every append() call is one group, normally the sections of one URL. Groups are queued and
+    written in batches under the database lock: the batch is checked again against keys other
+    writers committed meanwhile, appended in a single write (one frame for compressed files) and
+    committed to the hash log before the lock is released. Readers only take complete lines, so
+    a group shows up whole or not at all.
+
+    Args:
+        batch_sections (int): Queued sections that trigger a write.
+        batch_seconds (float): Seconds since the last write that trigger one on the next append.
+        fsync (str): "batch" syncs every write to disk, "close" once when the writer closes,
+            "never" leaves it to the OS.
+        on_flush: Called as on_flush(sections, new_links) after each batch write instead of
+            updating the catalog (ShardedWriter keeps the catalog entry of the whole database).
+    """
+
+    def __init__(self, store: JsonlStore, batch_sections: int = BATCH_SECTIONS,
+                 batch_seconds: float = BATCH_SECONDS, fsync: str = "close",
+                 on_flush: Optional[Callable[[List[Dict], List[str]], None]] = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.store = store
+        self.batch_sections = batch_sections
+        self.batch_seconds = batch_seconds
+        self.fsync = fsync
+        self.on_flush = on_flush
+        with database_lock(store.path):
+            self.dedup = open_dedup_log(store.path)
+        self.blobs = open_blobs(store.path)
+        self._queued_hashes, self._queued_links = set(), set()
+        self.hashes = _QueuedKeys(self.dedup.hashes, self._queued_hashes)
+        self.links = _QueuedKeys(self.dedup.links, self._queued_links)
+        self._queue = []
+        self._last_write = time.monotonic()
+        self._unsynced = False
+
+    def append(self, sections: Iterable[Dict]) -> int:
+        """Queue sections that are neither stored nor queued yet; returns the number queued."""
+        queued = 0
+        for section in sections:
+            h = section_hash(section)
+            if h in self.hashes:
+                continue
+            self.hashes.add(h)
+            self.links.add(section["origin_link"])
+            self._queue.append((h, section))
+            queued += 1
+        if len(self._queue) >= self.batch_sections or time.monotonic() - self._last_write >= self.batch_seconds:
+            self.flush()
+        return queued
+
+    def flush(self) -> int:
+        """Write the queued sections now; returns how many were written (others may have beaten us to some)."""
+        self._last_write = time.monotonic()
+        if not self._queue:
+            return 0
+        with database_lock(self.store.path):
+            recheck = self.dedup.refresh()  # another writer may have stored some of them since they were queued
+            sections, new_links = [], []
+            for h, section in self._queue:
+                if recheck and h in self.dedup.hashes:
+                    continue
+                self.dedup.hashes.add(h)
+                if section["origin_link"] not in self.dedup.links:
+                    new_links.append(section["origin_link"])
+                    self.dedup.links.add(section["origin_link"])
+                sections.append(section)
+            written = len(sections)
+            if written:
+                # Bodies are committed to the blob store before the lines referring to them
+                batch = [encode(record) for record in (self.blobs.references(sections) if self.blobs else sections)]
+                before = fingerprint(self.store.path)
+                lead = "\n" if ends_open(self.store.path) else ""  # never glue the batch onto an unterminated record
+                with open_append(self.store.path) as f:
+                    f.write(lead + "".join(batch))
+                    if self.fsync == "batch":
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.dedup.commit()
+                if self.on_flush:
+                    self.on_flush(sections, new_links)
+                else:
+                    record_append(self.store.path, before, sections, new_links)
+                    index_appended(self.store.path)
+                self._unsynced = self.fsync == "close"
+        self._queue = []
+        self._queued_hashes.clear()
+        self._queued_links.clear()
+        return written
+
+    def close(self) -> None:
+        self.flush()
+        if self._unsynced and os.path.exists(self.store.path):
+            with open(self.store.path, "rb") as f:
+                os.fsync(f.fileno())
+        with database_lock(self.store.path):
+            self.dedup.close()
+            update_index(self.store.path)
+        if self.blobs:
+            self.blobs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    line TEXT NOT NULL,          -- the JSONL line exactly as imported or written
+    origin_link TEXT,
+    norm_url TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sections_norm_url ON sections(norm_url);
+CREATE INDEX IF NOT EXISTS idx_sections_origin_link ON sections(origin_link);
+CREATE INDEX IF NOT EXISTS idx_sections_content_hash ON sections(content_hash);
+"""
+
+
+def _row_values(line: str, entry: Optional[Dict] = None):
+    """Return (line, origin_link, norm_url, content_hash) for storing a JSONL line in SQLite.
+
+    `entry` is the whole section when `line` is its reference line (see db_blobs).
+    """
+    entry = decode(line) if entry is None else entry
+    if entry is None:
+        return line, None, None, None
+    link = entry.get("origin_link")
+    try:
+        content_hash = section_hash(entry)
+    except (KeyError, TypeError):
+        content_hash = None
+    return line, link, normalize_url(link) if link else None, content_hash
+
+
+class SqliteStore:
+    """A database stored in SQLite (WAL mode), indexed by normalized URL and content hash.
+
+    Every row keeps the original JSONL line, so import and export round-trip losslessly.
+    """
+
+    backend = "SQLite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.name = self.filename[:-len(SQLITE_SUFFIX)]
+
+    def connect(self, write: bool = False) -> sqlite3.Connection:
+        """Open a connection; writers also ensure the schema and WAL mode (WAL persists in the file).
+
+        Readers open the file read-only, so looking into a database that does not exist never creates
+        it; a missing file (or one no writer has set up yet) reads as an empty database.
+        """
+        if write:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SQLITE_SCHEMA)
+            return conn
+        if os.path.exists(self.path):
+            conn = sqlite3.connect(pathlib.Path(self.path).absolute().as_uri() + "?mode=ro", uri=True,
+                                   timeout=30, check_same_thread=False)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sections'").fetchone():
+                return conn
+            conn.close()
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.executescript(SQLITE_SCHEMA)
+        return conn
+
+    def _query(self, sql: str, params=()) -> List:
+        conn = self.connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def has_url(self, url: str) -> bool:
+        return bool(self._query("SELECT 1 FROM sections WHERE norm_url = ? LIMIT 1", (normalize_url(url),)))
+
+    def sections_for_url(self, url: str, start: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        rows = self._query("SELECT line FROM sections WHERE norm_url = ? ORDER BY id LIMIT ? OFFSET ?",
+                           (normalize_url(url), -1 if limit is None else limit, start))
+        entries = resolve((decode(line) for line, in rows), self.path)
+        return [entry for entry in entries if entry is not None]
+
+    def count_url(self, url: str) -> int:
+        return self._query("SELECT COUNT(*) FROM sections WHERE norm_url = ?", (normalize_url(url),))[0][0]
+
+    def urls(self) -> List[str]:
+        return [link for link, in self._query("SELECT DISTINCT origin_link FROM sections WHERE origin_link IS NOT NULL")]
+
+    def iter_lines(self) -> Iterator[str]:
+        conn = self.connect()
+        try:
+            for line, in conn.execute("SELECT line FROM sections ORDER BY id"):
+                yield line
+        finally:
+            conn.close()
+
+    def iter_sections(self) -> Iterator[Dict]:
+        """Yield every valid record, with section bodies from the blob store filled in (see db_blobs)."""
+        for entry in resolve((decode(line) for line in self.iter_lines()), self.path):
+            if entry is not None:
+                yield entry
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM sections")[0][0]
+
+    def line_count(self) -> int:
+        return self.count()
+
+    def read_page(self, start: int, count: int) -> List[str]:
+        """Return up to `count` stored lines from row `start` (0-based) in insertion order."""
+        return [line for line, in self._query("SELECT line FROM sections ORDER BY id LIMIT ? OFFSET ?", (count, start))]
+
+    def writer(self, **options) -> "SqliteWriter":
+        return SqliteWriter(self, **options)
+
+    def replace_url(self, url: str, sections: List[Dict]) -> None:
+        """Replace all sections of a URL in one transaction."""
+        blobs = open_blobs(self.path)
+        records = blobs.references(sections) if blobs else sections
+        if blobs:
+            blobs.close()
+        conn = self.connect(write=True)
+        try:
+            with conn:
+                conn.execute("DELETE FROM sections WHERE norm_url = ?", (normalize_url(url),))
+                conn.executemany(
+                    "INSERT INTO sections (line, origin_link, norm_url, content_hash) VALUES (?, ?, ?, ?)",
+                    [_row_values(dumps(record), section) for record, section in zip(records, sections)]
+                )
+        finally:
+            conn.close()
+
+    def import_lines(self, lines: Iterable[str], batch_size: int = 5000) -> int:
+        """Append raw JSONL lines without deduplication, as used by import."""
+        conn = self.connect(write=True)
+        count = 0
+        try:
+            batch = []
+            raw, parsed = itertools.tee(lines)
+            with conn:
+                for line, entry in zip(raw, resolve((decode(line) for line in parsed), self.path)):
+                    batch.append(_row_values(line, entry))
+                    if len(batch) >= batch_size:
+                        conn.executemany("INSERT INTO sections (line, origin_link, norm_url, content_hash) VALUES (?, ?, ?, ?)", batch)
+                        count += len(batch)
+                        batch = []
+                conn.executemany("INSERT INTO sections (line, origin_link, norm_url, content_hash) VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+        finally:
+            conn.close()
+        return count
+
+    def delete(self) -> None:
+        with database_lock(self.path):
+            for suffix in ("", "-wal", "-shm", HISTORY_SUFFIX):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            forget(self.path)
+
+
+class _SqliteKeys:
+    """`in` check against an indexed column; `add` is a no-op because rows are the source of truth."""
+
+    def __init__(self, conn: sqlite3.Connection, column: str, make_key):
+        self.conn = conn
+        self.sql = f"SELECT 1 FROM sections WHERE {column} = ? LIMIT 1"
+        self.make_key = make_key
+
+    def __contains__(self, value) -> bool:
+        return self.conn.execute(self.sql, (self.make_key(value),)).fetchone() is not None
+
+    def add(self, value) -> None:
+        pass
+
+
+class SqliteWriter:
+    """Inserts new sections into a SQLite database, one transaction per append call.
+
+    SQLite already makes each transaction atomic and serializes writers; the database lock is
+    still taken per transaction so deletes from the Manage page wait for it. `fsync="batch"`
+    maps to synchronous=FULL; the batching options of JsonlWriter are accepted and not needed.
+    """
+
+    def __init__(self, store: SqliteStore, fsync: str = "close", **batching):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.store = store
+        self.conn = store.connect(write=True)
+        if fsync == "batch":
+            self.conn.execute("PRAGMA synchronous=FULL")
+        self.hashes = _SqliteKeys(self.conn, "content_hash", lambda h: h)
+        self.links = _SqliteKeys(self.conn, "origin_link", lambda url: url)
+        self.blobs = open_blobs(store.path)
+
+    def append(self, sections: Iterable[Dict]) -> int:
+        stored, seen, new_links = [], set(), set()
+        with database_lock(self.store.path):
+            before = fingerprint(self.store.path, self.conn)
+            for section in sections:
+                h = section_hash(section)
+                if h in seen or h in self.hashes:
+                    continue
+                seen.add(h)
+                if section["origin_link"] not in new_links and section["origin_link"] not in self.links:
+                    new_links.add(section["origin_link"])
+                stored.append(section)
+            records = self.blobs.references(stored) if self.blobs and stored else stored
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO sections (line, origin_link, norm_url, content_hash) VALUES (?, ?, ?, ?)",
+                    [_row_values(dumps(record), section) for record, section in zip(records, stored)]
+                )
+            if stored:
+                record_append(self.store.path, before, stored, new_links, self.conn)
+                index_appended(self.store.path)
+        return len(stored)
+
+    def close(self) -> None:
+        self.conn.close()
+        if self.blobs:
+            self.blobs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def shard_host(url: Optional[str]) -> str:
+    """Shard directory of an origin link: its lowercased host, or "unknown"."""
+    try:
+        return urlparse(url).netloc.lower() or "unknown"
+    except (ValueError, AttributeError, TypeError):
+        return "unknown"
+
+
+def _is_month(text: str) -> bool:
+    return len(text) == 7 and text[4] == "-" and text[:4].isdigit() and text[5:].isdigit()
+
+
+class ShardedStore:
+    """A database stored as a directory of JSONL shards, one per host and ingest month.
+
+    `<name>.shards/<host>/<YYYY-MM>.jsonl` holds the sections of one host written in one month,
+    each shard with its own index and dedup sidecars; `manifest.json` lists the shards so readers
+    can pick those of some hosts or months without listing the tree. All store methods work on
+    the shards together; `shard_paths` gives the pruned list for scans.
+    """
+
+    backend = "Sharded"
+
+    def __init__(self, path: str):
+        self.path = path.rstrip(os.sep)
+        self.filename = os.path.basename(self.path)
+        self.name = self.filename[:-len(SHARDS_SUFFIX)]
+        self.manifest_path = os.path.join(self.path, MANIFEST_FILE)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def create(self, suffix: str = JSONL_SUFFIX) -> None:
+        """Create an empty sharded database whose shards use `suffix` (plain or compressed JSONL)."""
+        if suffix not in JSONL_SUFFIXES:
+            raise ValueError(f"shard suffix must be one of {', '.join(JSONL_SUFFIXES)}")
+        os.makedirs(self.path, exist_ok=True)
+        self._save_manifest({"version": MANIFEST_VERSION, "suffix": suffix, "shards": {}})
+
+    def manifest(self) -> Dict:
+        """Return the manifest, rebuilding it from the directory tree if it is missing or unreadable."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        shards, suffix = {}, JSONL_SUFFIX
+        for host in sorted(os.listdir(self.path)) if self.exists() else []:
+            if not os.path.isdir(os.path.join(self.path, host)):
+                continue
+            for filename in sorted(os.listdir(os.path.join(self.path, host))):
+                shard_suffix = next((s for s in JSONL_SUFFIXES[::-1] if filename.endswith(s)), None)
+                if shard_suffix and _is_month(filename[:-len(shard_suffix)]):  # not temp files of a rewrite
+                    shards[f"{host}/{filename}"] = {"host": host, "month": filename[:-len(shard_suffix)]}
+                    suffix = shard_suffix
+        manifest = {"version": MANIFEST_VERSION, "suffix": suffix, "shards": shards}
+        if self.exists():
+            self._save_manifest(manifest)
+        return manifest
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def shard_path(self, host: str, month: str) -> str:
+        return os.path.join(self.path, host, month + self.manifest()["suffix"])
+
+    def add_shard(self, host: str, month: str) -> str:
+        """Record a shard in the manifest (under the database lock) and return its path."""
+        manifest = self.manifest()
+        key = f"{host}/{month}{manifest['suffix']}"
+        if key not in manifest["shards"]:
+            manifest["shards"][key] = {"host": host, "month": month}
+            self._save_manifest(manifest)
+        return os.path.join(self.path, host, month + manifest["suffix"])
+
+    def shard_paths(self, hosts: Optional[Iterable[str]] = None, since: Optional[str] = None,
+                    until: Optional[str] = None) -> List[str]:
+        """Return the existing shards of some hosts and ingest months, by host and then month.
+
+        Args:
+            hosts: Host names (netlocs, case-insensitive); every host by default.
+            since: First ingest month ("YYYY-MM", or a date whose month counts).
+            until: Last ingest month, inclusive.
+        """
+        wanted = {host.lower() for host in hosts} if hosts is not None else None
+        low, high = (str(since)[:7] if since else None), (str(until)[:7] if until else None)
+        paths = []
+        for key, shard in sorted(self.manifest()["shards"].items()):
+            if wanted is not None and shard["host"] not in wanted:
+                continue
+            if (low and shard["month"] < low) or (high and shard["month"] > high):
+                continue
+            path = os.path.join(self.path, *key.split("/"))
+            if os.path.exists(path):  # listed before its first batch was written
+                paths.append(path)
+        return paths
+
+    def _stores(self, **predicates) -> List[JsonlStore]:
+        return [JsonlStore(path) for path in self.shard_paths(**predicates)]
+
+    def has_url(self, url: str) -> bool:
+        return any(store.has_url(url) for store in self._stores(hosts=[shard_host(url)]))
+
+    def sections_for_url(self, url: str, start: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Return a URL's sections from its host's shards, oldest month first; `start`/`limit` page them."""
+        sections = []
+        for store in self._stores(hosts=[shard_host(url)]):
+            count = store.count_url(url)
+            if start >= count:
+                start -= count
+                continue
+            sections.extend(store.sections_for_url(url, start, None if limit is None else limit - len(sections)))
+            start = 0
+            if limit is not None and len(sections) >= limit:
+                break
+        return sections
+
+    def count_url(self, url: str) -> int:
+        return sum(store.count_url(url) for store in self._stores(hosts=[shard_host(url)]))
+
+    def urls(self) -> List[str]:
+        return list(dict.fromkeys(link for store in self._stores() for link in store.urls()))
+
+    def iter_lines(self) -> Iterator[str]:
+        for store in self._stores():
+            yield from store.iter_lines()
+
+    def iter_sections(self) -> Iterator[Dict]:
+        for store in self._stores():
+            yield from store.iter_sections()
+
+    def count(self) -> int:
+        return sum(store.count() for store in self._stores())
+
+    def line_count(self) -> int:
+        return sum(store.line_count() for store in self._stores())
+
+    def read_page(self, start: int, count: int) -> List[str]:
+        """Return up to `count` lines from line `start` of the shards taken in order."""
+        lines = []
+        for store in self._stores():
+            stored = store.line_count()
+            if start >= stored:
+                start -= stored
+                continue
+            lines.extend(store.read_page(start, count - len(lines)))
+            start = 0
+            if len(lines) >= count:
+                break
+        return lines
+
+    def writer(self, **options) -> "ShardedWriter":
+        return ShardedWriter(self, **options)
+
+    def replace_url(self, url: str, sections: List[Dict]) -> None:
+        """Remove a URL from its host's shards and write its new sections to the current month's shard."""
+        host = shard_host(url)
+        with database_lock(self.path):
+            if not self.exists():
+                self.create()
+            for store in self._stores(hosts=[host]):
+                if store.has_url(url):
+                    store.replace_url(url, [])
+            if sections:
+                JsonlStore(self.add_shard(host, time.strftime("%Y-%m"))).replace_url(url, sections)
+
+    def delete(self) -> None:
+        """Remove the shard directory and the version history, waiting for a batch being written to finish."""
+        with database_lock(self.path):
+            if self.exists():
+                shutil.rmtree(self.path)
+            if os.path.exists(self.path + HISTORY_SUFFIX):
+                os.remove(self.path + HISTORY_SUFFIX)
+            forget(self.path)
+
+
+class _HostKeys:
+    """`in` view over origin links stored or queued in any shard of the link's host."""
+
+    def __init__(self, writer: "ShardedWriter"):
+        self.writer = writer
+
+    def __contains__(self, url) -> bool:
+        host = shard_host(url)
+        return url in self.writer._writer(host).links or any(url in log.links for log in self.writer._older[host])
+
+    def add(self, url) -> None:
+        self.writer._writer(shard_host(url)).links.add(url)
+
+
+class ShardedWriter:
+    """Appends new sections to a sharded database, routing each to its host's shard for the month.
+
+    Every host gets a JsonlWriter on `<host>/<month>`; sections already stored in an older month
+    of the host are skipped through those shards' hash logs. Batches are written under the lock of
+    the whole database, so its manifest and catalog entry move together with the shards. Takes
+    the JsonlWriter options; `month` (YYYY-MM) defaults to the current one.
+    """
+
+    def __init__(self, store: ShardedStore, batch_sections: int = BATCH_SECTIONS,
+                 batch_seconds: float = BATCH_SECONDS, fsync: str = "close", month: Optional[str] = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.store = store
+        self.batch_sections = batch_sections
+        self.batch_seconds = batch_seconds
+        self.fsync = fsync
+        self.month = month or time.strftime("%Y-%m")
+        with database_lock(store.path):
+            if not store.exists():
+                store.create()
+        self._writers = {}    # host -> JsonlWriter of its shard for this month
+        self._older = {}      # host -> dedup logs of its shards from other months
+        self._queued = 0
+        self._flushed = ([], [])
+        self._last_write = time.monotonic()
+        self.links = _HostKeys(self)
+
+    def _writer(self, host: str) -> JsonlWriter:
+        if host not in self._writers:
+            path = self.store.shard_path(host, self.month)
+            self._older[host] = []
+            for older in self.store.shard_paths(hosts=[host]):
+                if older != path:
+                    with database_lock(older):
+                        self._older[host].append(open_dedup_log(older))
+            # Batching is decided here for all hosts together
+            self._writers[host] = JsonlWriter(JsonlStore(path), batch_sections=sys.maxsize,
+                                              batch_seconds=float("inf"), fsync=self.fsync, on_flush=self._collect)
+        return self._writers[host]
+
+    def _collect(self, sections: List[Dict], new_links: List[str]) -> None:
+        self._flushed[0].extend(sections)
+        self._flushed[1].extend(link for link in new_links
+                                if not any(link in log.links for log in self._older[shard_host(link)]))
+
+    def append(self, sections: Iterable[Dict]) -> int:
+        """Queue sections that are neither stored in any shard of their host nor queued; returns the number queued."""
+        groups = {}
+        for section in sections:
+            groups.setdefault(shard_host(section["origin_link"]), []).append(section)
+        queued = 0
+        for host, group in groups.items():
+            writer = self._writer(host)
+            older = self._older[host]
+            queued += writer.append([section for section in group
+                                     if not any(section_hash(section) in log.hashes for log in older)])
+        self._queued += queued
+        if self._queued >= self.batch_sections or time.monotonic() - self._last_write >= self.batch_seconds:
+            self.flush()
+        return queued
+
+    def flush(self) -> int:
+        """Write every host's queued sections now; returns how many were written."""
+        self._last_write = time.monotonic()
+        if not self._queued:
+            return 0
+        written = 0
+        with database_lock(self.store.path):
+            before = fingerprint(self.store.path)
+            self._flushed = ([], [])
+            for host, writer in self._writers.items():
+                count = writer.flush()
+                if count:
+                    self.store.add_shard(host, self.month)
+                    written += count
+            if written:
+                record_append(self.store.path, before, *self._flushed)
+                index_appended(self.store.path)
+        self._queued = 0
+        return written
+
+    def close(self) -> None:
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        for logs in self._older.values():
+            for log in logs:
+                log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+STORE_TYPES = {JSONL_SUFFIX: JsonlStore, JSONL_GZ_SUFFIX: JsonlStore, JSONL_ZST_SUFFIX: JsonlStore,
+               SQLITE_SUFFIX: SqliteStore, SHARDS_SUFFIX: ShardedStore}
+
+
+def open_store(path: str):
+    """Return the store for a database file (or shard directory), chosen by its extension."""
+    for suffix, store_type in STORE_TYPES.items():
+        if path.endswith(suffix):
+            return store_type(path)
+    raise ValueError(f"Unsupported database file: {path}")
+
+
+def is_database_file(filename: str) -> bool:
+    return any(filename.endswith(suffix) for suffix in STORE_TYPES)
+
+
+def list_stores(data_dir: str = DATA_DIR) -> List:
+    """Return a store for every database file in a directory, in name order."""
+    if not os.path.exists(data_dir):
+        return []
+    return [open_store(os.path.join(data_dir, f)) for f in sorted(os.listdir(data_dir)) if is_database_file(f)]
+
+
+def open_database(name: str, data_dir: str = DATA_DIR):
+    """Return the store for a database name (file name without extension), preferring plain JSONL."""
+    for suffix, store_type in STORE_TYPES.items():
+        path = os.path.join(data_dir, name + suffix)
+        if os.path.exists(path):
+            return store_type(path)
+    raise FileNotFoundError(f"No database named {name} in {data_dir}")
+
+
+# --- import / export / benchmark -----------------------------------------------------------
+
+def import_jsonl(jsonl_path: str, sqlite_path: str) -> int:
+    """Copy a JSONL database into a new SQLite database line for line."""
+    if os.path.exists(sqlite_path):
+        raise FileExistsError(f"{sqlite_path} already exists")
+    return SqliteStore(sqlite_path).import_lines(JsonlStore(jsonl_path).iter_lines())
+
+
+def export_jsonl(sqlite_path: str, jsonl_path: str) -> int:
+    """Write a SQLite database back out as JSONL, one stored line per row, through temp file and rename."""
+    count = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(jsonl_path) or ".", suffix=".tmp" + JsonlStore(jsonl_path).suffix)
+    os.close(fd)
+    with open_write(tmp_path) as out:
+        for line in SqliteStore(sqlite_path).iter_lines():
+            out.write(line + "\n")
+            count += 1
+    replace_file(tmp_path, jsonl_path)
+    return count
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(jsonl_path: str, lookups: int = 50, inserts: int = 1000) -> None:
+    """Compare URL lookup, insert and full-scan speed of the JSONL and SQLite backends on a copy of a database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jsonl_copy = os.path.join(tmpdir, "bench" + JsonlStore(jsonl_path).suffix)
+        with open(jsonl_path, "rb") as src, open(jsonl_copy, "wb") as dst:
+            dst.write(src.read())
+        sqlite_copy = os.path.join(tmpdir, "bench.sqlite")
+        import_ms = _timed(lambda: import_jsonl(jsonl_copy, sqlite_copy))
+        stores = [JsonlStore(jsonl_copy), SqliteStore(sqlite_copy)]
+        for store in stores:
+            store.urls()  # build indexes outside the timings
+
+        urls = stores[0].urls()
+        sample = random.sample(urls, min(lookups, len(urls)))
+        new_sections = [{"section": i, "heading": "bench", "content": f"benchmark content {i} " * 20,
+                         "origin_link": f"https://bench.example/{i // 10}", "external_links": [],
+                         "last_updated": "Date not found"} for i in range(inserts)]
+
+        print(f"📦 {jsonl_path}: {len(urls)} URLs, imported into SQLite in {import_ms:.0f} ms")
+        print(f"{'operation':<34}{'JSONL (ms)':>12}{'SQLite (ms)':>13}")
+        rows = {
+            f"lookup {len(sample)} URLs": [_timed(lambda: [s.sections_for_url(u) for u in sample]) for s in stores],
+            f"insert {inserts} sections": [],
+            "full scan": [_timed(lambda: sum(1 for _ in s.iter_sections())) for s in stores],
+        }
+        for store in stores:
+            def insert():
+                with store.writer() as writer:
+                    for i in range(0, len(new_sections), 10):
+                        writer.append(new_sections[i:i + 10])
+            rows[f"insert {inserts} sections"].append(_timed(insert))
+        for label, (jsonl_ms, sqlite_ms) in rows.items():
+            print(f"{label:<34}{jsonl_ms:>12.1f}{sqlite_ms:>13.1f}")
+
+
+def _unbatched_append(path: str, groups: List[List[Dict]], fsync: bool) -> None:
+    """Write each group straight to the file and commit it, as JsonlWriter did before batching."""
+    dedup = open_dedup_log(path)
+    with open_append(path) as f:
+        for group in groups:
+            append_new_sections(f, group, dedup.hashes, dedup.links)
+            dedup.commit_file(f)
+            if fsync:
+                os.fsync(f.fileno())
+    dedup.close()
+
+
+def benchmark_writes(jsonl_path: str, group_size: int = 10) -> None:
+    """Time re-ingesting a database's sections in URL-sized groups, unbatched and with each fsync policy.
+
+    Only the appends are timed; the index refresh on close costs the same either way.
+    """
+    groups, group = [], []
+    for entry in JsonlStore(jsonl_path).iter_sections():
+        if "content" in entry and "origin_link" in entry:
+            group.append(entry)
+            if len(group) == group_size:
+                groups.append(group)
+                group = []
+    groups.append(group)
+    count = sum(len(g) for g in groups)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        def run(label, write):
+            path = os.path.join(tmpdir, label.replace(" ", "_").replace(",", "") + JsonlStore(jsonl_path).suffix)
+            ms = _timed(lambda: write(path))
+            print(f"{label:<34}{ms:>10.0f}{count / max(ms, 1e-6) * 1000:>14.0f}")
+
+        def batched(fsync):
+            def write(path):
+                writer = JsonlStore(path).writer(fsync=fsync)
+                for g in groups:
+                    writer.append(g)
+                writer.flush()
+                if fsync == "close":
+                    with open(path, "rb") as f:
+                        os.fsync(f.fileno())
+            return write
+
+        print(f"📦 {jsonl_path}: {count} sections in groups of {group_size}")
+        print(f"{'writer':<34}{'ms':>10}{'sections/s':>14}")
+        run("unbatched, fsync never", lambda path: _unbatched_append(path, groups, False))
+        run("unbatched, fsync per group", lambda path: _unbatched_append(path, groups, True))
+        for fsync in FSYNC_POLICIES:
+            run(f"batched, fsync {fsync}", batched(fsync))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert databases between JSONL and SQLite, and benchmark the backends.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="copy database/<name>.jsonl into database/<name>.sqlite")
+    imp.add_argument("jsonl")
+    imp.add_argument("--to", help="SQLite path (default: alongside the JSONL file)")
+    exp = sub.add_parser("export", help="write database/<name>.sqlite back out as JSONL")
+    exp.add_argument("sqlite")
+    exp.add_argument("--to", help="JSONL path (default: alongside the SQLite file)")
+    exp.add_argument("--force", action="store_true", help="overwrite an existing JSONL file")
+    bench = sub.add_parser("bench", help="time lookups, inserts and full scans on both backends")
+    bench.add_argument("jsonl")
+    bench_writes = sub.add_parser("bench-writes", help="time batched against unbatched JSONL appends")
+    bench_writes.add_argument("jsonl")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        source = JsonlStore(args.jsonl)
+        target = args.to or args.jsonl[:-len(source.suffix)] + SQLITE_SUFFIX
+        count = import_jsonl(args.jsonl, target)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            roundtrip = os.path.join(tmpdir, "roundtrip.jsonl")
+            export_jsonl(target, roundtrip)
+            identical = list(JsonlStore(args.jsonl).iter_lines()) == list(JsonlStore(roundtrip).iter_lines())
+        print(f"✅ Imported {count} lines into {target} ({'round trip identical' if identical else '❌ round trip differs'})")
+        return 0 if identical else 1
+    if args.command == "export":
+        target = args.to or args.sqlite[:-len(SQLITE_SUFFIX)] + JSONL_SUFFIX
+        if os.path.exists(target) and not args.force:
+            print(f"❌ {target} already exists; use --force or --to")
+            return 1
+        print(f"✅ Exported {export_jsonl(args.sqlite, target)} lines to {target}")
+        return 0
+    if args.command == "bench-writes":
+        benchmark_writes(args.jsonl)
+        return 0
+    benchmark(args.jsonl)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
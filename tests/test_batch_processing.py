@@ -0,0 +1,12 @@
+from batch_processing import get_database_files
+from storage import open_store
+
+
+def test_same_name_databases_are_listed_by_file_name(tmp_path):
+    for filename, link in (("foo.jsonl", "https://jsonl.example.com/"), ("foo.sqlite", "https://sqlite.example.com/")):
+        with open_store(str(tmp_path / filename)).writer() as writer:
+            writer.append([{"section": 1, "content": "body", "origin_link": link}])
+
+    files = get_database_files(str(tmp_path))
+    assert sorted(files) == ["foo.jsonl", "foo.sqlite"]
+    assert open_store(str(tmp_path / "foo.sqlite")).urls() == ["https://sqlite.example.com/"]
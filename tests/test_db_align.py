@@ -0,0 +1,41 @@
+from db_align import align_sections, changed_sections, latest_sections, summary
+from db_history import record_version
+from storage import open_store
+
+URL = "https://e.com/page"
+
+
+def _section(number, content):
+    return {"section": number, "heading": f"H{number}", "content": content, "origin_link": URL}
+
+
+def test_latest_sections_without_history_takes_newest_row_per_section(tmp_path):
+    db = str(tmp_path / "db.jsonl")
+    with open_store(db).writer() as writer:
+        writer.append([_section(1, "old one"), _section(2, "two")])
+        writer.append([_section(1, "new one")])
+
+    assert latest_sections(db, URL) == [_section(1, "new one"), _section(2, "two")]
+
+
+def test_latest_sections_prefers_recorded_history(tmp_path):
+    db = str(tmp_path / "db.jsonl")
+    first, second = [_section(1, "one"), _section(2, "two")], [_section(1, "one"), _section(2, "two, edited")]
+    for sections in (first, second):
+        record_version(db, URL, sections)
+        with open_store(db).writer() as writer:
+            writer.append(sections)
+
+    assert latest_sections(db, URL) == second
+
+
+def test_refresh_aligns_against_latest_version(tmp_path):
+    db = str(tmp_path / "db.jsonl")
+    with open_store(db).writer() as writer:
+        writer.append([_section(1, "old one"), _section(2, "two")])
+        writer.append([_section(1, "new one")])
+
+    alignment = align_sections(latest_sections(db, URL), [_section(1, "new one"), _section(2, "two")], None)
+
+    assert summary(alignment) == {"matched": 2, "changed": 0, "added": 0, "removed": 0}
+    assert changed_sections(alignment, []) == []
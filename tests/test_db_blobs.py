@@ -0,0 +1,36 @@
+import time
+
+from db_blobs import BlobStore, REF_FIELD, blob_key, blobs_path, gc
+from storage import open_store
+
+
+def _store_with_old_body(tmp_path, body):
+    blobs = BlobStore(blobs_path(str(tmp_path)), create=True)
+    blobs.references([{"content": body, "origin_link": "https://e.com/a"}])
+    with blobs.conn:
+        blobs.conn.execute("UPDATE blobs SET added = ?", (time.time() - 7200,))
+    return blobs
+
+
+def test_reused_body_survives_gc_before_its_line_is_written(tmp_path):
+    blobs = _store_with_old_body(tmp_path, "shared body")
+    # A writer reuses the stored body; its line is not written yet when gc runs
+    refs = blobs.references([{"content": "shared body", "origin_link": "https://e.com/b"}])
+    blobs.close()
+
+    assert gc(str(tmp_path), grace=60)["removed"] == 0
+
+    db = tmp_path / "db.jsonl"
+    with open_store(str(db)).writer() as writer:
+        writer.append([{"content": "shared body", "origin_link": "https://e.com/b"}])
+    assert refs[0][REF_FIELD] == blob_key("shared body")
+    assert [s["content"] for s in open_store(str(db)).iter_sections()] == ["shared body"]
+
+
+def test_gc_removes_old_unreferenced_bodies(tmp_path):
+    _store_with_old_body(tmp_path, "orphan").close()
+
+    result = gc(str(tmp_path), grace=60)
+
+    assert result["removed"] == 1
+    assert result["kept"] == 0
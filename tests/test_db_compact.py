@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from db_compact import compact
+from storage import open_store
+
+
+def _write(path, entries):
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding="utf-8")
+
+
+def _section(link, number, content):
+    return {"section": number, "heading": f"H{number}", "content": content, "origin_link": link}
+
+
+def test_compact_keeps_latest_copies_and_pages_that_differ_by_query(tmp_path):
+    db = tmp_path / "db.jsonl"
+    _write(db, [
+        _section("https://e.com/a", 1, "old"),
+        _section("https://e.com/a", 2, "kept"),
+        _section("https://e.com/list?page=1", 1, "first page"),
+        _section("https://e.com/list?page=2", 1, "second page"),
+        _section("https://e.com/a", 2, "kept"),
+        _section("https://e.com/a", 1, "new"),
+    ])
+    with open(db, "a", encoding="utf-8") as f:
+        f.write("not json\n\n")
+
+    stats = compact([str(db)], str(db), drop_invalid=True)
+
+    assert (stats["lines_in"], stats["lines_out"]) == (8, 4)
+    assert (stats["exact"], stats["superseded"], stats["invalid"], stats["blank"]) == (1, 1, 1, 1)
+    store = open_store(str(db))
+    assert sorted((s["origin_link"], s["section"], s["content"]) for s in store.iter_sections()) == [
+        ("https://e.com/a", 1, "new"),
+        ("https://e.com/a", 2, "kept"),
+        ("https://e.com/list?page=1", 1, "first page"),
+        ("https://e.com/list?page=2", 1, "second page"),
+    ]
+    assert [s["content"] for s in store.sections_for_url("https://e.com/a")] == ["kept", "new"]
+
+
+def test_merge_later_inputs_win_and_sqlite_output(tmp_path):
+    older, newer = tmp_path / "older.jsonl", tmp_path / "newer.jsonl"
+    _write(older, [_section("https://e.com/a", 1, "v1"), _section("https://e.com/b", 1, "b")])
+    _write(newer, [_section("https://e.com/a", 1, "v2")])
+    out = tmp_path / "merged.sqlite"
+
+    stats = compact([str(older), str(newer)], str(out))
+
+    assert stats["lines_out"] == 2
+    assert sorted(s["content"] for s in open_store(str(out)).iter_sections()) == ["b", "v2"]
+
+
+def test_merge_into_a_sharded_database_is_rejected(tmp_path):
+    db = tmp_path / "db.jsonl"
+    _write(db, [_section("https://e.com/a", 1, "x")])
+    with pytest.raises(ValueError):
+        compact([str(db)], str(tmp_path / "merged.shards"))
@@ -0,0 +1,104 @@
+import builtins
+
+import numpy as np
+import pytest
+
+import db_embeddings
+from db_embeddings import EmbeddingCache, text_key
+
+DIM = 4
+CAPACITY = 4
+
+
+def _cache(tmp_path):
+    return EmbeddingCache("fake", lambda texts: np.ones((len(texts), DIM)), str(tmp_path),
+                          max_mb=CAPACITY * DIM * 4 / (1024 * 1024))
+
+
+def _put(cache, texts, value):
+    cache.put_many([text_key(text) for text in texts], np.full((len(texts), DIM), value))
+
+
+def _served(cache, texts):
+    found = cache.get_many(texts)
+    return {text: float(found[text_key(text)][0]) for text in texts if text_key(text) in found}
+
+
+def test_eviction_reuses_rows_of_least_recently_used(tmp_path):
+    cache = _cache(tmp_path)
+    _put(cache, ["a", "b", "c", "d"], 1.0)
+    _put(cache, ["e"], 2.0)
+    served = _served(cache, ["a", "b", "c", "d", "e"])
+    assert served["e"] == 2.0
+    assert all(value == 1.0 for text, value in served.items() if text != "e")
+    assert len(served) == CAPACITY
+    cache.close()
+
+
+def test_crash_after_row_write_never_serves_the_new_vector_for_an_old_key(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    _put(cache, ["a", "b", "c", "d"], 1.0)
+
+    class Crash(Exception):
+        pass
+
+    real_open = builtins.open
+
+    class CrashOnClose:
+        def __init__(self, *args):
+            self.f = real_open(*args)
+
+        def __enter__(self):
+            return self.f
+
+        def __exit__(self, *exc):
+            self.f.close()
+            raise Crash()
+
+    monkeypatch.setattr(db_embeddings, "open", CrashOnClose, raising=False)
+    with pytest.raises(Crash):
+        _put(cache, ["e"], 2.0)
+    monkeypatch.undo()
+    cache.close()
+
+    reopened = _cache(tmp_path)
+    served = _served(reopened, ["a", "b", "c", "d", "e"])
+    assert "e" not in served
+    assert all(value == 1.0 for value in served.values())
+    _put(reopened, ["e"], 2.0)
+    assert _served(reopened, ["e"]) == {"e": 2.0}
+    reopened.close()
+
+
+def test_pair_batch_keeps_pairs_pending_when_scoring_fails():
+    calls, done = [], {}
+
+    def score(pairs):
+        calls.append(len(pairs))
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return [1.0] * len(pairs)
+
+    batch = db_embeddings.PairBatch(score, done.__setitem__, size=2)
+    batch.add("a", "b", "first")
+    with pytest.raises(RuntimeError):
+        batch.add("c", "d", "second")
+    batch.add("e", "f", "third")
+    assert calls == [2, 3]
+    assert done == {"first": 1.0, "second": 1.0, "third": 1.0}
+
+
+def test_pair_batch_with_failed_reports_only_the_pairs_that_cannot_be_scored():
+    done, failed = {}, {}
+
+    def score(pairs):
+        if any(a == "bad" for a, _ in pairs):
+            raise ValueError("cannot encode")
+        return [0.5] * len(pairs)
+
+    with db_embeddings.PairBatch(score, done.__setitem__, size=3, failed=failed.__setitem__) as batch:
+        for tag, text in enumerate(["a", "bad", "c", "d"]):
+            batch.add(text, "x", tag)
+    assert done == {0: 0.5, 2: 0.5, 3: 0.5}
+    assert list(failed) == [1] and isinstance(failed[1], ValueError)
+    assert batch.pending == []
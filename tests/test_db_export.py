@@ -0,0 +1,48 @@
+import os
+
+from db_export import export_database, export_path, read_export
+from storage import open_store
+
+
+def _database(path, link):
+    with open_store(str(path)).writer() as writer:
+        writer.append([{"section": 1, "heading": "H", "content": "body", "origin_link": link}])
+
+
+def test_same_name_databases_export_to_their_own_datasets(tmp_path):
+    data_dir, export_dir = tmp_path / "database", str(tmp_path / "exports")
+    data_dir.mkdir()
+    _database(data_dir / "foo.jsonl", "https://jsonl.example.com/")
+    _database(data_dir / "foo.sqlite", "https://sqlite.example.com/")
+
+    export_database(str(data_dir / "foo.sqlite"), export_dir=export_dir)
+    assert os.path.isdir(export_path("foo.sqlite", export_dir))
+    assert not os.path.exists(export_path("foo.jsonl", export_dir))
+    assert list(read_export("foo.sqlite", export_dir=export_dir)["origin_link"]) == ["https://sqlite.example.com/"]
+
+    # A bare name still resolves like open_database, to the plain JSONL file
+    export_database("foo", data_dir=str(data_dir), export_dir=export_dir)
+    assert list(read_export("foo", export_dir=export_dir, data_dir=str(data_dir))["origin_link"]) == \
+        ["https://jsonl.example.com/"]
+    assert list(read_export("foo.sqlite", export_dir=export_dir)["origin_link"]) == ["https://sqlite.example.com/"]
+
+
+def _sharded(path, links):
+    with open_store(str(path)).writer() as writer:
+        writer.append([{"section": 1, "heading": "H", "content": link, "origin_link": link} for link in links])
+
+
+def test_sharded_export_appends_after_a_write_to_any_shard(tmp_path):
+    db, export_dir = tmp_path / "site.shards", str(tmp_path / "exports")
+    _sharded(db, ["https://a.com/1", "https://b.com/1"])
+    first = export_database(str(db), export_dir=export_dir)
+    assert (first["rebuild"], first["rows"]) == (True, 2)
+
+    # a.com sorts first, so this shifts b.com's lines in the combined line order
+    _sharded(db, ["https://a.com/2"])
+    second = export_database(str(db), export_dir=export_dir)
+    assert (second["rebuild"], second["rows"]) == (False, 1)
+    assert sorted(read_export("site.shards", export_dir=export_dir)["origin_link"]) == \
+        ["https://a.com/1", "https://a.com/2", "https://b.com/1"]
+
+    assert export_database(str(db), export_dir=export_dir)["rows"] == 0
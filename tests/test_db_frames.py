@@ -0,0 +1,75 @@
+import json
+import os
+import random
+
+import pytest
+
+import db_frames
+from db_catalog import catalog_entries
+from db_frames import FRAMES_SUFFIX, migrate, open_read
+from storage import open_store
+
+
+def _database(path, count=600):
+    sections = [{"section": i % 7, "content": f"body {i} " + "word " * (i % 40),
+                 "origin_link": f"https://e.com/{i // 7}"} for i in range(count)]
+    with open_store(str(path)).writer() as writer:
+        writer.append(sections)
+    return [json.dumps(s, separators=(",", ":")) for s in sections]
+
+
+@pytest.mark.parametrize("codec", ["gz", "zst"])
+def test_random_reads_from_a_framed_file(tmp_path, monkeypatch, codec):
+    monkeypatch.setattr(db_frames, "FRAME_BYTES", 4096)  # many frames, so reads have to seek between them
+    db = tmp_path / "db.jsonl"
+    _database(db)
+    plain = db.read_bytes()
+    lines = open_store(str(db)).read_page(0, 1000)
+
+    framed = migrate(str(db), codec)
+    assert framed.endswith(".jsonl." + codec)
+    assert not db.exists() and os.path.exists(framed + FRAMES_SUFFIX)
+    store = open_store(framed)
+    rng = random.Random(0)
+    for start in rng.sample(range(len(lines)), 25):
+        assert store.read_page(start, 3) == lines[start:start + 3]
+    with open_read(framed) as f:
+        for offset in rng.sample(range(len(plain) - 100), 25):
+            f.seek(offset)
+            assert f.read(100) == plain[offset:offset + 100]
+    url = "https://e.com/42"
+    assert [s["content"] for s in store.sections_for_url(url)] == \
+        [json.loads(line)["content"] for line in lines if json.loads(line)["origin_link"] == url]
+
+
+def test_migrate_keeps_appends_and_drops_the_old_catalog_entry(tmp_path):
+    db = tmp_path / "db.jsonl"
+    _database(db, 20)
+    assert [entry["filename"] for entry in catalog_entries(str(tmp_path))] == ["db.jsonl"]
+
+    framed = migrate(str(db), "gz")
+    with open_store(framed).writer() as writer:
+        writer.append([{"section": 1, "content": "after", "origin_link": "https://e.com/new"}])
+
+    assert [entry["filename"] for entry in catalog_entries(str(tmp_path))] == ["db.jsonl.gz"]
+    assert open_store(framed).count() == 21
+    assert [s["content"] for s in open_store(framed).sections_for_url("https://e.com/new")] == ["after"]
+
+
+def test_migrate_waits_for_a_writer_holding_the_lock(tmp_path):
+    import threading
+    import time
+    from db_utils import database_lock
+
+    db = tmp_path / "db.jsonl"
+    _database(db, 20)
+    done = threading.Event()
+    with database_lock(str(db)):
+        worker = threading.Thread(target=lambda: (migrate(str(db), "gz"), done.set()))
+        worker.start()
+        time.sleep(0.3)
+        assert not done.is_set() and not os.path.exists(str(db) + ".gz")
+        with open(db, "a", encoding="utf-8") as f:  # a batch the writer finishes under its lock
+            f.write(json.dumps({"section": 1, "content": "late", "origin_link": "https://e.com/late"}) + "\n")
+    worker.join()
+    assert [s["content"] for s in open_store(str(db) + ".gz").sections_for_url("https://e.com/late")] == ["late"]
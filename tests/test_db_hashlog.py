@@ -0,0 +1,39 @@
+import json
+
+from db_hashlog import open_dedup_log, verify
+from storage import open_store
+
+
+def _write(path, records, trailing_newline=True):
+    text = "\n".join(json.dumps(record) for record in records)
+    path.write_text(text + ("\n" if trailing_newline else ""), encoding="utf-8")
+
+
+def test_unterminated_last_line_is_deduplicated(tmp_path):
+    db = tmp_path / "db.jsonl"
+    first = {"content": "x", "origin_link": "https://e.com/a", "section": 1}
+    last = {"content": "y", "origin_link": "https://e.com/b", "section": 1}
+    _write(db, [first, last], trailing_newline=False)
+
+    with open_store(str(db)).writer() as writer:
+        assert "https://e.com/b" in writer.links
+        assert writer.append([dict(last)]) == 0
+
+    assert db.read_text(encoding="utf-8").splitlines() == [json.dumps(first), json.dumps(last)]
+    assert verify(str(db))
+
+
+def test_catch_up_reads_unterminated_tail(tmp_path):
+    db = tmp_path / "db.jsonl"
+    first = {"content": "x", "origin_link": "https://e.com/a", "section": 1}
+    _write(db, [first])
+    open_dedup_log(str(db)).close()
+
+    # A line appended behind the log's back, without its newline
+    with open(db, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"content": "y", "origin_link": "https://e.com/b", "section": 1}))
+
+    log = open_dedup_log(str(db))
+    assert "https://e.com/b" in log.links
+    assert log.committed_size == db.stat().st_size
+    log.close()
@@ -0,0 +1,56 @@
+import random
+
+import db_history
+from db_history import as_of, changes, record_version, version, versions
+
+URL = "https://e.com/page"
+
+
+def _page(*contents):
+    return [{"section": i + 1, "heading": f"H{i + 1}", "content": text, "origin_link": URL}
+            for i, text in enumerate(contents)]
+
+
+def test_as_of_returns_the_version_current_at_a_time(tmp_path):
+    db = str(tmp_path / "db.jsonl")
+    first, second, third = _page("one two"), _page("one three"), _page("one three", "four")
+    assert record_version(db, URL, first, "2026-01-01T10:00:00") == 1
+    assert record_version(db, URL, second, "2026-02-01T10:00:00") == 2
+    assert record_version(db, URL, second, "2026-02-02T10:00:00") is None  # unchanged
+    assert record_version(db, URL, third, "2026-03-01T10:00:00") == 3
+
+    assert as_of(db, URL, "2025-12-31") is None
+    assert as_of(db, URL, "2026-01-01") == (1, first)  # a bare date is the end of that day
+    assert as_of(db, URL, "2026-02-15T00:00:00") == (2, second)
+    assert as_of(db, URL, "2026-03-01") == (3, third)
+    assert [v["version"] for v in versions(db, URL)] == [1, 2, 3]
+    assert version(db, URL) == third and version(db, URL, 1) == first
+
+
+def test_changes_between_versions(tmp_path):
+    db = str(tmp_path / "db.jsonl")
+    record_version(db, URL, _page("the old text", "kept", "dropped"), "2026-01-01")
+    record_version(db, URL, _page("the new text", "kept"), "2026-01-02")
+
+    report = changes(db, URL, 1)
+    assert [(row["section"], row["change"]) for row in report] == [(0, "changed"), (2, "removed")]
+    assert report[0]["fields"] == ["content"]
+    assert report[0]["diff"] == "the [-old-]{+new+} text"
+
+
+def test_versions_rebuild_exactly_across_deltas_and_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_history, "KEYFRAME_EVERY", 4)
+    db = str(tmp_path / "db.jsonl")
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    recorded = {}
+    sections = _page(*(" ".join(rng.choices(words, k=30)) for _ in range(5)))
+    for day in range(1, 11):
+        sections = [dict(s, content=" ".join(w if rng.random() > 0.1 else rng.choice(words)
+                                              for w in s["content"].split())) for s in sections]
+        number = record_version(db, URL, sections, f"2026-01-{day:02d}")
+        if number:
+            recorded[number] = sections
+    assert any(not v["base"] for v in versions(db, URL)) and sum(v["base"] for v in versions(db, URL)) > 1
+    for number, expected in recorded.items():
+        assert version(db, URL, number) == expected
@@ -0,0 +1,97 @@
+import json
+import os
+import struct
+
+from db_index import LINES_HEADER, LINES_SUFFIX, LineIndex, load_index, lookup_spans, read_lines, indexed_links
+from db_utils import normalize_url
+from storage import open_store
+
+
+def _full_scan(path):
+    """What the index should hold: each normalized URL with its links and line spans, read the slow way."""
+    urls, offset = {}, 0
+    with open(path, "rb") as f:
+        for line in f:
+            entry = json.loads(line) if line.strip() else None
+            if entry and entry.get("origin_link"):
+                found = urls.setdefault(normalize_url(entry["origin_link"]), {"links": [], "spans": []})
+                if entry["origin_link"] not in found["links"]:
+                    found["links"].append(entry["origin_link"])
+                found["spans"].append([offset, len(line)])
+            offset += len(line)
+    return urls
+
+
+def _records(count):
+    return [{"content": f"body {i}", "origin_link": f"https://e.com/{i % 4}", "section": i} for i in range(count)]
+
+
+def test_index_matches_full_scan(tmp_path):
+    db = tmp_path / "db.jsonl"
+    db.write_text("".join(json.dumps(r) + "\n" for r in _records(10)), encoding="utf-8")
+
+    assert load_index(str(db))["urls"] == _full_scan(db)
+
+
+def test_index_includes_unterminated_last_line(tmp_path):
+    db = tmp_path / "db.jsonl"
+    records = _records(5) + [{"content": "y", "origin_link": "https://e.com/b", "section": 1}]
+    db.write_text("\n".join(json.dumps(r) for r in records), encoding="utf-8")
+
+    index = load_index(str(db))
+    assert index["urls"] == _full_scan(db)
+    assert index["size"] == os.path.getsize(db)  # so a fresh process reuses the sidecar as is
+    assert open_store(str(db)).has_url("https://e.com/b")
+    assert "https://e.com/b" in indexed_links(str(db))
+    assert [json.loads(line) for line in read_lines(str(db), lookup_spans(str(db), "https://e.com/b"))] == records[-1:]
+
+
+def test_index_after_append_to_unterminated_file(tmp_path):
+    db = tmp_path / "db.jsonl"
+    db.write_text("\n".join(json.dumps(r) for r in _records(3)), encoding="utf-8")
+    load_index(str(db))
+
+    with open_store(str(db)).writer() as writer:
+        writer.append([{"content": "new", "origin_link": "https://e.com/new", "section": 1}])
+
+    # The span of the formerly last line stops short of the newline added later; it reads the same record
+    urls, expected = load_index(str(db))["urls"], _full_scan(db)
+    assert set(urls) == set(expected)
+    for url, entry in expected.items():
+        assert [json.loads(line) for line in read_lines(str(db), urls[url]["spans"])] == \
+               [json.loads(line) for line in read_lines(str(db), entry["spans"])]
+
+
+def _line_store(tmp_path, count):
+    db = tmp_path / "lines.jsonl"
+    db.write_text("".join(json.dumps(r) + "\n" for r in _records(count)), encoding="utf-8")
+    return db
+
+
+def test_line_index_pages_after_append(tmp_path):
+    db = _line_store(tmp_path, 5)
+    assert len(LineIndex(str(db))) == 5
+
+    with open(db, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r) + "\n" for r in _records(8)[5:]))
+    index = LineIndex(str(db))
+
+    assert len(index) == 8
+    assert [json.loads(line) for line in index.lines(0, 8)] == _records(8)
+
+
+def test_line_index_ignores_offsets_of_an_interrupted_extension(tmp_path):
+    db = _line_store(tmp_path, 5)
+    LineIndex(str(db)).close()
+    # An extension that appended offsets but never rewrote the header
+    with open(str(db) + LINES_SUFFIX, "ab") as f:
+        f.write(struct.pack(">3Q", 1, 2, 3))
+    assert len(LineIndex(str(db))) == 5
+
+    with open(db, "a", encoding="utf-8") as f:
+        f.write(json.dumps(_records(6)[5]) + "\n")
+    index = LineIndex(str(db))
+
+    assert len(index) == 6
+    assert [json.loads(line) for line in index.lines(0, 6)] == _records(6)
+    assert os.path.getsize(str(db) + LINES_SUFFIX) == LINES_HEADER.size + 6 * 8
@@ -0,0 +1,85 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from db_serve import make_server
+from storage import open_store
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = make_server("127.0.0.1", 0, str(tmp_path), quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def _records(body):
+    return [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+
+def _append(path, start, count):
+    with open_store(str(path)).writer() as writer:
+        writer.append([{"section": i, "content": f"body {i}", "origin_link": f"https://e.com/{i}"}
+                       for i in range(start, start + count)])
+
+
+@pytest.mark.parametrize("filename", ["db.jsonl", "db.sqlite"])
+def test_cursor_pages_through_a_database_and_then_only_what_was_added(server, tmp_path, filename):
+    _append(tmp_path / filename, 0, 5)
+    seen, cursor, more = [], "", "true"
+    while more == "true":
+        status, headers, body = _get(server, f"/databases/{filename}?limit=2&cursor={cursor}")
+        assert status == 200 and headers["X-Cursor-Reset"] == "false"
+        seen += [record["section"] for record in _records(body)]
+        cursor, more = headers["X-Next-Cursor"], headers["X-More"]
+    assert seen == [0, 1, 2, 3, 4]
+
+    status, headers, body = _get(server, f"/databases/{filename}?cursor={cursor}")
+    assert _records(body) == []
+    _append(tmp_path / filename, 5, 2)
+    status, headers, body = _get(server, f"/databases/{filename}?cursor={cursor}&fields=section")
+    assert _records(body) == [{"section": 5}, {"section": 6}]
+    assert headers["X-Cursor-Reset"] == "false"
+
+
+def test_etag_answers_304_until_the_database_changes(server, tmp_path):
+    db = tmp_path / "db.jsonl"
+    _append(db, 0, 3)
+    status, headers, body = _get(server, "/databases/db.jsonl?host=e.com")
+    etag = headers["ETag"]
+    assert status == 200 and len(_records(body)) == 3
+
+    status, _, body = _get(server, "/databases/db.jsonl?host=e.com", {"If-None-Match": etag})
+    assert status == 304 and body == b""
+    status, headers, _ = _get(server, "/databases/db.jsonl?url=https://e.com/1", {"If-None-Match": etag})
+    assert status == 200  # another query is another representation
+
+    _append(db, 3, 1)
+    status, headers, body = _get(server, "/databases/db.jsonl?host=e.com", {"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag and len(_records(body)) == 4
+    status, _, _ = _get(server, "/databases/db.jsonl?host=e.com&offset=2", {"If-Match": etag})
+    assert status == 412
+
+
+def test_raw_file_byte_ranges(server, tmp_path):
+    db = tmp_path / "db.jsonl"
+    _append(db, 0, 3)
+    stored = db.read_bytes()
+    status, headers, body = _get(server, "/databases/db.jsonl", {"Range": "bytes=10-29"})
+    assert status == 206 and body == stored[10:30]
+    assert headers["Content-Range"] == f"bytes 10-29/{len(stored)}"
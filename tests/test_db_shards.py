@@ -0,0 +1,58 @@
+import os
+
+from db_query import iter_sections
+from db_shards import grep, scan, shard_database
+from storage import open_store
+
+
+def _shard_name(path):
+    return "/".join(path.split(os.sep)[-2:])
+
+
+def _visit(path):
+    return _shard_name(path)
+
+
+def _sharded(tmp_path):
+    db = tmp_path / "site.shards"
+    for month, links in (("2026-01", ["https://a.com/1", "https://B.com/1"]), ("2026-02", ["https://a.com/2"])):
+        with open_store(str(db)).writer(month=month) as writer:
+            writer.append([{"section": 1, "content": f"body of {link}", "origin_link": link} for link in links])
+    return str(db)
+
+
+def test_shard_paths_prune_by_host_and_month(tmp_path):
+    store = open_store(_sharded(tmp_path))
+    assert [_shard_name(p) for p in store.shard_paths()] == \
+        ["a.com/2026-01.jsonl", "a.com/2026-02.jsonl", "b.com/2026-01.jsonl"]
+    assert [_shard_name(p) for p in store.shard_paths(hosts=["A.com"])] == ["a.com/2026-01.jsonl", "a.com/2026-02.jsonl"]
+    assert [_shard_name(p) for p in store.shard_paths(since="2026-02")] == ["a.com/2026-02.jsonl"]
+    assert [_shard_name(p) for p in store.shard_paths(until="2026-01-31")] == ["a.com/2026-01.jsonl", "b.com/2026-01.jsonl"]
+
+
+def test_scan_and_grep_only_visit_the_pruned_shards(tmp_path):
+    db = _sharded(tmp_path)
+    assert list(scan(db, _visit, hosts=["b.com"], workers=1)) == ["b.com/2026-01.jsonl"]
+    assert list(scan(db, _visit, since="2026-02", workers=1)) == ["a.com/2026-02.jsonl"]
+    assert [s["origin_link"] for s in grep(db, "body", hosts=["a.com"], until="2026-01", workers=1)] == ["https://a.com/1"]
+
+
+def test_iter_sections_prunes_months_and_filters_hosts(tmp_path):
+    db = _sharded(tmp_path)
+    links = lambda **filters: sorted(s["origin_link"] for s in iter_sections([db], fields=("origin_link",), **filters))
+    assert links() == ["https://B.com/1", "https://a.com/1", "https://a.com/2"]
+    # Sections do not record their ingest month: only pruning the shards can drop a.com/1 here
+    assert links(since="2026-02") == ["https://a.com/2"]
+    assert links(hosts=["b.com"]) == ["https://B.com/1"]
+    assert links(hosts=["a.com"], until="2026-01") == ["https://a.com/1"]
+
+
+def test_sharding_a_flat_database_keeps_every_line(tmp_path):
+    flat = tmp_path / "flat.jsonl"
+    with open_store(str(flat)).writer() as writer:
+        writer.append([{"section": i, "content": f"c{i}", "origin_link": f"https://h{i % 3}.com/"} for i in range(9)])
+    result = shard_database(str(flat), month="2026-03")
+    assert (result["lines"], result["shards"]) == (9, 3)
+    sharded = open_store(result["path"])
+    assert sorted(s["content"] for s in sharded.iter_sections()) == sorted(f"c{i}" for i in range(9))
+    assert [s["content"] for s in sharded.sections_for_url("https://h1.com/")] == ["c1", "c4", "c7"]
@@ -0,0 +1,48 @@
+import json
+import os
+import sys
+
+import db_compact
+from db_validate import repair, repaired_path, validate
+from storage import open_store
+
+
+def _write(path, entries, tail=""):
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries) + tail, encoding="utf-8")
+
+
+SECTIONS = [{"section": i, "content": f"body {i}", "origin_link": "https://e.com/a"} for i in range(1, 4)]
+
+
+def test_repair_in_place_drops_a_truncated_tail(tmp_path):
+    db = tmp_path / "db.jsonl"
+    _write(db, SECTIONS, tail='{"section": 4, "content": "cut sh')
+
+    report = validate(str(db), workers=1)
+    assert report["totals"]["invalid"] == 1
+    assert report["errors"][0]["line"] == 4
+
+    result = repair(str(db), workers=1)
+    assert (result["removed"], result["kept"]) == (1, 3)
+    assert validate(str(db), workers=1)["totals"]["invalid"] == 0
+    assert db.read_text(encoding="utf-8").endswith("\n")
+    store = open_store(str(db))
+    assert [s["section"] for s in store.sections_for_url("https://e.com/a")] == [1, 2, 3]
+    with store.writer() as writer:
+        writer.append([{"section": 4, "content": "whole", "origin_link": "https://e.com/a"}])
+    assert [s["section"] for s in store.iter_sections()] == [1, 2, 3, 4]
+
+
+def test_compact_removes_the_clean_copy_the_manage_page_wrote(tmp_path, monkeypatch):
+    db = tmp_path / "db.jsonl"
+    _write(db, SECTIONS, tail="not json\n")
+    copy = repaired_path(str(db))
+    assert os.path.basename(copy) == "db_repaired.jsonl"
+
+    repair(str(db), output=copy, workers=1)
+    assert [s["section"] for s in open_store(copy).iter_sections()] == [1, 2, 3]
+
+    monkeypatch.setattr(sys, "argv", ["db_compact.py", "compact", str(db), "--remove-repaired"])
+    assert db_compact.main() == 0
+    assert not os.path.exists(copy)
+    assert os.path.exists(db)
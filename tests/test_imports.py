@@ -0,0 +1,58 @@
+import ast
+import glob
+import importlib
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(ROOT, "*.py")))
+PAGES = sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def _defined(module: str) -> set:
+    """Top-level names a local module defines or imports."""
+    with open(os.path.join(ROOT, module + ".py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            for target in node.targets if isinstance(node, ast.Assign) else [node.target]:
+                names.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+        elif isinstance(node, ast.Try):
+            for child in ast.walk(node):
+                if isinstance(child, (ast.Import, ast.ImportFrom)):
+                    names.update((alias.asname or alias.name).split(".")[0] for alias in child.names)
+                elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                    names.add(child.id)
+    return names
+
+
+@pytest.mark.parametrize("path", [os.path.join(ROOT, m + ".py") for m in MODULES] + PAGES,
+                         ids=lambda path: os.path.relpath(path, ROOT))
+def test_names_imported_from_local_modules_exist(path):
+    """Runs without the UI dependencies: every `from <local module> import name` has to resolve."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        pytest.skip("needs a newer Python to parse")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module in MODULES:
+            missing = {alias.name for alias in node.names} - _defined(node.module) - {"*"}
+            assert not missing, f"{node.module} has no {', '.join(sorted(missing))}"
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_module_imports(module):
+    try:
+        importlib.import_module(module)
+    except ModuleNotFoundError as e:
+        if e.name and e.name.split(".")[0] not in MODULES:
+            pytest.skip(f"{e.name} is not installed")
+        raise
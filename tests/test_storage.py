@@ -0,0 +1,55 @@
+import json
+
+from db_catalog import catalog_entry
+from storage import open_store
+
+
+def test_append_after_unterminated_last_line(tmp_path):
+    db = tmp_path / "db.jsonl"
+    first = {"content": "x", "origin_link": "https://e.com/a", "section": 1}
+    added = {"content": "z", "origin_link": "https://e.com/c", "section": 1}
+    db.write_text(json.dumps(first), encoding="utf-8")
+
+    with open_store(str(db)).writer() as writer:
+        assert writer.append([added]) == 1
+
+    text = db.read_text(encoding="utf-8")
+    assert text.endswith("\n")
+    assert [json.loads(line) for line in text.splitlines()] == [first, added]
+    assert list(open_store(str(db)).iter_sections()) == [first, added]
+    assert catalog_entry(str(db))["entries"] == 2
+
+
+def test_catalog_counts_unterminated_last_line(tmp_path):
+    db = tmp_path / "db.jsonl"
+    lines = [{"content": c, "origin_link": "https://e.com/" + c} for c in "ab"]
+    db.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+
+    entry = catalog_entry(str(db))
+    assert entry["entries"] == 2
+    assert entry["urls"] == 2
+
+
+def test_replace_url_keeps_unterminated_last_line(tmp_path):
+    db = tmp_path / "db.jsonl"
+    keep = {"content": "x", "origin_link": "https://e.com/a"}
+    drop = {"content": "y", "origin_link": "https://e.com/b"}
+    db.write_text(json.dumps(drop) + "\n" + json.dumps(keep), encoding="utf-8")
+
+    open_store(str(db)).replace_url("https://e.com/b", [])
+
+    assert db.read_text(encoding="utf-8") == json.dumps(keep) + "\n"
+
+
+def test_sqlite_reads_of_a_missing_database_do_not_create_it(tmp_path):
+    path = tmp_path / "missing.sqlite"
+    store = open_store(str(path))
+    assert not store.has_url("https://e.com/a")
+    assert store.count() == 0
+    assert store.sections_for_url("https://e.com/a") == []
+    assert list(store.iter_lines()) == []
+    assert not path.exists()
+
+    with store.writer() as writer:
+        writer.append([{"section": 1, "content": "body", "origin_link": "https://e.com/a"}])
+    assert store.has_url("https://e.com/a") and store.count() == 1
@@ -1,7 +1,9 @@
-import json
 import time
 import os
 from googletrans import Translator
+from db_frames import open_read, open_write
+from db_records import loads, encode
+from db_blobs import resolve_one
 
 def translate_section(section, translator):
     """Translate Swedish content, headings, and tags to English"""
@@ -41,13 +43,14 @@ def process_jsonl(input_path, output_path):
     translator = Translator()
     
     try:
-        with open(input_path, 'r', encoding='utf-8') as infile, open(output_path, 'w', encoding='utf-8') as outfile:
+        with open_read(input_path) as infile, open_write(output_path) as outfile:
             total_lines = sum(1 for _ in infile)
             infile.seek(0)
             
-            for line_idx, line in enumerate(infile):
+            for line_idx, raw in enumerate(infile):
+                line = raw.decode('utf-8')
                 try:
-                    section_data = json.loads(line.strip())
+                    section_data = resolve_one(loads(line), input_path)
                     print(f"\nProcessing line {line_idx + 1}/{total_lines}")
                     
                     translated = translate_section(section_data, translator)
@@ -55,7 +58,7 @@ def process_jsonl(input_path, output_path):
                     print(f"  - origin_link: '{translated['origin_link']}'")
                     print(f"  - tags: {translated['tags']}")
                     
-                    outfile.write(json.dumps(translated, ensure_ascii=False) + '\n')
+                    outfile.write(encode(translated))
                     time.sleep(0.5)  # Rate limiting
                     
                 except Exception as e:
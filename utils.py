@@ -1,6 +1,5 @@
 import streamlit as st
 import os
-import json
 import re
 import time
 import datetime
@@ -12,11 +11,10 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
-from sentence_transformers import SentenceTransformer, util
-from urllib.parse import urlparse, urlunparse
+from sentence_transformers import SentenceTransformer
+from urllib.parse import urlparse
 import difflib
 import textwrap
-from docling.document_converter import DocumentConverter
 from typing import Optional, Tuple, List, Dict
 import requests
 import tempfile
@@ -24,27 +22,24 @@ from validators import url as url_validator
 import logging
 import traceback
 import PyPDF2
+import sqlite3
+from markdown_parser import iter_markdown_sections
+from pdf_conversion import convert_pdf_to_markdown
+import db_utils
+from storage import list_stores
+from db_query import iter_sections
+from db_embeddings import BATCH_SIZE, EmbeddingCache, PairBatch, similarities
 
 DATA_DIR = "database"  # your JSONL folder
+MODEL_NAME = "all-MiniLM-L6-v2"
+POOLING = "mean"  # how a long text's chunk embeddings combine into one vector: "mean" or "max"
+
+normalize_url = db_utils.normalize_url  # moved to db_utils; still importable from here for the pages
 
 def load_scraped_text(url: str, data_dir: str = DATA_DIR) -> str:
-    """Load and combine scraped content for a given URL from all JSONL files in the data directory."""
-    combined = []
-    if not os.path.exists(data_dir):
-        return ""
-    for filename in os.listdir(data_dir):
-        if not filename.endswith(".jsonl"):
-            continue
-        path = os.path.join(data_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    obj = json.loads(line)
-                    if obj.get("origin_link") == url:
-                        combined.append(obj.get("content", ""))
-                except:
-                    pass
-    return " ".join(combined)
+    """Load and combine scraped content for a given URL from all databases in the data directory."""
+    sections = iter_sections(urls=[url], fields=("origin_link", "content"), data_dir=data_dir)
+    return " ".join(obj.get("content", "") for obj in sections if obj.get("origin_link") == url)
 
 def fetch_rendered_text(url: str, timeout: int = 10, return_html: bool = False) -> str:
     """Fetch and parse rendered text or HTML from a URL using Selenium and BeautifulSoup.
@@ -124,62 +119,13 @@ def fetch_rendered_text(url: str, timeout: int = 10, return_html: bool = False)
     finally:
         driver.quit()
 
-def extract_external_links(text_lines, base_url):
-    """Extract external links from text content (supports both Markdown and plain text)"""
-    text = " ".join(text_lines)
-    
-    # First extract Markdown-style links [text](url)
-    markdown_links = re.findall(r"\[(.*?)\]\((https?://.*?)\)", text)
-    result = set(url[1] for url in markdown_links if url[1].startswith("http"))
-    
-    # Then extract plain text URLs
-    plain_urls = re.findall(r'https?://[^\s>]+', text)
-    result.update(plain_urls)
-    
-    # Filter out URLs from base domain
-    domain = urlparse(base_url).netloc
-    filtered = [url for url in result if not url.startswith(f"https://{domain}") and not url.startswith(f"http://{domain}")]
-    
-    return filtered
-
 def parse_pdf_markdown(markdown_text: str, origin_link: str) -> List[Dict]:
     """Parse PDF markdown into sections, mimicking process_all_pdfs."""
-    sections = []
-    lines = markdown_text.split("\n")
-    current_section = 1
-    current_heading = ""
-    current_content = []
-    
     logging.info(f"Parsing markdown for {origin_link}")
-    for line in lines:
-        if line.startswith("## ") or line.startswith("### "):
-            if current_heading or current_content:
-                sections.append({
-                    "section": current_section,
-                    "heading": current_heading or "No Heading",
-                    "content": "\n".join(current_content).strip(),
-                    "origin_link": origin_link,
-                    "external_links": extract_external_links(current_content, origin_link),
-                    "last_updated": "Date not found"
-                })
-                logging.info(f"Created section {current_section}: {current_heading[:30]}...")
-                current_section += 1
-                current_content = []
-            current_heading = line.replace("## ", "").replace("### ", "").strip()
-        else:
-            current_content.append(line)
-    
-    if current_heading or current_content:
-        sections.append({
-            "section": current_section,
-            "heading": current_heading or "No Heading",
-            "content": "\n".join(current_content).strip(),
-            "origin_link": origin_link,
-            "external_links": extract_external_links(current_content, origin_link),
-            "last_updated": "Date not found"
-        })
-        logging.info(f"Created final section {current_section}: {current_heading[:30] or 'No Heading'}...")
-    
+    sections = []
+    for section in iter_markdown_sections(markdown_text, origin_link):
+        logging.info(f"Created section {section['section']}: {section['heading'][:30]}...")
+        sections.append(section)
     logging.info(f"Parsed {len(sections)} sections from {origin_link}")
     return sections
 
@@ -221,9 +167,7 @@ def fetch_pdf_text(source: str, is_url: bool = True) -> Optional[Tuple[str, List
 
         # Try Docling with OCR
         try:
-            converter = DocumentConverter(ocr=True)
-            result = converter.convert(temp_file_path)
-            markdown = result.document.export_to_markdown()
+            markdown = convert_pdf_to_markdown(temp_file_path)
             sections = parse_pdf_markdown(markdown, source)
             text = " ".join(sec["content"] for sec in sections if sec.get("content"))
             text = re.sub(r'\s+', ' ', text).strip()
@@ -262,16 +206,6 @@ def fetch_pdf_text(source: str, is_url: bool = True) -> Optional[Tuple[str, List
             except Exception as e:
                 log_error(f"Failed to delete temporary file {temp_file_path}: {str(e)}\n{traceback.format_exc()}")
 
-def normalize_url(url: str) -> str:
-    """Normalize a URL by removing query params and fragments, preserving case for paths."""
-    try:
-        parsed = urlparse(url)
-        normalized = urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path.rstrip('/'), '', '', ''))
-        return normalized
-    except Exception as e:
-        log_error(f"URL normalization failed for {url}: {str(e)}\n{traceback.format_exc()}")
-        return url
-    
 def validate_url(url: str) -> bool:
     """Validate if the input string is a valid HTTP/HTTPS URL.
 
@@ -330,16 +264,36 @@ def log_error(message: str) -> None:
 @st.cache_resource(show_spinner=False)
 def load_model():
     """Load the SentenceTransformer model for semantic similarity."""
-    return SentenceTransformer('all-MiniLM-L6-v2')
+    return SentenceTransformer(MODEL_NAME)
 
 model = load_model()
 
+@st.cache_resource(show_spinner=False)
+def load_embedding_cache(data_dir: str = DATA_DIR) -> EmbeddingCache:
+    """The model's persistent embedding cache (see db_embeddings), shared by all sessions."""
+    return EmbeddingCache(MODEL_NAME, lambda texts: model.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True),
+                          data_dir)
+
+embedding_cache = load_embedding_cache()
+
+def semantic_similarities(pairs, pooling: str = POOLING) -> list:
+    """Semantic similarity of many (text1, text2) pairs, with the uncached texts encoded in batches.
+
+    Long texts are split into model-sized chunks whose embeddings are pooled, so a whole page counts
+    rather than the part that fits the model's window.
+    """
+    return similarities(embedding_cache, pairs, pooling)
+
 def semantic_similarity(text1: str, text2: str) -> float:
-    """Calculate semantic similarity between two texts using SentenceTransformer."""
-    emb1 = model.encode(text1, convert_to_tensor=True)
-    emb2 = model.encode(text2, convert_to_tensor=True)
-    score = util.pytorch_cos_sim(emb1, emb2).item()
-    return score
+    """Calculate semantic similarity between two texts, embedding only texts the cache has not seen."""
+    return semantic_similarities([(text1, text2)])[0]
+
+def similarity_batch(done, failed=None) -> PairBatch:
+    """Collects pairs with add(text1, text2, tag) and scores them in batches, calling done(tag, score).
+
+    With failed(tag, error), pairs that cannot be scored are reported one by one instead of raising.
+    """
+    return PairBatch(semantic_similarities, done, failed=failed)
 
 def get_status(similarity: float) -> str:
     """Return a status message based on the similarity score."""
@@ -356,23 +310,10 @@ def get_status(similarity: float) -> str:
 
 
 def load_all_urls(data_dir: str = DATA_DIR) -> list:
-    """Load all unique URLs from JSONL files in the data directory."""
+    """Load all unique URLs from the databases in the data directory (from their URL indexes)."""
     urls = set()
-    if not os.path.exists(data_dir):
-        return []
-    for filename in os.listdir(data_dir):
-        if not filename.endswith(".jsonl"):
-            continue
-        path = os.path.join(data_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    obj = json.loads(line)
-                    url = obj.get("origin_link")
-                    if url:
-                        urls.add(url)
-                except:
-                    pass
+    for store in list_stores(data_dir):
+        urls.update(store.urls())
     return sorted(urls)
 
 def extract_links(html: str, current_domain: str) -> List[str]:
@@ -462,44 +403,19 @@ def parse_live_content(html: str, url: str) -> List[Dict]:
 
 # Database selector function
 def find_matching_databases(url: str, data_dir: str = "database") -> List[str]:
-    """Find .jsonl databases containing the given URL with better error handling."""
+    """Find databases (JSONL or SQLite) containing the given URL using their URL indexes."""
     matching_dbs = []
-    normalized_url = normalize_url(url)
     if not os.path.exists(data_dir):
         log_error(f"Database directory {data_dir} does not exist")
         return matching_dbs
 
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".jsonl"):
-            file_path = os.path.join(data_dir, filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        # Try to parse the line as JSON
-                        entry = json.loads(line.strip())
-                        
-                        # Handle both dictionary entries and string entries
-                        if isinstance(entry, dict):
-                            entry_url = entry.get('origin_link', '')
-                        elif isinstance(entry, str):
-                            # If the entry is a string, treat it as the URL
-                            entry_url = entry
-                        else:
-                            continue
-                            
-                        if normalize_url(entry_url) == normalized_url:
-                            matching_dbs.append(filename)
-                            logging.info(f"Found {url} in {filename}")
-                            break
-                            
-                    except json.JSONDecodeError:
-                        # If it's not JSON, check if it's a raw URL string
-                        if normalize_url(line.strip()) == normalized_url:
-                            matching_dbs.append(filename)
-                            logging.info(f"Found raw URL match in {filename}")
-                            break
-                        else:
-                            log_error(f"Invalid JSON in {file_path}: {line}")
+    for store in list_stores(data_dir):
+        try:
+            if store.has_url(url):
+                matching_dbs.append(store.filename)
+                logging.info(f"Found {url} in {store.filename}")
+        except (OSError, sqlite3.Error) as e:
+            log_error(f"Failed to look up {url} in {store.path}: {str(e)}")
     logging.info(f"Found {len(matching_dbs)} databases for {url}: {matching_dbs}")
     return matching_dbs
 
@@ -564,38 +480,21 @@ def display_sections(sections: list, title: str, origin_link: str) -> None:
             st.write(f"**Last Updated**: {sections[0].get('last_updated', 'Date not found')}")
 
 def load_scraped_sections(url: str, db_path: str) -> Tuple[List[Dict], str]:
-    """Load sections and concatenated text from a JSONL file for a given URL.
+    """Load sections and concatenated text from a database file for a given URL.
 
     Args:
         url (str): The URL to match.
-        db_path (str): Path to the .jsonl file.
+        db_path (str): Path to the .jsonl or .sqlite file.
 
     Returns:
         Tuple[List[Dict], str]: List of matching sections and concatenated text.
     """
-    sections = []
-    text = ""
-    normalized_url = normalize_url(url)
     try:
-        with open(db_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                    entry_url = entry.get('origin_link', '')
-                    if normalize_url(entry_url) == normalized_url:
-                        sections.append(entry)
-                        content = entry.get('content', '')
-                        text += content + " "
-                        logging.info(f"Matched entry in {db_path}: {entry_url}")
-                    else:
-                        logging.info(f"Skipped entry in {db_path}: {entry_url}")
-                except json.JSONDecodeError:
-                    log_error(f"Invalid JSON in {db_path}: {line}")
-        text = re.sub(r'\s+', ' ', text).strip()
+        sections = list(iter_sections([db_path], urls=[url]))
+        logging.info(f"Matched {len(sections)} entries in {db_path} for {url}")
+        text = re.sub(r'\s+', ' ', " ".join(entry.get('content', '') for entry in sections)).strip()
         logging.info(f"Loaded {len(sections)} sections for {url} from {db_path}")
         return sections, text
     except Exception as e:
         log_error(f"Failed to load {db_path}: {str(e)}")
         return [], ""
-    
-    
\ No newline at end of file